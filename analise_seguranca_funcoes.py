@@ -1,8 +1,19 @@
 # analise_seguranca_funcoes.py
 # Funções de análise para trabalhar com um DataFrame (base única)
+#
+# A base recebida é compartilhada (cache por versão, memória compartilhada): as
+# funções nunca a alteram. Filtros e colunas novas (assign) geram DataFrames
+# próprios; com copy-on-write eles não duplicam as colunas que não mudam.
 
+import numpy as np
 import pandas as pd
 
+from filtros import mascara
+
+# pandas 3 já funciona assim; no 2.x o copy-on-write precisa ser ligado
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # Listas de filtros
 crimes_perigosos = [
     'FURTO SIMPLES',
@@ -43,66 +54,201 @@ crimes_comercio = [
     'ROUBO COM RESULTADO DE LESAO CORPORAL GRAVE',
 ]
 
+# Lista usada na evolução mensal (sem drogas/armas/sequestro)
+crimes_perigosos_mensal = [
+    'FURTO SIMPLES', 'FURTO QUALIFICADO', 'ROUBO', 'DANO',
+    'ROUBO AGRAVADO', 'VIOLACAO DE DOMICILIO',
+    'ROUBO COM RESULTADO DE LESAO CORPORAL GRAVE'
+]
+
 mes_map = {
     'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4,
     'mai': 5, 'jun': 6, 'jul': 7, 'ago': 8,
     'set': 9, 'out': 10, 'nov': 11, 'dez': 12
 }
 
+# Nomes canônicos das colunas usadas nas análises
+COLUNAS_BASE = ['Natureza', 'Bairro', 'Ambiente', 'Hora', 'Dia da Semana', 'Mês']
+
+# Colunas calculadas uma única vez na ingestão (preparar_base)
+COLUNAS_DERIVADAS = ['Periodo', 'Horario_comercial', 'Mês_num']
+
+# Coluna de contagem dos DataFrames agregados (cubo): cada linha vale PESO ocorrências
+PESO = '_n'
+
+
+def periodo_horas(horas):
+    """Período do dia (Manhã/Tarde/Noite) para uma Series de horas; hora inválida → 'Indefinido'."""
+    h = np.trunc(pd.to_numeric(horas, errors='coerce').astype('float64').to_numpy())
+    periodo = np.select(
+        [np.isnan(h), (h >= 6) & (h <= 11), (h >= 12) & (h <= 17)],
+        ['Indefinido', 'Manhã', 'Tarde'],
+        default='Noite',
+    )
+    return pd.Series(periodo, index=horas.index, name='Periodo')
+
+
+def preparar_base(df):
+    """Normaliza a planilha na ingestão e grava as colunas derivadas.
+
+    - cabeçalhos sem espaços e com o nome canônico (``natureza `` → ``Natureza``)
+    - ``Hora`` como inteiro pequeno (nulo quando inválida)
+    - ``Bairro`` sem espaços nas pontas
+    - ``Periodo``, ``Horario_comercial`` (8h às 18h) e ``Mês_num`` já calculados
+    """
+    canonicas = {c.lower(): c for c in COLUNAS_BASE}
+    df = df.rename(columns=lambda c: canonicas.get(str(c).strip().lower(), str(c).strip()))
+    if 'Bairro' in df.columns:
+        df['Bairro'] = df['Bairro'].where(df['Bairro'].isna(), df['Bairro'].astype(str).str.strip())
+    if 'Hora' in df.columns:
+        df['Hora'] = np.trunc(pd.to_numeric(df['Hora'], errors='coerce')).astype('Int16')
+        df['Periodo'] = periodo_horas(df['Hora'])
+        df['Horario_comercial'] = df['Hora'].between(8, 18).fillna(False).astype(bool)
+    if 'Mês' in df.columns:
+        df['Mês_num'] = df['Mês'].map(mes_map).astype('Int8')
+    return df
+
+
+# Dimensões de texto mantidas como categorias na memória (comparação por código inteiro)
+COLUNAS_CATEGORICAS = ['Natureza', 'Bairro', 'Ambiente', 'Dia da Semana', 'Mês', 'Periodo']
+COLUNAS_INTEIRAS = ['Hora', 'Mês_num', 'Horario_comercial']
+
+
+def _inteiro_pequeno(serie):
+    valores = pd.to_numeric(serie, errors='coerce')
+    for dtype in ('Int8', 'Int16', 'Int32'):
+        info = np.iinfo(dtype.lower())
+        if valores.isna().all() or (valores.min() >= info.min and valores.max() <= info.max):
+            return valores.astype(dtype)
+    return valores.astype('Int64')
+
+
+def compactar_df(df):
+    """Representação compacta para manter em memória.
+
+    Dimensões de texto viram ``category`` e ``Hora``/``Mês_num``/``Horario_comercial``
+    viram o menor inteiro (nulável) que comporta os valores. Colunas que já estão
+    nesse formato (ex.: vindas do snapshot colunar) não são copiadas.
+    """
+    convertidas = {}
+    for c in COLUNAS_CATEGORICAS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            convertidas[c] = df[c].astype('category')
+    for c in COLUNAS_INTEIRAS:
+        if c in df.columns and not (pd.api.types.is_integer_dtype(df[c])
+                                    and df[c].dtype.itemsize <= 2):
+            convertidas[c] = _inteiro_pequeno(df[c])
+    return df.assign(**convertidas) if convertidas else df
+
+
 def _add_mes_num(df):
+    # Bases gravadas antes de Mês_num existir: coluna nova sem copiar as demais
     if 'Mês' in df.columns and 'Mês_num' not in df.columns:
-        df = df.copy()
-        df['Mês_num'] = df['Mês'].map(mes_map)
+        df = df.assign(**{'Mês_num': df['Mês'].map(mes_map)})
     return df
 
-def _periodo(hora):
-    try:
-        h = int(hora)
-    except (ValueError, TypeError):
-        return 'Indefinido'
-    if 6 <= h <= 11:
-        return 'Manhã'
-    elif 12 <= h <= 17:
-        return 'Tarde'
-    else:
-        return 'Noite'
 
-# 1) Ocorrências por crime específico
-def ocorrencias_filtro_crime(df, crime):
-    f = df[df['Natureza'] == crime]
-    r = f['Natureza'].value_counts().reset_index()
-    r.columns = ['Natureza', 'Quantidade']
-    return r
+def _filtrar(df, colunas=None, **filtro):
+    """Linhas de ``df`` que passam no filtro declarativo (ver filtros.py).
 
+    Com ``colunas``, só essas colunas (e PESO, nos cubos) são copiadas.
+    """
+    m = mascara(df, filtro)
+    if colunas is None:
+        return df[m]
+    colunas = list(colunas) + ([PESO] if PESO in df.columns else [])
+    return df.loc[m, colunas]
 
-# 2) Ranking bairros por crime
-def ranking_bairros_crime(df, crime):
-    # Garante cópia independente
-    f = df.copy()
 
-    # Normaliza nomes das colunas
-    colunas = {c.strip().lower(): c for c in df.columns}
-    if 'natureza' in colunas:
-        natureza_col = colunas['natureza']
-    else:
-        raise KeyError("Coluna 'Natureza' não encontrada no dataset.")
+def _meses(semestre):
+    return (1, 6) if semestre == 1 else (7, 12)
+
 
-    if 'bairro' in colunas:
-        bairro_col = colunas['bairro']
+# Linhas por bloco na contagem de códigos (limita o array temporário de np.bincount)
+BLOCO_CONTAGEM = 1 << 18
+
+
+def _contar_codigos(serie, nome, pesos=None):
+    """Contagem por valor direto em códigos inteiros, bloco a bloco (nulos ignorados).
+
+    Para colunas categóricas (código da categoria) e inteiras pequenas (valor - mínimo).
+    ``pesos`` (array) soma o peso de cada linha em vez de contá-la (cubos).
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        valores = serie.cat.categories
+
+        def codigos(bloco):
+            return bloco.cat.codes.to_numpy().astype(np.intp) + 1
+    else:
+        minimo = serie.min()
+        if pd.isna(minimo):
+            return pd.DataFrame({serie.name: serie.iloc[:0].array,
+                                 nome: np.zeros(0, dtype='int64')})
+        minimo = int(minimo)
+        valores = pd.array(np.arange(minimo, int(serie.max()) + 1), dtype=serie.dtype)
+
+        def codigos(bloco):
+            return bloco.to_numpy(dtype=np.intp, na_value=minimo - 1) - (minimo - 1)
+    # Código 0 = nulo
+    n = np.zeros(len(valores) + 1, dtype='int64')
+    for i in range(0, len(serie), BLOCO_CONTAGEM):
+        bloco = slice(i, i + BLOCO_CONTAGEM)
+        n += np.bincount(codigos(serie.iloc[bloco]), minlength=len(valores) + 1,
+                         weights=None if pesos is None else pesos[bloco]).astype('int64')
+    r = pd.DataFrame({serie.name: valores, nome: n[1:]})
+    return r[r[nome] > 0]
+
+
+def _por_codigos(serie):
+    return (isinstance(serie.dtype, pd.CategoricalDtype)
+            or (pd.api.types.is_integer_dtype(serie.dtype) and serie.dtype.itemsize <= 2))
+
+
+def _contar(f, colunas, nome, ordenar=True):
+    """Conta ocorrências por ``colunas`` (nulos ignorados).
+
+    Em bases brutas conta linhas; em cubos agregados soma a coluna PESO.
+    ``ordenar=True`` → contagem decrescente (como value_counts);
+    ``ordenar=False`` → ordem das chaves (como groupby().size()).
+    """
+    if len(colunas) == 1 and _por_codigos(f[colunas[0]]):
+        pesos = f[PESO].to_numpy() if PESO in f.columns else None
+        r = _contar_codigos(f[colunas[0]], nome, pesos)
+    else:
+        g = f.groupby(colunas, observed=True)
+        if PESO in f.columns:
+            r = g[PESO].sum()
+            r = r[r > 0]
+        else:
+            r = g.size()
+        r = r.reset_index(name=nome)
+        # Chaves categóricas (snapshot colunar) voltam ao tipo dos valores
+        for c in colunas:
+            if isinstance(r[c].dtype, pd.CategoricalDtype):
+                r[c] = r[c].astype(r[c].cat.categories.dtype)
+    if ordenar:
+        # Empates desempatados pela chave: mesmo resultado em qualquer representação
+        r = r.sort_values(by=[nome] + colunas, ascending=[False] + [True] * len(colunas),
+                          kind='stable')
     else:
-        raise KeyError("Coluna 'Bairro' não encontrada no dataset.")
+        r = r.sort_values(by=colunas, kind='stable')
+    return r.reset_index(drop=True)
+
 
-    # Filtro seguro
-    f = f[f[natureza_col] == crime]
+# 1) Ocorrências por crime específico
+def ocorrencias_filtro_crime(df, crime):
+    f = _filtrar(df, ['Natureza'], crimes=crime)
+    return _contar(f, ['Natureza'], 'Quantidade')
 
-    # Remove nulos e valores inválidos
-    f = f[f[bairro_col].notna()]
-    f[bairro_col] = f[bairro_col].astype(str).str.strip()
-    f = f[~f[bairro_col].isin(["", "0", "NULL", "None"])]
+
+# 2) Ranking bairros por crime
+def ranking_bairros_crime(df, crime):
+    # Colunas e Bairro já normalizados na ingestão (preparar_base); sem bairros inválidos
+    f = _filtrar(df, ['Bairro'], crimes=crime,
+                 bairro=lambda b: b not in ("", "0", "NULL", "None"))
 
     # Gera ranking
-    q = f[bairro_col].value_counts().reset_index(name='Crimes')
-    q.columns = ['Bairro', 'Crimes']
+    q = _contar(f, ['Bairro'], 'Crimes')
 
     if q.empty:
         return pd.DataFrame(columns=['Bairro', 'Crimes', 'Bloco'])
@@ -119,236 +265,352 @@ def ranking_bairros_crime(df, crime):
 
 # 3) Crimes por dia da semana (crime + bairro)
 def crimes_dia_crime_bairro(df, crime, bairro):
-    f = df[(df['Natureza'] == crime) & (df['Bairro'] == bairro)]
-    q = f['Dia da Semana'].value_counts().reset_index()
-    q.columns = ['Dia da Semana', 'Quantidade']
-    return q
+    f = _filtrar(df, ['Dia da Semana'], crimes=crime, bairro=bairro)
+    return _contar(f, ['Dia da Semana'], 'Quantidade')
 
 # 4) Período do crime (crime + bairro)
 def periodo_crime_bairro_crime(df, crime, bairro):
-    f = df[(df['Natureza'] == crime) & (df['Bairro'] == bairro)].copy()
-    f['Periodo'] = f['Hora'].apply(_periodo)
-    q = f['Periodo'].value_counts().reset_index()
-    q.columns = ['Periodo', 'Quantidade']
-    return q
+    f = _filtrar(df, ['Periodo'], crimes=crime, bairro=bairro)
+    return _contar(f, ['Periodo'], 'Quantidade')
 
 # 5) Crimes perigosos por semestre
 def crimes_perigosos_semestre(df, semestre):
-    df = df[df['Natureza'].isin(crimes_perigosos)].copy()
-    df = _add_mes_num(df)
-    if semestre == 1:
-        f = df[(df['Mês_num'] >= 1) & (df['Mês_num'] <= 6)]
-    else:
-        f = df[(df['Mês_num'] >= 7) & (df['Mês_num'] <= 12)]
-    r = f.groupby('Mês').size().reset_index(name='Crimes')
-    r = r.sort_values(by='Crimes', ascending=False)
-    return r
+    f = _filtrar(_add_mes_num(df), ['Mês'], crimes=crimes_perigosos, meses=_meses(semestre))
+    return _contar(f, ['Mês'], 'Crimes')
 
 # 6) Crimes contra moradias por semestre
+MORADIAS_SEMESTRE = {'crimes': ['VIOLACAO DE DOMICILIO', 'DANO', 'FURTO', 'ROUBO'],
+                     'ambiente': lambda a: str(a).upper() == 'RESIDENCIA'}
+
+
 def crimes_moradias_semestre(df, semestre):
-    df = df.copy()
-    violacao = df[(df['Natureza'] == 'VIOLACAO DE DOMICILIO') & (df['Ambiente'].str.upper() == 'RESIDENCIA')]
-    dano = df[(df['Natureza'] == 'DANO') & (df['Ambiente'].str.upper() == 'RESIDENCIA')]
-    furt_rob = df[(df['Natureza'].isin(['FURTO', 'ROUBO'])) & (df['Ambiente'].str.upper() == 'RESIDENCIA')]
-    base = pd.concat([violacao, dano, furt_rob], ignore_index=True)
-    base = _add_mes_num(base)
-    if semestre == 1:
-        f = base[(base['Mês_num'] >= 1) & (base['Mês_num'] <= 6)]
-    else:
-        f = base[(base['Mês_num'] >= 7) & (base['Mês_num'] <= 12)]
-    r = f.groupby('Mês').size().reset_index(name='Crimes')
-    return r.sort_values(by='Crimes', ascending=False)
+    f = _filtrar(_add_mes_num(df), ['Mês'], **MORADIAS_SEMESTRE, meses=_meses(semestre))
+    return _contar(f, ['Mês'], 'Crimes')
 
 # 7) Crimes perigosos por bairro
 def crimes_bairro(df, bairro):
-    f = df[df['Natureza'].isin(crimes_perigosos)]
-    f = f[f['Bairro'] == bairro]
-    r = f['Natureza'].value_counts().reset_index(name='Crimes')
-    r.columns = ['Natureza', 'Crimes']
-    return r
+    return _analise_bairro('crimes_bairro', df, bairro=bairro)
 
 # 8) Crimes em moradias por bairro
 def crimes_moradias_bairro(df, bairro):
-    df = df[['Bairro', 'Natureza', 'Ambiente']].copy()
-    violacao = df[(df['Natureza'] == 'VIOLACAO DE DOMICILIO') & (df['Ambiente'] == 'RESIDENCIA')]
-    violacao['Crime'] = 'VIOLACAO DE DOMICILIO'
-    dano = df[(df['Natureza'] == 'DANO') & (df['Ambiente'] == 'RESIDENCIA')]
-    dano['Crime'] = 'DANO'
-    fr = df[(df['Natureza'].isin(furtos_roubos)) & (df['Ambiente'] == 'RESIDENCIA')]
-    fr['Crime'] = 'FURTO/ROUBO'
-    base = pd.concat([violacao, dano, fr])
-    base = base[base['Bairro'] == bairro]
-    r = base.groupby('Natureza').size().reset_index(name='Crimes')
-    return r.sort_values(by='Crimes', ascending=False)
+    return _analise_bairro('crimes_moradias_bairro', df, bairro=bairro)
 
 # 9) Período moradias por bairro
 def periodo_moradias_bairro(df, bairro):
-    df = df[['Bairro', 'Natureza', 'Hora', 'Ambiente']].copy()
-    violacao = df[(df['Natureza'] == 'VIOLACAO DE DOMICILIO') &
-                  (df['Ambiente'] == 'RESIDENCIA') &
-                  (df['Bairro'] == bairro)]
-    dano = df[(df['Natureza'] == 'DANO') &
-              (df['Ambiente'] == 'RESIDENCIA') &
-              (df['Bairro'] == bairro)]
-    fr = df[(df['Natureza'].isin(furtos_roubos)) &
-            (df['Ambiente'] == 'RESIDENCIA') &
-            (df['Bairro'] == bairro)]
-    base = pd.concat([violacao, dano, fr])
-    base['Periodo'] = base['Hora'].apply(_periodo)
-    r = base.groupby('Periodo').size().reset_index(name='Crimes')
-    return r.sort_values(by='Crimes', ascending=False)
+    return _analise_bairro('periodo_moradias_bairro', df, bairro=bairro)
 
 # 10) Dia da semana moradias por bairro
 def dia_moradias_bairro(df, bairro):
-    df = df[['Bairro', 'Natureza', 'Hora', 'Ambiente', 'Dia da Semana']].copy()
-    violacao = df[(df['Natureza'] == 'VIOLACAO DE DOMICILIO') &
-                  (df['Ambiente'] == 'RESIDENCIA') &
-                  (df['Bairro'] == bairro)]
-    dano = df[(df['Natureza'] == 'DANO') &
-              (df['Ambiente'] == 'RESIDENCIA') &
-              (df['Bairro'] == bairro)]
-    fr = df[(df['Natureza'].isin(furtos_roubos)) &
-            (df['Ambiente'] == 'RESIDENCIA') &
-            (df['Bairro'] == bairro)]
-    base = pd.concat([violacao, dano, fr])
-    r = base.groupby('Dia da Semana').size().reset_index(name='Crimes')
-    return r.sort_values(by='Crimes', ascending=False)
-
-
-# 11) Período furtos/roubos por bairro
+    return _analise_bairro('dia_moradias_bairro', df, bairro=bairro)
+
+# 11) Período furtos/roubos por bairro (período com mais ocorrências de cada crime)
 def periodo_furtos_roubos_bairro(df, bairro):
-    try:
-        # Filtra apenas furtos e roubos do bairro
-        f = df[(df['Bairro'] == bairro) & (df['Natureza'].isin(furtos_roubos))].copy()
+    return _analise_bairro('periodo_furtos_roubos_bairro', df, bairro=bairro)
 
-        # Garante que a coluna 'Hora' seja numérica (ignora strings como 'Noite', 'Dia')
-        f['Hora'] = pd.to_numeric(f['Hora'], errors='coerce')
+# 12) Dia furtos/roubos por bairro
+def dia_furtos_roubos_bairro(df, bairro):
+    return _analise_bairro('dia_furtos_roubos_bairro', df, bairro=bairro)
 
-        # Remove linhas com hora nula (casos de erro de conversão)
-        f = f.dropna(subset=['Hora'])
+# 13) Principal período por crime (geral por bairro)
+def periodo_crime_bairro(df, bairro):
+    return _analise_bairro('periodo_crime_bairro', df, bairro=bairro)
 
-        # Converte hora para inteiro
-        f['Hora'] = f['Hora'].astype(int)
+# 14) Crimes perigosos por bairro e período
+def crimes_perigosos_bairro_periodo(df, bairro, periodo):
+    f = _filtrar(df, ['Natureza'], crimes=crimes_perigosos, periodo=periodo, bairro=bairro)
+    return _contar(f, ['Natureza'], 'Crimes')
 
-        # Mapeia período
-        f['Periodo'] = f['Hora'].apply(_periodo)
+# 15) Crimes em comércio (horário comercial) por bairro
+def crime_comercial_bairro(df, bairro):
+    return _analise_bairro('crime_comercial_bairro', df, bairro=bairro)
 
-        # Conta ocorrências por tipo e período
-        c = f.groupby(['Natureza', 'Periodo']).size().reset_index(name='Ocorrencias')
+# 16) Mapa de calor hora × dia da semana (crime + bairro)
+def mapa_calor_crime_bairro(df, crime, bairro):
+    f = _filtrar(df, ['Hora', 'Dia da Semana'], crimes=crime, bairro=bairro)
+    return quadro_mapa(matriz_mapa(f))
 
-        # Seleciona o período com mais ocorrências para cada tipo de crime
-        idx = c.groupby('Natureza')['Ocorrencias'].idxmax()
-        r = c.loc[idx].reset_index(drop=True)
+# 17) Crimes num intervalo de meses, com média móvel
+def evolucao_intervalo(df, crime, inicio, fim, janela=3):
+    f = _filtrar(_add_mes_num(df), ['Mês_num'], crimes=crime)
+    return serie_intervalo(acumulado_meses(f), inicio, fim, janela)
 
-        # Ordena
-        return r.sort_values(by='Ocorrencias', ascending=False)
 
-    except Exception as e:
-        print(f"[ERRO] Falha na função periodo_furtos_roubos_bairro: {e}")
-        return pd.DataFrame(columns=['Natureza', 'Periodo', 'Ocorrencias'])
+# =====================================================
+# 🔹 Matriz hora × dia da semana (mapa de calor)
+# =====================================================
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
 
+# Linhas: horas 0–23, hora fora de 0–23, hora nula.
+# Colunas: DIAS_SEMANA, outro valor, dia nulo.
+HORA_OUTRA, HORA_NULA = 24, 25
+DIA_OUTRO, DIA_NULO = 7, 8
+FORMA_MAPA = (26, 9)
 
-# 12) Dia furtos/roubos por bairro
-def dia_furtos_roubos_bairro(df, bairro):
-    f = df[(df['Bairro'] == bairro) & (df['Natureza'].isin(furtos_roubos))]
-    c = f.groupby(['Natureza', 'Dia da Semana']).size().reset_index(name='Ocorrencias')
-    idx = c.groupby('Natureza')['Ocorrencias'].idxmax()
-    r = c.loc[idx].reset_index(drop=True)
-    return r.sort_values(by='Ocorrencias', ascending=False)
 
-# 13) Principal período por crime (geral por bairro)
-def periodo_crime_bairro(df, bairro):
-    f = df[df['Bairro'] == bairro][['Hora', 'Natureza']].copy()
-    f['Periodo'] = f['Hora'].apply(_periodo)
-    c = f.value_counts(subset=['Natureza', 'Periodo']).reset_index(name='Contagem')
-    idx = c.groupby('Natureza')['Contagem'].idxmax()
-    r = c.loc[idx].reset_index(drop=True)
-    return r.sort_values(by='Contagem', ascending=False)
+def celulas_mapa(df):
+    """Posição (linha * colunas + coluna) de cada linha de ``df`` na matriz hora × dia."""
+    h = np.trunc(pd.to_numeric(df['Hora'], errors='coerce').to_numpy(dtype='float64',
+                                                                       na_value=np.nan))
+    hora = np.where(np.isnan(h), HORA_NULA,
+                    np.where((h >= 0) & (h <= 23), np.nan_to_num(h), HORA_OUTRA)).astype('int64')
+    dias = df['Dia da Semana']
+    dia = pd.Index(DIAS_SEMANA).get_indexer(dias.to_numpy(dtype=object))
+    dia = np.where(dia >= 0, dia, np.where(dias.isna().to_numpy(), DIA_NULO, DIA_OUTRO))
+    return hora * FORMA_MAPA[1] + dia
 
-# 14) Crimes perigosos por bairro e período
-def crimes_perigosos_bairro_periodo(df, bairro, periodo):
-    f = df[df['Natureza'].isin(crimes_perigosos)].copy()
-    f['Periodo'] = f['Hora'].apply(_periodo)
-    f = f[(f['Periodo'] == periodo) & (f['Bairro'] == bairro)]
-    r = f['Natureza'].value_counts().reset_index(name='Crimes')
-    r.columns = ['Natureza', 'Crimes']
-    return r.sort_values(by='Crimes', ascending=False)
 
-# 15) Crimes em comércio (horário comercial) por bairro
-def crime_comercial_bairro(df, bairro):
-    f = df[df['Natureza'].isin(crimes_comercio)].copy()
-    f = f[(f['Hora'].between(8, 18)) & (f['Ambiente'] == 'COMERCIO') & (f['Bairro'] == bairro)]
-    r = f['Natureza'].value_counts().reset_index()
-    r.columns = ['Natureza', 'Crimes']
-    return r.sort_values(by='Crimes', ascending=False)
+def matriz_mapa(df):
+    """Contagens de ``df`` na matriz hora × dia (FORMA_MAPA)."""
+    pesos = df[PESO].to_numpy() if PESO in df.columns else None
+    n = np.bincount(celulas_mapa(df), weights=pesos, minlength=FORMA_MAPA[0] * FORMA_MAPA[1])
+    return n.astype('int64').reshape(FORMA_MAPA)
+
+
+def quadro_mapa(m):
+    """Horas 0–23 nas linhas e DIAS_SEMANA nas colunas (a parte desenhada do mapa)."""
+    quadro = pd.DataFrame(m[:24, :len(DIAS_SEMANA)], columns=DIAS_SEMANA)
+    quadro.insert(0, 'Hora', np.arange(24))
+    return quadro
+
+
+def _contagem_fixa(coluna, totais, nome):
+    # Mesmo formato de _contar: sem zeros, contagem decrescente e empate pela chave
+    r = pd.DataFrame({coluna: list(totais),
+                      nome: np.fromiter(totais.values(), dtype='int64', count=len(totais))})
+    r = r[r[nome] > 0]
+    return r.sort_values(by=[nome, coluna], ascending=[False, True],
+                         kind='stable').reset_index(drop=True)
+
+
+def periodos_mapa(m, nome):
+    """Contagem por Periodo somando faixas de horas da matriz (mesmas faixas de periodo_horas)."""
+    por_hora = m.sum(axis=1)
+    return _contagem_fixa('Periodo', {
+        'Manhã': por_hora[6:12].sum(),
+        'Tarde': por_hora[12:18].sum(),
+        'Noite': por_hora[:6].sum() + por_hora[18:HORA_NULA].sum(),
+        'Indefinido': por_hora[HORA_NULA],
+    }, nome)
+
+
+def dias_mapa(m, nome):
+    """Contagem por Dia da Semana somando as colunas da matriz.
+
+    None quando há dias fora de DIAS_SEMANA (aí só reagrupando a base).
+    """
+    por_dia = m.sum(axis=0)
+    if por_dia[DIA_OUTRO]:
+        return None
+    return _contagem_fixa('Dia da Semana', dict(zip(DIAS_SEMANA, por_dia)), nome)
+
+
+# =====================================================
+# 🔹 Séries mensais a partir de contagens acumuladas
+# =====================================================
+# Vetor acumulado a (13 posições): a[m] = ocorrências dos meses 1..m, a[0] = 0.
+# O total de qualquer intervalo de meses é a[fim] - a[ini - 1].
+NOMES_MES = list(mes_map)
+
+
+def acumulado_meses(df):
+    """Vetor acumulado das ocorrências de ``df`` por Mês_num (meses fora de 1–12 ignorados)."""
+    meses = pd.to_numeric(df['Mês_num'], errors='coerce').to_numpy(dtype='float64',
+                                                                  na_value=np.nan)
+    validos = (meses >= 1) & (meses <= 12)
+    pesos = df[PESO].to_numpy()[validos] if PESO in df.columns else None
+    n = np.bincount(meses[validos].astype('int64'), weights=pesos, minlength=13)
+    return np.cumsum(n.astype('int64'))
+
+
+def contagem_meses(a, ini, fim, nome):
+    """Contagem por Mês (nome) nos meses ini..fim, no formato de _contar."""
+    return _contagem_fixa('Mês', {NOMES_MES[m - 1]: a[m] - a[m - 1]
+                                  for m in range(ini, fim + 1)}, nome)
+
+
+def evolucao_meses(a, nome):
+    """Contagem por Mês_num em ordem de mês (meses sem ocorrências ficam de fora)."""
+    # Mês_num no mesmo tipo da base compactada (compactar_df)
+    r = pd.DataFrame({'Mês_num': pd.array(np.arange(1, 13), dtype='Int8'), nome: np.diff(a)})
+    return r[r[nome] > 0].reset_index(drop=True)
+
+
+def serie_intervalo(a, inicio, fim, janela=3, nome='Crimes'):
+    """Série mensal de ``inicio`` a ``fim`` com a média móvel de ``janela`` meses.
+
+    Cada ponto sai de subtrações no vetor acumulado. A janela usa os meses
+    anteriores a ``inicio`` quando existem; no começo do ano ela encurta.
+    """
+    inicio, fim = sorted((min(max(int(inicio), 1), 12), min(max(int(fim), 1), 12)))
+    janela = max(int(janela), 1)
+    meses = np.arange(inicio, fim + 1)
+    antes = np.maximum(meses - janela, 0)
+    return pd.DataFrame({
+        'Mês': [NOMES_MES[m - 1] for m in meses],
+        nome: a[meses] - a[meses - 1],
+        'Média móvel': np.round((a[meses] - a[antes]) / (meses - antes), 2),
+    })
+
+
+# =====================================================
+# 🔹 Perfil do bairro: as análises 7–13 e 15 juntas
+# =====================================================
+# Violação de domicílio, dano e furtos/roubos em residências
+MORADIAS = {'crimes': ['VIOLACAO DE DOMICILIO', 'DANO'] + furtos_roubos,
+            'ambiente': 'RESIDENCIA'}
+
+# nome → (filtro, chaves, coluna da contagem, principal)
+# principal=True → só a linha de maior contagem de cada Natureza (empate → menor chave)
+ANALISES_BAIRRO = {
+    'crimes_bairro': ({'crimes': crimes_perigosos}, ['Natureza'], 'Crimes', False),
+    'crimes_moradias_bairro': (MORADIAS, ['Natureza'], 'Crimes', False),
+    'periodo_moradias_bairro': (MORADIAS, ['Periodo'], 'Crimes', False),
+    'dia_moradias_bairro': (MORADIAS, ['Dia da Semana'], 'Crimes', False),
+    'periodo_furtos_roubos_bairro': (
+        {'crimes': furtos_roubos, 'periodo': lambda p: p != 'Indefinido'},
+        ['Natureza', 'Periodo'], 'Ocorrencias', True),
+    'dia_furtos_roubos_bairro': (
+        {'crimes': furtos_roubos}, ['Natureza', 'Dia da Semana'], 'Ocorrencias', True),
+    'periodo_crime_bairro': ({}, ['Natureza', 'Periodo'], 'Contagem', True),
+    'crime_comercial_bairro': (
+        {'crimes': crimes_comercio, 'comercial': True, 'ambiente': 'COMERCIO'},
+        ['Natureza'], 'Crimes', False),
+}
+
+# Colunas de que as análises por bairro precisam
+DIMENSOES_PERFIL = ['Natureza', 'Ambiente', 'Periodo', 'Dia da Semana', 'Horario_comercial']
+
+
+def _analise_bairro(nome, f, por=(), **filtro):
+    """Executa a análise ``nome`` de ANALISES_BAIRRO sobre ``f`` com o filtro da análise
+    mais ``filtro`` (ex.: ``bairro=...``).
+
+    Com ``por=['Bairro']`` roda para todos os bairros de uma vez: a ordem das linhas
+    de cada bairro é a mesma da execução isolada.
+    """
+    filtro_analise, chaves, contagem, principal = ANALISES_BAIRRO[nome]
+    por = list(por)
+    f = _filtrar(f, por + chaves, **filtro_analise, **filtro)
+    c = _contar(f, por + chaves, contagem)
+    if principal:
+        # c já vem ordenado pela contagem: idxmax pega a menor chave entre empatadas
+        idx = c.groupby(por + ['Natureza'])[contagem].idxmax()
+        c = c.loc[idx].sort_values(by=contagem, ascending=False, kind='stable')
+    return c.reset_index(drop=True)
+
+
+def _agregar(df, colunas):
+    """Cubo de contagens (coluna PESO) de ``df`` pelas ``colunas`` presentes."""
+    colunas = [c for c in colunas if c in df.columns]
+    g = df.groupby(colunas, dropna=False, observed=True)
+    r = g[PESO].sum() if PESO in df.columns else g.size().rename(PESO)
+    return r.reset_index()
+
+
+def perfil_bairro(df, bairro):
+    """Todas as análises por bairro com um único filtro e um único groupby.
+
+    Devolve ``{nome da análise: DataFrame}``, igual a chamar cada função.
+    """
+    agregado = _agregar(_filtrar(df, bairro=bairro), DIMENSOES_PERFIL)
+    return {nome: _analise_bairro(nome, agregado) for nome in ANALISES_BAIRRO}
+
+
+def perfis_bairros(df):
+    """Perfil de todos os bairros de uma vez: ``{bairro: {análise: DataFrame}}``.
+
+    A base é agregada uma vez por bairro + DIMENSOES_PERFIL; cada análise roda uma
+    única vez sobre esse agregado e o resultado é repartido entre os bairros.
+    """
+    agregado = _agregar(df[df['Bairro'].notna()], ['Bairro'] + DIMENSOES_PERFIL)
+    bairros = agregado['Bairro'].astype(object).unique().tolist()
+    perfis = {b: {} for b in bairros}
+    for nome in ANALISES_BAIRRO:
+        r = _analise_bairro(nome, agregado, por=['Bairro'])
+        for bairro, parte in r.groupby('Bairro', sort=False):
+            perfis[bairro][nome] = parte.drop(columns='Bairro').reset_index(drop=True)
+        vazio = r.iloc[0:0].drop(columns='Bairro')
+        for bairro in bairros:
+            perfis[bairro].setdefault(nome, vazio)
+    return perfis
 
-import pandas as pd
 
 # =====================================================
 # 🔹 1) Top 10 bairros mais perigosos (total de crimes)
 # =====================================================
 def top10_bairros_perigosos(df):
     """Lista os 10 bairros com maior número de ocorrências."""
-    ranking = df['Bairro'].value_counts().reset_index()
-    ranking.columns = ['Bairro', 'Crimes']
-    return ranking.head(10)
+    return _contar(df, ['Bairro'], 'Crimes').head(10)
 
 # =====================================================
 # 🔹 2) Bairros com determinado crime e período do dia
 # =====================================================
 def bairros_por_crime_periodo(df, crime, periodo):
     """Filtra bairros onde ocorreram crimes específicos no período escolhido."""
-    def map_periodo(h):
-        if 6 <= h <= 11:
-            return 'Manhã'
-        elif 12 <= h <= 17:
-            return 'Tarde'
-        else:
-            return 'Noite'
-
-    df['Periodo'] = df['Hora'].apply(map_periodo)
-    filtrado = df[(df['Natureza'] == crime) & (df['Periodo'] == periodo)]
-    resultado = filtrado['Bairro'].value_counts().reset_index()
-    resultado.columns = ['Bairro', 'Ocorrências']
-    return resultado.head(20)
+    filtrado = _filtrar(df, ['Bairro'], crimes=crime, periodo=periodo)
+    return _contar(filtrado, ['Bairro'], 'Ocorrências').head(20)
 
 # =====================================================
 # 🔹 3) Evolução mensal de crimes perigosos (gráfico linha)
 # =====================================================
 def evolucao_crimes_perigosos(df):
     """Mostra evolução mensal dos crimes perigosos (linha temporal)."""
-    crimes_perigosos = [
-        'FURTO SIMPLES', 'FURTO QUALIFICADO', 'ROUBO', 'DANO',
-        'ROUBO AGRAVADO', 'VIOLACAO DE DOMICILIO',
-        'ROUBO COM RESULTADO DE LESAO CORPORAL GRAVE'
-    ]
-
-    mes_map = {
-        'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4,
-        'mai': 5, 'jun': 6, 'jul': 7, 'ago': 8,
-        'set': 9, 'out': 10, 'nov': 11, 'dez': 12
-    }
-
-    df['Mês_num'] = df['Mês'].map(mes_map)
-    filtrado = df[df['Natureza'].isin(crimes_perigosos)]
-    serie = filtrado.groupby('Mês_num').size().reset_index(name='Crimes')
-    serie = serie.sort_values('Mês_num')
-    return serie
+    filtrado = _filtrar(df, ['Mês_num'], crimes=crimes_perigosos_mensal)
+    return _contar(filtrado, ['Mês_num'], 'Crimes', ordenar=False)
 
 # =====================================================
 # 🔹 4) Ranking geral de crimes (top 10 naturezas)
 # =====================================================
 def ranking_geral_crimes(df):
     """Lista os 10 crimes mais comuns (todas naturezas)."""
-    ranking = df['Natureza'].value_counts().reset_index()
-    ranking.columns = ['Crime', 'Ocorrências']
-    return ranking.head(10)
+    ranking = _contar(df, ['Natureza'], 'Ocorrências').head(10)
+    return ranking.rename(columns={'Natureza': 'Crime'})
 
 # =====================================================
 # 🔹 5) Crimes por tipo de ambiente (pizza)
 # =====================================================
 def crimes_por_ambiente(df):
     """Conta quantos crimes ocorreram em cada tipo de ambiente."""
-    ambiente = df['Ambiente'].value_counts().reset_index()
-    ambiente.columns = ['Ambiente', 'Ocorrências']
-    return ambiente
+    return _contar(df, ['Ambiente'], 'Ocorrências')
+
+# =====================================================
+# 🔹 Filtro de cada análise (drill-down e exportação das ocorrências)
+# =====================================================
+def _intervalo_meses(inicio, fim):
+    # Mesmo ajuste de serie_intervalo
+    return tuple(sorted((min(max(int(inicio), 1), 12), min(max(int(fim), 1), 12))))
+
+
+def _filtro_bairro(filtro):
+    return lambda bairro: {**filtro, 'bairro': bairro}
+
+
+# nome → função dos parâmetros da análise que devolve o filtro (ver filtros.py) das
+# linhas que ela conta
+FILTROS_ANALISES = {
+    'ocorrencias_filtro_crime': lambda crime: {'crimes': crime},
+    'ranking_bairros_crime': lambda crime: {
+        'crimes': crime, 'bairro': lambda b: b not in ("", "0", "NULL", "None")},
+    'crimes_dia_crime_bairro': lambda crime, bairro: {'crimes': crime, 'bairro': bairro},
+    'periodo_crime_bairro_crime': lambda crime, bairro: {'crimes': crime, 'bairro': bairro},
+    'crimes_perigosos_semestre': lambda semestre: {
+        'crimes': crimes_perigosos, 'meses': _meses(semestre)},
+    'crimes_moradias_semestre': lambda semestre: {
+        **MORADIAS_SEMESTRE, 'meses': _meses(semestre)},
+    **{nome: _filtro_bairro(filtro) for nome, (filtro, *_) in ANALISES_BAIRRO.items()},
+    'crimes_perigosos_bairro_periodo': lambda bairro, periodo: {
+        'crimes': crimes_perigosos, 'periodo': periodo, 'bairro': bairro},
+    'mapa_calor_crime_bairro': lambda crime, bairro: {'crimes': crime, 'bairro': bairro},
+    'evolucao_intervalo': lambda crime, inicio, fim, janela=3: {
+        'crimes': crime, 'meses': _intervalo_meses(inicio, fim)},
+    'top10_bairros_perigosos': lambda: {},
+    'bairros_por_crime_periodo': lambda crime, periodo: {'crimes': crime, 'periodo': periodo},
+    'evolucao_crimes_perigosos': lambda: {'crimes': crimes_perigosos_mensal, 'meses': (1, 12)},
+    'ranking_geral_crimes': lambda: {},
+    'crimes_por_ambiente': lambda: {},
+}
+
+
+def filtro_analise(nome, **params):
+    """Filtro das linhas que a análise ``nome`` conta com esses parâmetros."""
+    return FILTROS_ANALISES[nome](**params)
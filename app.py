@@ -1,85 +1,295 @@
 import os
+import time
+import csv
+import io
+import json
+import hashlib
+import gzip
+import unicodedata
+import uuid
 import sqlite3
 import pandas as pd
-from flask import Flask, render_template, request, redirect, url_for, abort
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, abort, jsonify,
+    make_response, g,
+)
+from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from analise_seguranca_funcoes import *
+from cache_dados import CacheLRU, tamanho_perfis
+from consultas_sql import CONSULTAS_SQL, consulta_ocorrencias, filtro_sql, filtros_ocorrencias
+from cubo import ANALISES_SEM_CUBO, tabela_cubo, tabela_dimensoes, construir_dimensoes
+from ingestao import ingerir_excel, MODOS as MODOS_INGESTAO
+from tarefas import FilaIngestao
+from banco import Banco, conectar
+from metricas import (
+    AmostradorPerfil, Histogramas, etapa, etapas_da_requisicao, iniciar_requisicao,
+    server_timing,
+)
+from filtros import indexar
+from topk import RANKINGS_APROXIMADOS
+from mapas import ANALISES_MAPA, analise_mapa, ler_mapas, tabela_mapas
+from tempo import ANALISES_TEMPO, analise_tempo, ler_tempo, tabela_tempo
+from comparacao import carregar_tabela, comparar_tabelas, quadro_comparativo
+from memoria_compartilhada import MemoriaCompartilhada
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['SNAPSHOT_FOLDER'] = 'snapshots'
+app.config['DF_CACHE_MAX_MB'] = int(os.environ.get('DF_CACHE_MAX_MB', 512))
+app.config['RESULT_CACHE_MAX_MB'] = int(os.environ.get('RESULT_CACHE_MAX_MB', 64))
+app.config['PERFIL_CACHE_MAX_MB'] = int(os.environ.get('PERFIL_CACHE_MAX_MB', 64))
+# Endpoint em lote: threads por requisição e tempo máximo de cada lote
+app.config['LOTE_MAX_THREADS'] = int(os.environ.get('LOTE_MAX_THREADS', 8))
+app.config['LOTE_TIMEOUT_S'] = float(os.environ.get('LOTE_TIMEOUT_S', 30))
+# Drill-down: linhas por página (padrão e máximo) e linhas lidas por bloco na exportação
+app.config['OCORRENCIAS_POR_PAGINA'] = 100
+app.config['OCORRENCIAS_MAX_PAGINA'] = 1000
+app.config['EXPORTACAO_BLOCO'] = 2000
+# Comparação entre planilhas: processos do pool (0 = um por CPU, até o nº de planilhas)
+app.config['COMPARACAO_PROCESSOS'] = int(os.environ.get('COMPARACAO_PROCESSOS', 0))
+# 'pandas' → carrega a tabela inteira; 'sql' → GROUP BY direto no SQLite;
+# 'cubo' → usa o cubo de contagens pré-agregado na ingestão
+app.config['MOTOR_ANALISE'] = os.environ.get('MOTOR_ANALISE', 'pandas')
+# Rankings em streaming (topk.py): lê a tabela do SQLite em blocos, com memória
+# constante, em vez de carregá-la inteira; TOPK_VERIFICAR reconta os candidatos
+app.config['RANKING_APROXIMADO'] = os.environ.get('RANKING_APROXIMADO', '0') == '1'
+app.config['TOPK_CAPACIDADE'] = int(os.environ.get('TOPK_CAPACIDADE', 1000))
+app.config['TOPK_LOTE'] = 50000
+app.config['TOPK_VERIFICAR'] = os.environ.get('TOPK_VERIFICAR', '1') == '1'
+# Profiler por amostragem: grava em PERFIL_FOLDER as pilhas das requisições
+# mais lentas que PERFIL_LIMITE_MS (0 = desligado)
+app.config['PERFIL_LIMITE_MS'] = float(os.environ.get('PERFIL_LIMITE_MS', 0))
+app.config['PERFIL_FOLDER'] = 'perfis'
+# Vários workers: a base de cada versão é publicada uma vez em memória compartilhada
+# e os demais processos montam o DataFrame sobre ela (memoria_compartilhada.py)
+app.config['MEMORIA_COMPARTILHADA'] = os.environ.get('MEMORIA_COMPARTILHADA', '0') == '1'
+app.config['MEMORIA_FOLDER'] = 'memoria'
+
+# Respostas JSON a partir deste tamanho saem com gzip (se o cliente aceitar)
+app.config['GZIP_MIN_BYTES'] = int(os.environ.get('GZIP_MIN_BYTES', 1024))
+app.config['GZIP_NIVEL'] = 6
+
 DB_PATH = 'dados.db'
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['SNAPSHOT_FOLDER'], exist_ok=True)
+
+# Cache dos DataFrames carregados, chave (tabela, versão)
+df_cache = CacheLRU(app.config['DF_CACHE_MAX_MB'] * 1024 * 1024)
+
+# Cache dos JSON de gráfico já serializados, chave (tabela, versão, função, parâmetros)
+resultado_cache = CacheLRU(app.config['RESULT_CACHE_MAX_MB'] * 1024 * 1024, tamanho=len)
+
+# Perfis de todos os bairros (análises por bairro pré-calculadas), chave (tabela, versão)
+perfil_cache = CacheLRU(app.config['PERFIL_CACHE_MAX_MB'] * 1024 * 1024, tamanho=tamanho_perfis)
+
+# Segmentos de memória compartilhada por (tabela, versão), quando ligado
+memoria = (MemoriaCompartilhada(app.config['MEMORIA_FOLDER'])
+           if app.config['MEMORIA_COMPARTILHADA'] else None)
+
+# Latência por função e por etapa (exposta em /metricas)
+histogramas = Histogramas()
+amostrador = AmostradorPerfil()
+
+# =====================================================
+# 🔹 Instrumentação (Server-Timing, /metricas, profiler)
+# =====================================================
+@app.before_request
+def _iniciar_medicao():
+    g.inicio = time.perf_counter()
+    iniciar_requisicao()
+    if app.config['PERFIL_LIMITE_MS'] > 0:
+        amostrador.registrar()
+
+
+@app.after_request
+def _registrar_medicao(resp):
+    total = time.perf_counter() - g.inicio
+    etapas = etapas_da_requisicao()
+    resp.headers['Server-Timing'] = server_timing(etapas, total)
+
+    # Rótulo: a função de análise (só chaves conhecidas) ou o endpoint
+    key = (request.view_args or {}).get('key')
+    rotulo = key if key in FUNCTIONS_META else (request.endpoint or '-')
+    for nome, segundos in etapas.items():
+        histogramas.observar(rotulo, nome, segundos)
+    histogramas.observar(rotulo, 'total', total)
+
+    limite = app.config['PERFIL_LIMITE_MS']
+    if limite > 0:
+        pilhas = amostrador.encerrar()
+        if pilhas and total * 1000 > limite:
+            nome = f"{time.strftime('%Y%m%d-%H%M%S')}_{rotulo}_{total * 1000:.0f}ms.txt"
+            AmostradorPerfil.gravar(pilhas, os.path.join(app.config['PERFIL_FOLDER'], nome))
+    return resp
+
+
+@app.teardown_request
+def _encerrar_perfil(_erro):
+    # Requisições que terminaram com exceção não passam pelo after_request
+    if app.config['PERFIL_LIMITE_MS'] > 0:
+        amostrador.encerrar()
+
+
+# =====================================================
+# 🔹 Compressão das respostas JSON
+# =====================================================
+@app.after_request
+def _comprimir_json(resp):
+    # Registrado depois de _registrar_medicao: roda antes e entra no Server-Timing
+    if (resp.mimetype != 'application/json' or resp.status_code != 200
+            or resp.direct_passthrough or resp.is_streamed
+            or 'Content-Encoding' in resp.headers):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return resp
+    corpo = resp.get_data()
+    # Abaixo do limite o cabeçalho do gzip e a CPU não compensam
+    if len(corpo) < app.config['GZIP_MIN_BYTES']:
+        return resp
+    with etapa('gzip'):
+        resp.set_data(gzip.compress(corpo, compresslevel=app.config['GZIP_NIVEL']))
+    resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
 
 # =====================================================
 # 🔹 Banco de Dados Helpers
 # =====================================================
+# Conexões de leitura reaproveitadas por thread (WAL, ver banco.py)
+banco = Banco(DB_PATH)
+
+
 def get_conn():
-    return sqlite3.connect(DB_PATH)
-
-
-def init_db_from_excel(filepath):
-    """Lê todas as planilhas do Excel e salva cada uma como tabela no SQLite."""
-    xls = pd.ExcelFile(filepath)
-    conn = get_conn()
-    with conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS meta_sheets (
-                sheet_name TEXT PRIMARY KEY,
-                table_name TEXT NOT NULL
-            )
-        """)
-        conn.execute("DELETE FROM meta_sheets")
-
-        for sheet in xls.sheet_names:
-            df = xls.parse(sheet)
-            table_name = (
-                sheet.strip().lower()
-                    .replace(" ", "_")
-                    .replace("-", "_")
-                    .replace("/", "_")
-            )
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            conn.execute(
-                "INSERT INTO meta_sheets (sheet_name, table_name) VALUES (?, ?)",
-                (sheet, table_name)
-            )
+    """Conexão de leitura da thread atual (compartilhada: não fechar)."""
+    return banco.leitura()
+
+
+def init_db_from_excel(filepath, progresso=None, modo='substituir'):
+    """Lê as planilhas do Excel e salva cada uma como tabela no SQLite.
+
+    ``modo='acrescentar'`` grava só as linhas novas das planilhas alteradas.
+    """
+    infos = ingerir_excel(DB_PATH, filepath, progresso=progresso,
+                          snapshots=app.config['SNAPSHOT_FOLDER'], modo=modo)
+    # Nova versão dos dados → libera o cache de DataFrames
+    for info in infos:
+        if not info['novas']:
+            continue  # Nada acrescentado: a versão não mudou
+        df_cache.invalidar(info['table_name'])
+        df_cache.invalidar(tabela_cubo(info['table_name']))
+        df_cache.invalidar(tabela_dimensoes(info['table_name']))
+        df_cache.invalidar(tabela_mapas(info['table_name']))
+        df_cache.invalidar(tabela_tempo(info['table_name']))
+        resultado_cache.invalidar(info['table_name'])
+        perfil_cache.invalidar(info['table_name'])
+    return infos
+
+
+# Uploads são processados em segundo plano; as páginas de análise continuam
+# usando a versão anterior dos dados até a ingestão terminar
+fila_ingestao = FilaIngestao(banco, init_db_from_excel)
 
 
 def get_tables():
-    conn = get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute("SELECT sheet_name, table_name FROM meta_sheets ORDER BY sheet_name")
-        rows = cur.fetchall()
+        return get_conn().execute(
+            "SELECT sheet_name, table_name FROM meta_sheets ORDER BY sheet_name"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+
+
+def get_versao(table_name):
+    try:
+        row = get_conn().execute(
+            "SELECT versao FROM meta_versoes WHERE table_name = ?", (table_name,)
+        ).fetchone()
     except sqlite3.OperationalError:
-        rows = []
-    finally:
-        conn.close()
-    return rows
+        row = None
+    return row[0] if row else 0
+
+
+def _load_table(table_name, versao):
+    return carregar_tabela(get_conn(), app.config['SNAPSHOT_FOLDER'], table_name, versao)
 
 
 def load_df(table_name):
-    conn = get_conn()
-    df = pd.read_sql_query(f'SELECT * FROM \"{table_name}\"', conn)
-    conn.close()
-    return df
+    """Carrega a tabela como DataFrame, reaproveitando o cache enquanto a versão não mudar.
 
+    O DataFrame devolvido é compartilhado: as funções de análise não devem alterá-lo
+    (o índice de bitmaps dos filtros, ver filtros.py, vale para ele como carregado).
+    Com MEMORIA_COMPARTILHADA ele é somente leitura, sobre o segmento da versão.
+    """
+    versao = get_versao(table_name)
 
-def get_distinct(table_name, column):
-    conn = get_conn()
+    def carregar():
+        if memoria is None:
+            return _load_table(table_name, versao)
+        return memoria.obter(table_name, versao, lambda: _load_table(table_name, versao))
+
+    return df_cache.obter((table_name, versao), lambda: indexar(carregar()))
+
+
+def load_cubo(table_name):
+    """Carrega o cubo agregado da tabela (mesma versão e mesmo cache da base), compactado
+    como a base (dimensões categóricas)."""
+    def carregar():
+        cubo = pd.read_sql_query(f'SELECT * FROM \"{tabela_cubo(table_name)}\"', get_conn())
+        return indexar(compactar_df(cubo))
+
+    chave = (tabela_cubo(table_name), get_versao(table_name))
+    return df_cache.obter(chave, carregar)
+
+
+def load_mapas(table_name):
+    """Matrizes hora × dia por (bairro, natureza) da tabela, ou None se ela não as tiver."""
+    chave = (tabela_mapas(table_name), get_versao(table_name))
     try:
-        cur = conn.cursor()
-        cur.execute(
-            f'SELECT DISTINCT \"{column}\" FROM \"{table_name}\" '
-            f'WHERE \"{column}\" IS NOT NULL ORDER BY 1'
-        )
-        values = [r[0] for r in cur.fetchall() if r[0] not in (None, "", 0)]
-    except sqlite3.OperationalError:
-        values = []
-    finally:
-        conn.close()
-    return values
+        return df_cache.obter(chave, lambda: ler_mapas(get_conn(), table_name))
+    except pd.errors.DatabaseError:
+        return None  # Base gravada antes dos mapas existirem
+
+
+def load_tempo(table_name):
+    """Índice temporal (contagens acumuladas por mês) da tabela, ou None se ela não o tiver."""
+    chave = (tabela_tempo(table_name), get_versao(table_name))
+    try:
+        return df_cache.obter(chave, lambda: ler_tempo(get_conn(), table_name))
+    except pd.errors.DatabaseError:
+        return None  # Base gravada antes do índice temporal existir
+
+
+def _chave_busca(texto):
+    """Forma normalizada para busca: sem acentos e sem diferença de caixa."""
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return sem_acento.casefold()
+
+
+def load_dimensoes(table_name):
+    """Valores distintos + contagem das colunas filtráveis (tabela de dimensões da ingestão)."""
+    def carregar():
+        try:
+            dims = pd.read_sql_query(f'SELECT * FROM \"{tabela_dimensoes(table_name)}\"',
+                                     get_conn())
+        except pd.errors.DatabaseError:
+            dims = None  # Base gravada antes das dimensões existirem
+        if dims is None:
+            dims = construir_dimensoes(load_df(table_name))
+        dims = dims.sort_values(['coluna', 'valor'], ignore_index=True)
+        dims['chave'] = dims['valor'].map(_chave_busca)
+        return dims
+
+    chave = (tabela_dimensoes(table_name), get_versao(table_name))
+    return df_cache.obter(chave, carregar)
+
+
+def get_distinct(table_name, column):
+    dims = load_dimensoes(table_name)
+    return dims.loc[dims['coluna'] == column, 'valor'].tolist()
 
 import inspect
 
@@ -199,9 +409,95 @@ FUNCTIONS_META = {
         "func": crimes_por_ambiente,
         "params": ["dataset"],
     },
+    "mapa_calor_crime_bairro": {
+        "label": "Mapa de Calor Hora × Dia da Semana (Crime + Bairro)",
+        "func": mapa_calor_crime_bairro,
+        "params": ["dataset", "crime", "bairro"],
+    },
+    "evolucao_intervalo": {
+        "label": "Crimes por Intervalo de Meses (Média Móvel)",
+        "func": evolucao_intervalo,
+        "params": ["dataset", "crime", "inicio", "fim", "janela"],
+    },
 }
 
 
+def carregar_base(table_name, funcao=None):
+    """DataFrame sobre o qual as funções rodam: o cubo (motor 'cubo') ou a tabela completa."""
+    if app.config['MOTOR_ANALISE'] == 'cubo' and funcao not in ANALISES_SEM_CUBO:
+        try:
+            return load_cubo(table_name)
+        except pd.errors.DatabaseError:
+            pass  # Base gravada antes do cubo existir: usa a tabela completa
+    return load_df(table_name)
+
+
+def load_perfis(table_name, base=None):
+    """Análises por bairro de todos os bairros, calculadas de uma vez por versão."""
+    def carregar():
+        return perfis_bairros(carregar_base(table_name) if base is None else base)
+
+    return perfil_cache.obter((table_name, get_versao(table_name)), carregar)
+
+
+def executar_analise(key, table_name, params, base=None):
+    """Executa a função de análise no motor configurado (pandas, SQL ou cubo).
+
+    ``base`` reaproveita um DataFrame já obtido com carregar_base(). As análises
+    por bairro saem do perfil pré-calculado (ver load_perfis), as de crime + bairro
+    por hora/dia, das matrizes da ingestão (ver mapas.py), e as séries por mês, do
+    índice temporal (ver tempo.py).
+    """
+    func = FUNCTIONS_META[key]['func']
+    if app.config['RANKING_APROXIMADO'] and func.__name__ in RANKINGS_APROXIMADOS:
+        with etapa('topk'):
+            return RANKINGS_APROXIMADOS[func.__name__](
+                get_conn(), table_name, **params,
+                capacidade=app.config['TOPK_CAPACIDADE'], tamanho=app.config['TOPK_LOTE'],
+                verificar=app.config['TOPK_VERIFICAR'],
+            )
+    if func.__name__ in ANALISES_MAPA:
+        with etapa('mapa'):
+            mapas = load_mapas(table_name)
+            result = None if mapas is None else analise_mapa(mapas, func.__name__, **params)
+        if result is not None:
+            return result
+    if func.__name__ in ANALISES_TEMPO:
+        with etapa('tempo'):
+            tempo = load_tempo(table_name)
+        if tempo is not None:
+            with etapa('analise'):
+                return analise_tempo(tempo, func.__name__, **params)
+    if app.config['MOTOR_ANALISE'] == 'sql' and func.__name__ in CONSULTAS_SQL:
+        with etapa('sql'):
+            return CONSULTAS_SQL[func.__name__](get_conn(), table_name, **params)
+    if func.__name__ in ANALISES_BAIRRO and set(params) == {'bairro'}:
+        with etapa('perfil'):
+            perfil = load_perfis(table_name, base).get(params['bairro'])
+        if perfil is not None:
+            return perfil[func.__name__]
+        # Bairro sem ocorrências: a função devolve o resultado vazio
+    if base is None or (func.__name__ in ANALISES_SEM_CUBO and PESO in base.columns):
+        with etapa('load_df'):
+            base = carregar_base(table_name, func.__name__)
+    with etapa('analise'):
+        return func(base, **params)
+
+
+def df_para_json(result):
+    """DataFrame → dict serializável (colunas + linhas), com NaN → null."""
+    dados = json.loads(result.to_json(orient='split', index=False, force_ascii=False))
+    return {'colunas': dados['columns'], 'dados': dados['data']}
+
+
+def df_para_colunas(result):
+    """DataFrame → dict colunar (nomes das colunas + uma lista de valores por coluna)."""
+    dados = json.loads(result.to_json(orient='split', index=False, force_ascii=False))
+    valores = [list(coluna) for coluna in zip(*dados['data'])]
+    return {'colunas': dados['columns'],
+            'valores': valores or [[] for _ in dados['columns']]}
+
+
 # =====================================================
 # 🔹 Rotas Flask
 # =====================================================
@@ -219,15 +515,342 @@ def upload():
         if not file.filename.endswith('.xlsx'):
             return "Apenas arquivos .xlsx são permitidos", 400
 
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+        modo = request.form.get('modo') or 'substituir'
+        if modo not in MODOS_INGESTAO:
+            return "Modo de ingestão inválido", 400
+
+        # Nome único (mesmo para envios simultâneos do mesmo arquivo): o arquivo só é
+        # lido depois, pela tarefa de ingestão
+        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
-        init_db_from_excel(filepath)
-        return redirect(url_for('funcoes'))
+        tarefa = fila_ingestao.enfileirar(filepath, modo=modo)
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(
+                id=tarefa.id,
+                status_url=url_for('api_ingestao', tarefa_id=tarefa.id),
+            ), 202
+        return redirect(url_for('ingestao', tarefa_id=tarefa.id))
 
     tables = get_tables()
     return render_template('upload.html', tables=tables)
 
 
+@app.route('/ingestao/<tarefa_id>')
+def ingestao(tarefa_id):
+    tarefa = fila_ingestao.obter(tarefa_id)
+    if tarefa is None:
+        abort(404)
+    return render_template('ingestao.html', tarefa=tarefa)
+
+
+@app.route('/api/ingestao')
+def api_ingestoes():
+    return jsonify(fila_ingestao.listar())
+
+
+@app.route('/api/ingestao/<tarefa_id>')
+def api_ingestao(tarefa_id):
+    tarefa = fila_ingestao.obter(tarefa_id)
+    if tarefa is None:
+        abort(404)
+    return jsonify(tarefa)
+
+
+@app.route('/api/lote', methods=['POST'])
+def api_lote():
+    """Executa várias análises sobre a mesma base carregada uma única vez.
+
+    Corpo: ``{"dataset": "...", "itens": [{"key": "...", "params": {...}}, ...]}``
+    Cada item devolve seu resultado (ou erro) e o tempo gasto; um item lento ou
+    com falha não impede a resposta dos demais.
+    """
+    corpo = request.get_json(silent=True) or {}
+    itens = corpo.get('itens')
+    if not isinstance(itens, list) or not itens:
+        return jsonify(erro="Informe a lista 'itens'"), 400
+
+    tables = get_tables()
+    if not tables:
+        return jsonify(erro="Nenhuma base carregada"), 409
+    nomes = {t for _, t in tables}
+    table_name = corpo.get('dataset') or tables[0][1]
+    if table_name not in nomes:
+        return jsonify(erro=f"Base '{table_name}' não encontrada"), 404
+
+    inicio = time.perf_counter()
+    base = None if app.config['MOTOR_ANALISE'] == 'sql' else carregar_base(table_name)
+    tempo_carga = time.perf_counter() - inicio
+
+    def executar(item):
+        t0 = time.perf_counter()
+        key = item.get('key') if isinstance(item, dict) else None
+        resposta = {'key': key}
+        try:
+            if key not in FUNCTIONS_META:
+                raise KeyError(f"Função '{key}' não encontrada")
+            _, params = _ler_parametros(FUNCTIONS_META[key], item.get('params') or {}, table_name)
+            resposta['params'] = params
+            resposta.update(df_para_json(executar_analise(key, table_name, params, base)))
+            resposta['ok'] = True
+        except Exception as e:
+            resposta.update(ok=False, erro=f"{type(e).__name__}: {e}")
+        resposta['tempo_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+        return resposta
+
+    pool = ThreadPoolExecutor(max_workers=min(len(itens), app.config['LOTE_MAX_THREADS']))
+    futuros = [pool.submit(executar, item) for item in itens]
+    wait(futuros, timeout=app.config['LOTE_TIMEOUT_S'])
+    # Não espera as análises que estouraram o tempo: elas terminam em segundo plano
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    resultados = []
+    for item, futuro in zip(itens, futuros):
+        if futuro.done() and not futuro.cancelled():
+            resultados.append(futuro.result())
+        else:
+            key = item.get('key') if isinstance(item, dict) else None
+            resultados.append({'key': key, 'ok': False, 'erro': 'Tempo esgotado'})
+
+    return jsonify(
+        dataset=table_name,
+        resultados=resultados,
+        tempo_carga_ms=round(tempo_carga * 1000, 2),
+        tempo_total_ms=round((time.perf_counter() - inicio) * 1000, 2),
+    )
+
+
+# Campos com busca por prefixo → coluna da tabela de dimensões
+CAMPOS_BUSCA = {'crime': 'Natureza', 'bairro': 'Bairro'}
+
+
+@app.route('/api/sugestoes/<campo>')
+def api_sugestoes(campo):
+    """Sugestões para o campo digitado (``?q=...&dataset=...&limite=...``).
+
+    Valores que começam pelo texto vêm antes dos que apenas o contêm; dentro de
+    cada grupo, os mais frequentes primeiro.
+    """
+    if campo not in CAMPOS_BUSCA:
+        abort(404)
+    tables = get_tables()
+    if not tables:
+        return jsonify([])
+    table_name = request.args.get('dataset') or tables[0][1]
+    if table_name not in {t for _, t in tables}:
+        abort(404)
+    limite = max(1, min(request.args.get('limite', 10, type=int), 50))
+    q = _chave_busca(request.args.get('q', '').strip())
+
+    dims = load_dimensoes(table_name)
+    dims = dims[dims['coluna'] == CAMPOS_BUSCA[campo]]
+    if q:
+        inicio = dims['chave'].str.startswith(q)
+        dims = dims[inicio | dims['chave'].str.contains(q, regex=False)]
+        dims = dims.assign(_inicio=inicio).sort_values(['_inicio', 'n'], ascending=False,
+                                                       kind='stable')
+    else:
+        dims = dims.sort_values('n', ascending=False, kind='stable')
+    sugestoes = dims[['valor', 'n']].head(limite).itertuples(index=False)
+    return jsonify([{'valor': v, 'n': int(n)} for v, n in sugestoes])
+
+
+@app.route('/api/comparar/<key>', methods=['GET', 'POST'])
+def api_comparar(key):
+    """Executa a função em várias planilhas (todas ou ``datasets=a,b``) em paralelo e
+    devolve o quadro comparativo, com uma coluna por planilha, e os tempos de cada uma."""
+    if key not in FUNCTIONS_META:
+        abort(404)
+    tables = get_tables()
+    if not tables:
+        return jsonify(erro="Nenhuma base carregada"), 409
+    fonte = request.get_json(silent=True) or request.values
+    pedidas = fonte.get('datasets') or []
+    if isinstance(pedidas, str):
+        pedidas = [d.strip() for d in pedidas.split(',') if d.strip()]
+    escolhidas = [(s, t) for s, t in tables if not pedidas or t in pedidas or s in pedidas]
+    if not escolhidas:
+        return jsonify(erro="Nenhuma das planilhas pedidas existe"), 404
+
+    meta = FUNCTIONS_META[key]
+    _, params = _ler_parametros(meta, fonte, tables[0][1])
+    resultados, tempos = comparar_tabelas(
+        DB_PATH, app.config['SNAPSHOT_FOLDER'],
+        {s: (t, get_versao(t)) for s, t in escolhidas},
+        meta['func'], params, app.config['MOTOR_ANALISE'],
+        app.config['COMPARACAO_PROCESSOS'] or None,
+    )
+    total = tempos.pop('_total_ms')
+    quadro = quadro_comparativo(resultados)
+    return jsonify(
+        funcao=key,
+        params=params,
+        planilhas=[{'dataset': s, **tempos[s]} for s, _ in escolhidas],
+        tempo_total_ms=total,
+        **df_para_json(quadro),
+    )
+
+
+@app.route('/api/perfil_bairro')
+def api_perfil_bairro():
+    """Todas as análises de um bairro numa resposta (``?bairro=...&dataset=...``)."""
+    tables = get_tables()
+    if not tables:
+        return jsonify(erro="Nenhuma base carregada"), 409
+    table_name = request.args.get('dataset') or tables[0][1]
+    if table_name not in {t for _, t in tables}:
+        abort(404)
+    bairro = request.args.get('bairro', '').strip()
+    if not bairro:
+        return jsonify(erro="Informe o bairro"), 400
+
+    if app.config['MOTOR_ANALISE'] == 'sql':
+        # Sem base em memória: uma consulta por análise
+        analises = {nome: CONSULTAS_SQL[nome](get_conn(), table_name, bairro=bairro)
+                    for nome in ANALISES_BAIRRO}
+    else:
+        with etapa('perfil'):
+            analises = load_perfis(table_name).get(bairro)
+        if analises is None:
+            analises = perfil_bairro(carregar_base(table_name), bairro)
+    return jsonify(
+        dataset=table_name,
+        bairro=bairro,
+        analises={nome: df_para_json(r) for nome, r in analises.items()},
+    )
+
+
+def _filtro_sql_analise(key, params):
+    """Condições SQL das linhas que a análise conta, ou None se o filtro dela não
+    tiver tradução para SQL (condições em função)."""
+    return filtro_sql(filtro_analise(FUNCTIONS_META[key]['func'].__name__, **params))
+
+
+def _ler_filtros_ocorrencias(fonte):
+    """Tabela, filtros do drill-down (mesmos nomes dos parâmetros das análises) e as
+    condições SQL correspondentes.
+
+    Com ``funcao``, os filtros são os da própria análise (crimes fixos, meses do
+    intervalo etc.), para que as ocorrências sejam exatamente as contadas no gráfico.
+    """
+    tables = get_tables()
+    if not tables:
+        abort(404)
+    table_name = fonte.get('dataset') or tables[0][1]
+    if table_name not in {t for _, t in tables}:
+        abort(404)
+    key = (fonte.get('funcao') or '').strip()
+    if key:
+        if key not in FUNCTIONS_META:
+            abort(404)
+        _, params = _ler_parametros(FUNCTIONS_META[key], fonte, table_name)
+        try:
+            condicoes = _filtro_sql_analise(key, params)
+        except TypeError:
+            # Falta parâmetro obrigatório da análise
+            abort(400)
+        if condicoes is None:
+            abort(400)
+        return table_name, {'funcao': key, **params}, condicoes
+    filtros = {nome: (fonte.get(nome) or '').strip()
+               for nome in ('crime', 'bairro', 'periodo', 'semestre', 'ambiente')}
+    if filtros['semestre'] and filtros['semestre'] not in ('1', '2'):
+        abort(400)
+    filtros['semestre'] = int(filtros['semestre'] or 0)
+    filtros = {k: v for k, v in filtros.items() if v}
+    return table_name, filtros, filtros_ocorrencias(**filtros)
+
+
+@app.route('/api/ocorrencias')
+def api_ocorrencias():
+    """Ocorrências que atendem aos filtros, paginadas por chave (``?apos=<id>``)."""
+    table_name, filtros, condicoes = _ler_filtros_ocorrencias(request.args)
+    apos = request.args.get('apos', 0, type=int)
+    # Entre 1 e o máximo: 0 ou negativo deixaria a consulta sem LIMIT
+    limite = max(1, min(request.args.get('limite', app.config['OCORRENCIAS_POR_PAGINA'],
+                                         type=int),
+                        app.config['OCORRENCIAS_MAX_PAGINA']))
+
+    sql, params = consulta_ocorrencias(table_name, condicoes, apos, limite)
+    with etapa('sql'):
+        cur = get_conn().execute(sql, params)
+        colunas = [d[0] for d in cur.description]
+        linhas = cur.fetchall()
+
+    proximo = linhas[-1][0] if len(linhas) == limite else None
+    return jsonify(
+        dataset=table_name,
+        filtros=filtros,
+        colunas=colunas,
+        dados=[list(linha) for linha in linhas],
+        proximo=proximo,
+        proximo_url=url_for('api_ocorrencias', dataset=table_name, apos=proximo,
+                            limite=limite, **filtros) if proximo is not None else None,
+    )
+
+
+@app.route('/api/ocorrencias/exportar')
+def exportar_ocorrencias():
+    """Exporta as ocorrências filtradas em CSV ou NDJSON, em streaming.
+
+    As linhas são lidas do SQLite em blocos e escritas conforme chegam: a resposta
+    começa de imediato e a memória não depende do total exportado.
+    """
+    table_name, filtros, condicoes = _ler_filtros_ocorrencias(request.args)
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        abort(400)
+    sql, params = consulta_ocorrencias(table_name, condicoes)
+    bloco = app.config['EXPORTACAO_BLOCO']
+
+    def gerar():
+        # Conexão própria: o gerador roda depois que a view já retornou
+        conn = conectar(DB_PATH)
+        try:
+            cur = conn.execute(sql, params)
+            colunas = [d[0] for d in cur.description]
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            if formato == 'csv':
+                escritor.writerow(colunas)
+            while True:
+                linhas = cur.fetchmany(bloco)
+                if not linhas:
+                    break
+                if formato == 'csv':
+                    escritor.writerows(linhas)
+                else:
+                    for linha in linhas:
+                        buffer.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if formato == 'csv' and buffer.tell():
+                yield buffer.getvalue()  # só o cabeçalho (nenhuma linha)
+        finally:
+            conn.close()
+
+    nome = f'ocorrencias_{table_name}.{formato}'
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(gerar(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nome}"'})
+
+
+@app.route('/metricas')
+def metricas():
+    """Histogramas de latência (texto do Prometheus); acessível só localmente."""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+    return histogramas.texto(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route('/cache')
+def cache_stats():
+    return jsonify(dataframes=df_cache.stats(), resultados=resultado_cache.stats())
+
+
 @app.route('/funcoes')
 def funcoes():
     tables = get_tables()
@@ -251,117 +874,177 @@ def funcao_parametros(key):
     # =========================
     # GET → mostra formulário
     # =========================
-    if request.method == 'GET':
-        crimes = get_distinct(default_table, 'Natureza')
-        bairros = get_distinct(default_table, 'Bairro')
-        return render_template(
+    if request.method == 'GET' and not request.args:
+        with etapa('dimensoes'):
+            crimes = get_distinct(default_table, 'Natureza')
+            bairros = get_distinct(default_table, 'Bairro')
+        with etapa('template'):
+            return render_template(
+                'grafico.html',
+                stage='form',
+                func_key=key,
+                meta=meta,
+                tables=tables,
+                crimes=crimes,
+                bairros=bairros,
+                result=None
+            )
+
+    # =========================
+    # GET com filtros → página do gráfico
+    # =========================
+    if request.method == 'POST':
+        # Os filtros vão para a URL: a página é a mesma para qualquer escolha
+        table_name, params = _ler_parametros(meta, request.form, default_table)
+        return redirect(url_for('funcao_parametros', key=key, dataset=table_name, **params),
+                        303)
+
+    # Só a casca: os dados vêm de /api/grafico/<key> (mesma query string)
+    with etapa('template'):
+        resp = make_response(render_template(
             'grafico.html',
-            stage='form',
+            stage='chart',
             func_key=key,
             meta=meta,
-            tables=tables,
-            crimes=crimes,
-            bairros=bairros,
-            result=None
+        ))
+    resp.add_etag()
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
+
+
+@app.route('/api/grafico/<key>')
+def api_grafico(key):
+    """Dados do gráfico da função (mesmos parâmetros da página) em JSON colunar.
+
+    O corpo serializado fica no cache de resultados; a ETag muda com a versão dos
+    dados, então trocar de filtro e voltar custa um 304.
+    """
+    if key not in FUNCTIONS_META:
+        abort(404)
+    tables = get_tables()
+    if not tables:
+        return jsonify(erro="Nenhuma base carregada"), 409
+    table_name, params = _ler_parametros(FUNCTIONS_META[key], request.args, tables[0][1])
+    if table_name not in {t for _, t in tables}:
+        abort(404)
+
+    versao = get_versao(table_name)
+    etag = _etag_resultado(key, table_name, versao, params)
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response('', 304)
+    else:
+        corpo = resultado_cache.obter(
+            (table_name, versao, key, tuple(sorted(params.items()))),
+            lambda: json.dumps(dados_grafico(key, table_name, params), ensure_ascii=False,
+                               separators=(',', ':')).encode('utf-8')
         )
+        resp = Response(corpo, mimetype='application/json')
+    # Fraca: o corpo pode sair comprimido ou não (ver _comprimir_json)
+    resp.set_etag(etag, weak=True)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
 
-    # =========================
-    # POST → processa filtros
-    # =========================
+
+def _ler_parametros(meta, fonte, default_table):
+    """Tabela e parâmetros normalizados (sem espaços, vazios descartados) da requisição."""
     if 'dataset' in meta['params']:
-        table_name = request.form.get('dataset') or default_table
+        table_name = str(fonte.get('dataset') or '').strip() or default_table
     else:
         table_name = default_table
 
-    df = load_df(table_name)
-
     params = {}
-    if 'crime' in meta['params']:
-        params['crime'] = request.form.get('crime')
-    if 'bairro' in meta['params']:
-        params['bairro'] = request.form.get('bairro')
+    for nome in ('crime', 'bairro', 'periodo'):
+        if nome in meta['params']:
+            params[nome] = str(fonte.get(nome) or '').strip()
     if 'semestre' in meta['params']:
-        semestre = request.form.get('semestre') or "1"
+        semestre = str(fonte.get('semestre') or '').strip() or "1"
         params['semestre'] = int(semestre)
-    if 'periodo' in meta['params']:
-        params['periodo'] = request.form.get('periodo')
+    for nome, padrao in (('inicio', 1), ('fim', 12), ('janela', 3)):
+        if nome in meta['params']:
+            valor = str(fonte.get(nome) or '').strip()
+            params[nome] = int(valor) if valor.isdigit() else padrao
+    return table_name, {k: v for k, v in params.items() if v}
 
-    func = meta['func']
-    result = func(df, **{k: v for k, v in params.items() if v})
 
-    # =====================================================
-    # 🔹 Ranking de Bairros por Crime → múltiplos gráficos
-    #     Esperoa DataFrame com colunas: Bairro, Crimes, Bloco
-    # =====================================================
-    if key == "ranking_bairros_crime" and isinstance(result, pd.DataFrame) and "Bloco" in result.columns:
-        blocos = []
-        result = result.copy()
+def _etag_resultado(key, table_name, versao, params):
+    chave = repr((key, table_name, versao, sorted(params.items())))
+    return hashlib.sha1(chave.encode('utf-8')).hexdigest()
 
-        result["Bairro"] = result["Bairro"].astype(str).replace(["None", "nan", "0", ""], pd.NA)
-        result["Crimes"] = pd.to_numeric(result["Crimes"], errors="coerce").fillna(0)
-        result = result.dropna(subset=["Bairro"])
-        result = result[result["Crimes"] > 0]
-
-        for bloco_id, bloco_df in result.groupby("Bloco"):
-            labels = bloco_df["Bairro"].tolist()    # ✅ note os ()
-            values = bloco_df["Crimes"].astype(float).tolist() # ✅ note os ()
-            blocos.append({
-                "labels": labels,
-                "data": values,  # <-- CORRIGIDO (era "values")
-                "titulo": f"Bloco {int(bloco_id)}"
-            })
-
-        result_table = result[["Bairro", "Crimes", "Bloco"]].to_html(
-            classes="table table-sm table-striped",
-            index=False
-        )
 
-        return render_template(
-            "grafico.html",
-            stage="chart_multi",
-            meta=meta,
-            blocos=blocos,
-            result_table=result_table
-        )
+def dados_grafico(key, table_name, params):
+    """Executa a análise e monta o JSON do gráfico.
 
+    ``tipo`` ``barras``: ``series`` com ``titulo``, ``labels`` e ``valores`` (uma por
+    bloco no ranking de bairros por crime); ``mapa``: ``mapa`` com ``horas``, ``dias``
+    e ``valores`` (uma lista por hora). ``tabela`` traz os dados detalhados por coluna;
+    ``completo``, só no ranking aproximado, diz se o top-k foi provado completo.
+    """
+    result = executar_analise(key, table_name, params)
+    # Sem link quando o filtro da análise não tem tradução para SQL: a exportação
+    # traria ocorrências que não estão no gráfico
+    exportar = None
+    if _filtro_sql_analise(key, params) is not None:
+        exportar = url_for('exportar_ocorrencias', dataset=table_name, formato='csv',
+                           funcao=key, **params)
+    dados = {
+        'funcao': key,
+        'dataset': table_name,
+        'params': params,
+        'exportar': exportar,
+    }
+    if not isinstance(result, pd.DataFrame):
+        return {**dados, 'tipo': 'barras', 'series': [], 'tabela': None}
+    if 'completo' in result.attrs:
+        # Ranking aproximado (ver topk.py): diz se o top-k foi provado completo
+        dados['completo'] = bool(result.attrs['completo'])
 
     # =====================================================
-    # 🔹 Caso normal: um gráfico
+    # 🔹 Mapa de calor: horas nas linhas, dias nas colunas
     # =====================================================
-    if isinstance(result, pd.DataFrame):
-        labels = result.iloc[:, 0].astype(str).tolist()
+    if key == "mapa_calor_crime_bairro":
+        dias = list(result.columns[1:])
+        contagens = result[dias].to_numpy(dtype='int64')
+        return {
+            **dados,
+            'tipo': 'mapa',
+            'mapa': {
+                'horas': result.iloc[:, 0].astype(int).tolist(),
+                'dias': dias,
+                'valores': contagens.tolist(),
+            },
+            'total': int(contagens.sum()),
+        }
 
-        numeric_cols = result.select_dtypes(include=['number']).columns
-        if len(numeric_cols) > 0:
-            values = result[numeric_cols[0]].astype(float).tolist()
-        else:
-            try:
-                values = pd.to_numeric(
-                    result.iloc[:, -1],
-                    errors='coerce'
-                ).fillna(0).tolist()
-            except Exception:
-                values = [0] * len(result)
-
-        result_table = result.to_html(
-            classes='table table-sm table-striped',
-            index=False
+    # =====================================================
+    # 🔹 Ranking de Bairros por Crime → um gráfico por bloco
+    #     DataFrame com colunas: Bairro, Crimes, Bloco
+    # =====================================================
+    if key == "ranking_bairros_crime" and "Bloco" in result.columns:
+        result = result.assign(
+            Bairro=result["Bairro"].astype(str).replace(["None", "nan", "0", ""], pd.NA),
+            Crimes=pd.to_numeric(result["Crimes"], errors="coerce").fillna(0),
         )
-    else:
-        labels, values, result_table = [], [], None
-
-    return render_template(
-        'grafico.html',
-        stage='chart',
-        func_key=key,
-        meta=meta,
-        tables=tables,
-        params=params,
-        labels=labels,
-        values=values,
-        table_name=table_name,
-        result_table=result_table
-    )
+        result = result.dropna(subset=["Bairro"])
+        result = result[result["Crimes"] > 0][["Bairro", "Crimes", "Bloco"]]
+        series = [
+            {'titulo': f"Bloco {int(bloco_id)}",
+             'labels': bloco_df["Bairro"].tolist(),
+             'valores': bloco_df["Crimes"].tolist()}
+            for bloco_id, bloco_df in result.groupby("Bloco")
+        ]
+        return {**dados, 'tipo': 'barras', 'series': series, 'tabela': df_para_colunas(result)}
+
+    # =====================================================
+    # 🔹 Caso normal: um gráfico
+    # =====================================================
+    numeric_cols = result.select_dtypes(include=['number']).columns
+    valores = result[numeric_cols[0]] if len(numeric_cols) > 0 else result.iloc[:, -1]
+    series = [{
+        'titulo': FUNCTIONS_META[key]['label'],
+        'labels': result.iloc[:, 0].astype(str).tolist(),
+        'valores': pd.to_numeric(valores, errors='coerce').fillna(0).tolist(),
+    }]
+    return {**dados, 'tipo': 'barras', 'series': series, 'tabela': df_para_colunas(result)}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+# banco.py
+# Acesso ao SQLite compartilhado pelos workers do servidor.
+#
+# O banco fica em modo WAL: a ingestão não bloqueia os leitores, que continuam
+# vendo a última versão confirmada até a troca das tabelas (ver ingestao.py).
+# Cada thread reaproveita uma conexão de leitura própria (pragmas de leitura e
+# cache de statements preparados); escritas usam conexões curtas com espera
+# por bloqueio, em vez de falhar com "database is locked".
+
+import os
+import sqlite3
+import threading
+
+# Espera máxima por um bloqueio de escrita (segundos)
+ESPERA_BLOQUEIO_S = 30
+
+# Statements preparados guardados por conexão (o SQL das consultas se repete)
+STATEMENTS_EM_CACHE = 256
+
+PRAGMAS_LEITURA = [
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",  # 256 MB lidos direto do cache de páginas do SO
+    "PRAGMA cache_size = -32768",    # 32 MB
+    "PRAGMA temp_store = MEMORY",
+]
+
+PRAGMAS_ESCRITA = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+]
+
+
+def conectar(db_path):
+    return sqlite3.connect(db_path, timeout=ESPERA_BLOQUEIO_S,
+                           cached_statements=STATEMENTS_EM_CACHE)
+
+
+def conectar_escrita(db_path):
+    """Conexão nova para escrita, já em WAL. Quem abre, fecha."""
+    conn = conectar(db_path)
+    for pragma in PRAGMAS_ESCRITA:
+        conn.execute(pragma)
+    return conn
+
+
+class Banco:
+    """Conexões de leitura por thread (e por processo) para um arquivo SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._wal = False
+
+    def leitura(self):
+        """Conexão de leitura da thread atual. Não deve ser fechada: é reaproveitada."""
+        conn = getattr(self._local, 'conn', None)
+        # Depois de um fork (gunicorn --preload) a conexão herdada não pode ser usada
+        if conn is None or self._local.pid != os.getpid():
+            self._ativar_wal()
+            conn = conectar(self.db_path)
+            for pragma in PRAGMAS_LEITURA:
+                conn.execute(pragma)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def escrita(self):
+        return conectar_escrita(self.db_path)
+
+    def _ativar_wal(self):
+        # journal_mode é gravado no arquivo: basta uma vez por processo
+        if self._wal:
+            return
+        conn = conectar(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._wal = True
+        except sqlite3.OperationalError:
+            pass  # Outro processo escrevendo agora; tenta na próxima conexão
+        finally:
+            conn.close()
@@ -0,0 +1,344 @@
+# benchmark.py
+# Gerador de dados sintéticos (com semente) e micro-benchmark das análises.
+#
+#   python benchmark.py --tamanhos 10000,100000,1000000 --saida resultados.json
+#   python benchmark.py --tamanhos 10000,100000 --baseline baseline.json
+#   python benchmark.py --tamanhos 10000,100000 --saida baseline.json   (grava a referência)
+#
+# Para cada tamanho, mede a ingestão (init_db_from_excel), a carga da base
+# (load_df, fria e com cache) e cada função de FUNCTIONS_META: tempo (mediana
+# de várias execuções) e pico de memória alocada (tracemalloc, numa execução
+# separada para não distorcer o tempo). Com --baseline, compara com a
+# referência e termina com código 1 se algo ficou mais lento que a tolerância.
+#
+#   python benchmark.py --tamanhos 100000 --formatos
+#
+# Com --formatos, compara também a mesma base em três formatos: como lida do
+# SQLite, convertida por compactar_df e carregada do snapshot colunar (memória
+# ocupada e tempo de uma rodada com todas as funções, sem o índice de bitmaps).
+#
+# A verificação de que as funções não alteram a base e ficam no orçamento de
+# memória está nos testes (tests/test_kernel.py).
+#
+# Tudo roda numa pasta temporária (banco, uploads e snapshots próprios).
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Uma planilha do Excel comporta 1.048.576 linhas (com o cabeçalho)
+LINHAS_POR_PLANILHA = 1_000_000
+LOTE_GERACAO = 250_000
+
+# =====================================================
+# 🔹 Gerador de dados
+# =====================================================
+NATUREZAS = {
+    'FURTO SIMPLES': 18, 'FURTO QUALIFICADO': 12, 'FURTO': 6, 'ROUBO': 10,
+    'ROUBO AGRAVADO': 3, 'DANO': 8, 'VIOLACAO DE DOMICILIO': 4, 'AMEACA': 14,
+    'LESAO CORPORAL': 9, 'DROGAS PARA O CONSUMO PESSOAL': 5, 'ESTELIONATO': 7,
+    'HOMICIDIO': 0.5, 'LATROCINIO': 0.1, 'SEQUESTRO': 0.1, 'ESTUPRO': 0.4,
+    'VIAS DE FATO': 6, 'EMBRIAGUEZ AO VOLANTE': 2,
+}
+AMBIENTES = {'VIA PUBLICA': 45, 'RESIDENCIA': 30, 'COMERCIO': 18, 'ESCOLA': 2, 'OUTROS': 5}
+DIAS = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+PESO_DIAS = [13, 13, 13, 14, 16, 17, 14]
+MESES = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez']
+PESO_MESES = [10, 8, 9, 8, 8, 7, 8, 8, 8, 8, 8, 10]
+# Mais ocorrências no fim da tarde e à noite, poucas de madrugada
+PESO_HORAS = [4, 3, 2, 2, 1, 1, 2, 3, 4, 5, 5, 6, 6, 6, 6, 6, 7, 8, 9, 9, 8, 7, 6, 5]
+N_BAIRROS = 150
+PROP_HORA_NULA = 0.02
+PROP_BAIRRO_SUJO = 0.01  # espaços extras, como nas planilhas reais
+
+
+def _prob(pesos):
+    p = np.asarray(pesos, dtype=float)
+    return p / p.sum()
+
+
+def gerar_lotes(n, seed=0, lote=LOTE_GERACAO):
+    """Gera ``n`` ocorrências sintéticas em DataFrames de até ``lote`` linhas.
+
+    As colunas são as das planilhas reais. Os bairros seguem uma distribuição
+    de Zipf (poucos concentram a maior parte dos registros); natureza, ambiente,
+    hora, dia e mês têm pesos fixos. A mesma semente gera sempre os mesmos dados.
+    """
+    rng = np.random.default_rng(seed)
+    naturezas = np.array(list(NATUREZAS))
+    ambientes = np.array(list(AMBIENTES))
+    bairros = np.array(['CENTRO'] + [f'BAIRRO {i:03d}' for i in range(1, N_BAIRROS)])
+    p_natureza, p_ambiente = _prob(list(NATUREZAS.values())), _prob(list(AMBIENTES.values()))
+    p_bairro = _prob(1.0 / np.arange(1, N_BAIRROS + 1))
+
+    for inicio in range(0, n, lote):
+        m = min(lote, n - inicio)
+        bairro = rng.choice(bairros, m, p=p_bairro).astype(object)
+        sujo = rng.random(m) < PROP_BAIRRO_SUJO
+        bairro[sujo] = [f' {b} ' for b in bairro[sujo]]
+        hora = rng.choice(24, m, p=_prob(PESO_HORAS)).astype(float)
+        hora[rng.random(m) < PROP_HORA_NULA] = np.nan
+        yield pd.DataFrame({
+            'Natureza': rng.choice(naturezas, m, p=p_natureza),
+            'Bairro': bairro,
+            'Ambiente': rng.choice(ambientes, m, p=p_ambiente),
+            'Hora': pd.array(hora, dtype='Int64'),
+            'Dia da Semana': rng.choice(DIAS, m, p=_prob(PESO_DIAS)),
+            'Mês': rng.choice(MESES, m, p=_prob(PESO_MESES)),
+        })
+
+
+def gerar_planilha(caminho, n, seed=0):
+    """Grava ``n`` ocorrências num .xlsx (uma planilha a cada LINHAS_POR_PLANILHA)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws, linhas_na_planilha, n_planilhas = None, 0, 0
+    for df in gerar_lotes(n, seed):
+        colunas = list(df.columns)
+        valores = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        for linha in valores:
+            if ws is None or linhas_na_planilha == LINHAS_POR_PLANILHA:
+                n_planilhas += 1
+                ws = wb.create_sheet(str(2023 + n_planilhas))
+                ws.append(colunas)
+                linhas_na_planilha = 0
+            ws.append(linha)
+            linhas_na_planilha += 1
+    wb.save(caminho)
+    return caminho
+
+
+def gravar_direto(app_mod, n, seed=0, table_name='sintetico'):
+    """Grava a base sintética direto no SQLite (sem Excel), com cubo, dimensões e snapshot.
+
+    Para tamanhos em que gerar e ler o .xlsx levaria tempo demais.
+    """
+    import sqlite3
+
+    from cubo import construir_cubo, combinar_cubos, gravar_cubo
+    from cubo import construir_dimensoes, gravar_dimensoes
+    from ingestao import _criar_meta
+    from snapshot import escrever_snapshot, pasta_snapshot
+
+    conn = sqlite3.connect(app_mod.DB_PATH)
+    _criar_meta(conn)
+    cubo = None
+    for i, lote in enumerate(gerar_lotes(n, seed)):
+        lote = app_mod.preparar_base(lote)
+        lote.to_sql(table_name, conn, if_exists='replace' if i == 0 else 'append', index=False)
+        parcial = construir_cubo(lote)
+        cubo = parcial if cubo is None else combinar_cubos([cubo, parcial])
+    gravar_cubo(conn, table_name, cubo)
+    gravar_dimensoes(conn, table_name, construir_dimensoes(cubo))
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta_sheets VALUES (?, ?)", (table_name, table_name))
+        conn.execute("INSERT OR REPLACE INTO meta_versoes VALUES (?, 1)", (table_name,))
+    escrever_snapshot(conn, table_name,
+                      pasta_snapshot(app_mod.app.config['SNAPSHOT_FOLDER'], table_name, 1))
+    conn.close()
+
+
+# =====================================================
+# 🔹 Medição
+# =====================================================
+def medir(func, repeticoes=5, memoria=True, preparar=None):
+    """Tempo (mediana/mínimo em s) de ``func()`` e pico de memória alocada (MB).
+
+    ``preparar()`` roda antes de cada execução, fora da medição (ex.: limpar cache).
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - t0)
+    r = {'mediana_s': statistics.median(tempos), 'min_s': min(tempos), 'repeticoes': repeticoes}
+    if memoria:
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        try:
+            func()
+            r['pico_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return r
+
+
+def _parametros(app_mod, table_name):
+    """Valores de filtro representativos: crime e bairro mais frequentes da base."""
+    dims = app_mod.load_dimensoes(table_name)
+
+    def mais_frequente(coluna):
+        d = dims[dims['coluna'] == coluna]
+        return d.sort_values('n', ascending=False)['valor'].iloc[0]
+
+    return {'crime': mais_frequente('Natureza'), 'bairro': mais_frequente('Bairro'),
+            'periodo': 'Noite', 'semestre': 1, 'inicio': 1, 'fim': 12, 'janela': 3}
+
+
+def carregar_formatos(app_mod, table_name):
+    """A mesma base em cada formato: ``sqlite`` (como lida, tipos do read_sql),
+    ``compactar_df`` e ``snapshot`` (se a versão tiver um)."""
+    from analise_seguranca_funcoes import COLUNAS_DERIVADAS, compactar_df, preparar_base
+    from snapshot import carregar_snapshot, pasta_snapshot
+
+    lida = pd.read_sql_query(f'SELECT * FROM "{table_name}"', app_mod.get_conn())
+    if not set(COLUNAS_DERIVADAS) <= set(lida.columns):
+        lida = preparar_base(lida)
+    formatos = {'sqlite': lida, 'compactar_df': compactar_df(lida)}
+    pasta = pasta_snapshot(app_mod.app.config['SNAPSHOT_FOLDER'], table_name,
+                           app_mod.get_versao(table_name))
+    if os.path.exists(os.path.join(pasta, 'schema.json')):
+        formatos['snapshot'] = carregar_snapshot(pasta)
+    return formatos
+
+
+def executar_tamanho(n, args, resultados):
+    import app as app_mod
+
+    def registrar(etapa, nome, r):
+        r.update(tamanho=n, etapa=etapa, nome=nome)
+        resultados.append(r)
+        print(f"  {etapa:<8} {nome:<34} {r['mediana_s'] * 1000:10.1f} ms"
+              + (f"  {r['pico_mb']:8.1f} MB" if 'pico_mb' in r else '')
+              + (f"  {r['memoria_mb']:8.1f} MB em memória" if 'memoria_mb' in r else ''))
+
+    if n <= args.max_excel:
+        caminho = gerar_planilha(os.path.join(app_mod.app.config['UPLOAD_FOLDER'],
+                                              f'sintetico_{n}.xlsx'), n, args.seed)
+        # A ingestão usa vários processos: tracemalloc veria só o principal
+        registrar('ingestao', 'init_db_from_excel',
+                  medir(lambda: app_mod.init_db_from_excel(caminho), 1, memoria=False))
+    else:
+        gravar_direto(app_mod, n, args.seed)
+    table_name = app_mod.get_tables()[0][1]
+
+    registrar('carga', 'load_df', medir(lambda: app_mod.load_df(table_name), args.repeticoes,
+                                        preparar=app_mod.df_cache.limpar))
+    registrar('carga', 'load_df (cache)', medir(lambda: app_mod.load_df(table_name),
+                                                args.repeticoes, memoria=False))
+
+    todos = _parametros(app_mod, table_name)
+    base = app_mod.carregar_base(table_name)
+    for key, meta in app_mod.FUNCTIONS_META.items():
+        params = {p: todos[p] for p in meta['params'] if p in todos}
+        registrar('funcao', key, medir(
+            lambda: app_mod.executar_analise(key, table_name, params, base), args.repeticoes))
+
+    if args.formatos:
+        from analise_seguranca_funcoes import compactar_df
+
+        formatos = carregar_formatos(app_mod, table_name)
+        registrar('formato', 'conversão compactar_df',
+                  medir(lambda: compactar_df(formatos['sqlite']), args.repeticoes))
+        chamadas = [(meta['func'], {p: todos[p] for p in meta['params'] if p in todos})
+                    for meta in app_mod.FUNCTIONS_META.values()]
+        for nome, df in formatos.items():
+            # Direto nas funções: sem indexar(), o filtro percorre as colunas de cada formato
+            r = medir(lambda: [func(df, **params) for func, params in chamadas],
+                      args.repeticoes, memoria=False)
+            r['memoria_mb'] = df.memory_usage(deep=True).sum() / 2**20
+            registrar('formato', f'rodada ({nome})', r)
+
+
+# =====================================================
+# 🔹 Comparação com a referência
+# =====================================================
+def _chave(r):
+    return (r['tamanho'], r['etapa'], r['nome'])
+
+
+def comparar(resultados, baseline, tolerancia, minimo_s=0.005):
+    """Medições mais lentas que a referência além da tolerância (ignora diferenças < minimo_s)."""
+    referencia = {_chave(r): r for r in baseline['resultados']}
+    regressoes = []
+    for r in resultados:
+        ref = referencia.get(_chave(r))
+        if ref is None:
+            continue
+        atual, antes = r['mediana_s'], ref['mediana_s']
+        if atual > antes * (1 + tolerancia) and atual - antes > minimo_s:
+            regressoes.append({**r, 'referencia_s': antes, 'variacao': atual / antes - 1})
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das funções de análise')
+    parser.add_argument('--tamanhos', default='10000,100000,1000000',
+                        help='linhas por rodada, separadas por vírgula (ex.: 10000,10000000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--motor', choices=['pandas', 'sql', 'cubo'],
+                        help='MOTOR_ANALISE (padrão: o da variável de ambiente)')
+    parser.add_argument('--max-excel', type=int, default=LINHAS_POR_PLANILHA,
+                        help='acima disso a base é gravada direto no SQLite, sem Excel')
+    parser.add_argument('--saida', help='grava os resultados (JSON) neste arquivo')
+    parser.add_argument('--baseline', help='JSON de referência para comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='aumento de tempo aceito em relação à referência (0.25 = 25%%)')
+    parser.add_argument('--formatos', action='store_true',
+                        help='compara memória e tempo da base lida do SQLite, compactada e do snapshot')
+    args = parser.parse_args(argv)
+
+    tamanhos = [int(t) for t in args.tamanhos.split(',')]
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, raiz)
+    if args.motor:
+        os.environ['MOTOR_ANALISE'] = args.motor
+    caminhos = {k: os.path.abspath(v) for k, v in (('saida', args.saida),
+                                                    ('baseline', args.baseline)) if v}
+    resultados = []
+    pasta_inicial = os.getcwd()
+    for n in tamanhos:
+        print(f'== {n} linhas')
+        # Pasta nova por tamanho: o app usa caminhos relativos (dados.db, uploads, snapshots)
+        pasta = tempfile.mkdtemp(prefix='benchmark_')
+        os.chdir(pasta)
+        sys.modules.pop('app', None)
+        try:
+            executar_tamanho(n, args, resultados)
+        finally:
+            os.chdir(pasta_inicial)
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    saida = {
+        'ambiente': {
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'plataforma': platform.platform(),
+            'cpus': os.cpu_count(), 'motor': os.environ.get('MOTOR_ANALISE', 'pandas'),
+            'seed': args.seed, 'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'resultados': resultados,
+    }
+    if 'saida' in caminhos:
+        with open(caminhos['saida'], 'w', encoding='utf-8') as f:
+            json.dump(saida, f, ensure_ascii=False, indent=1)
+
+    if 'baseline' in caminhos:
+        with open(caminhos['baseline'], encoding='utf-8') as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        for r in regressoes:
+            print(f"REGRESSÃO {r['tamanho']} {r['etapa']} {r['nome']}: "
+                  f"{r['referencia_s'] * 1000:.1f} → {r['mediana_s'] * 1000:.1f} ms "
+                  f"(+{r['variacao']:.0%})")
+        if regressoes:
+            return 1
+        print('Sem regressões em relação à referência.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
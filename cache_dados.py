@@ -0,0 +1,108 @@
+# cache_dados.py
+# Cache em memória, compartilhado entre threads, para os DataFrames carregados do SQLite
+
+import threading
+from collections import OrderedDict
+
+
+def tamanho_df(df):
+    """Estimativa em bytes ocupados por um DataFrame (inclui strings)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def tamanho_perfis(perfis):
+    """Bytes ocupados por ``{bairro: {análise: DataFrame}}`` (ver perfis_bairros)."""
+    return sum(tamanho_df(df) for perfil in perfis.values() for df in perfil.values())
+
+
+class CacheLRU:
+    """Cache LRU limitado por um orçamento de memória em bytes.
+
+    As chaves são tuplas ``(tabela, versao, ...)``; ao gravar uma versão nova de
+    uma tabela, as versões antigas dela são descartadas.
+    """
+
+    def __init__(self, max_bytes, tamanho=tamanho_df):
+        self.max_bytes = max_bytes
+        self._tamanho = tamanho
+        self._itens = OrderedDict()  # chave -> (valor, bytes)
+        self._lock = threading.Lock()
+        self._carregando = {}  # chave -> Lock (evita cargas duplicadas)
+        self.bytes_usados = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def put(self, chave, valor):
+        n = self._tamanho(valor)
+        with self._lock:
+            self._remover_versoes(chave)
+            if n > self.max_bytes:
+                # Maior que o orçamento inteiro: não vale a pena guardar
+                return valor
+            self._itens[chave] = (valor, n)
+            self.bytes_usados += n
+            while self.bytes_usados > self.max_bytes and self._itens:
+                _, (_, liberado) = self._itens.popitem(last=False)
+                self.bytes_usados -= liberado
+                self.evictions += 1
+        return valor
+
+    def obter(self, chave, carregar):
+        """Devolve o valor em cache ou chama ``carregar()`` uma única vez por chave."""
+        valor = self.get(chave)
+        if valor is not None:
+            return valor
+
+        with self._lock:
+            trava = self._carregando.setdefault(chave, threading.Lock())
+        with trava:
+            # Outra thread pode ter carregado enquanto esperávamos
+            with self._lock:
+                item = self._itens.get(chave)
+            if item is not None:
+                return item[0]
+            try:
+                return self.put(chave, carregar())
+            finally:
+                with self._lock:
+                    self._carregando.pop(chave, None)
+
+    def invalidar(self, tabela):
+        """Remove todas as versões de uma tabela."""
+        with self._lock:
+            for chave in [c for c in self._itens if c[0] == tabela]:
+                self.bytes_usados -= self._itens.pop(chave)[1]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes_usados = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "bytes_usados": self.bytes_usados,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remover_versoes(self, chave):
+        # Chamado com o lock adquirido
+        for antiga in [c for c in self._itens if c[0] == chave[0] and c[1] != chave[1]]:
+            self.bytes_usados -= self._itens.pop(antiga)[1]
+        if chave in self._itens:
+            self.bytes_usados -= self._itens.pop(chave)[1]
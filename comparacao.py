@@ -0,0 +1,165 @@
+# comparacao.py
+# Execução de uma mesma função de análise em várias planilhas (tabelas) ao mesmo
+# tempo, num pool de processos, e junção dos resultados num quadro comparativo
+# (ex.: ocorrências por bairro, uma coluna por ano).
+#
+# Cada processo carrega a própria tabela (snapshot mapeado em memória, quando
+# existir: o cache de páginas do SO é compartilhado entre os processos).
+
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from analise_seguranca_funcoes import (
+    COLUNAS_DERIVADAS, DIAS_SEMANA, compactar_df, preparar_base,
+)
+from consultas_sql import CONSULTAS_SQL
+from cubo import ANALISES_SEM_CUBO, tabela_cubo
+from snapshot import carregar_snapshot, pasta_snapshot
+
+_pool = None
+_pool_processos = None
+
+
+def ler_tabela(conn, table_name):
+    """Lê a tabela do SQLite já preparada e compactada."""
+    df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+    if not set(COLUNAS_DERIVADAS) <= set(df.columns):
+        # Tabela gravada antes das colunas derivadas existirem
+        df = preparar_base(df)
+    return compactar_df(df)
+
+
+def carregar_tabela(conn, snapshots, table_name, versao):
+    # Snapshot colunar mapeado em memória, quando existir; senão, lê do SQLite
+    pasta = pasta_snapshot(snapshots, table_name, versao)
+    if os.path.exists(os.path.join(pasta, 'schema.json')):
+        return carregar_snapshot(pasta)
+    return ler_tabela(conn, table_name)
+
+
+def analisar_tabela(db_path, snapshots, table_name, versao, func, params, motor):
+    """Executa ``func`` numa tabela (roda no processo do pool).
+
+    Devolve ``{'resultado', 'carga_s', 'analise_s'}``.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        inicio = time.perf_counter()
+        if motor == 'sql' and func.__name__ in CONSULTAS_SQL:
+            resultado = CONSULTAS_SQL[func.__name__](conn, table_name, **params)
+            return {'resultado': resultado, 'carga_s': 0.0,
+                    'analise_s': time.perf_counter() - inicio}
+        base = None
+        if motor == 'cubo' and func.__name__ not in ANALISES_SEM_CUBO:
+            try:
+                base = compactar_df(
+                    pd.read_sql_query(f'SELECT * FROM "{tabela_cubo(table_name)}"', conn))
+            except pd.errors.DatabaseError:
+                pass  # Base gravada antes do cubo existir: usa a tabela completa
+        if base is None:
+            base = carregar_tabela(conn, snapshots, table_name, versao)
+        carregada = time.perf_counter()
+        resultado = func(base, **params)
+        return {'resultado': resultado, 'carga_s': carregada - inicio,
+                'analise_s': time.perf_counter() - carregada}
+    finally:
+        conn.close()
+
+
+def _executor(processos):
+    """Pool de processos reaproveitado entre as requisições (criar um custa caro)."""
+    global _pool, _pool_processos
+    if _pool is None or _pool_processos != processos:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # spawn: seguro mesmo quando chamado de um servidor com várias threads
+        _pool = ProcessPoolExecutor(max_workers=processos,
+                                    mp_context=multiprocessing.get_context('spawn'))
+        _pool_processos = processos
+    return _pool
+
+
+def comparar_tabelas(db_path, snapshots, tabelas, func, params, motor='pandas', processos=None):
+    """Executa ``func`` em cada tabela de ``tabelas`` (``{rotulo: (table_name, versao)}``).
+
+    Devolve ``(resultados, tempos)``: DataFrame por rótulo (só as que deram certo) e,
+    por rótulo, ``{'ok', 'carga_ms', 'analise_ms', 'tempo_ms', 'erro'}``.
+    """
+    processos = processos or min(len(tabelas), os.cpu_count() or 1)
+    argumentos = {rotulo: (db_path, snapshots, t, versao, func, params, motor)
+                  for rotulo, (t, versao) in tabelas.items()}
+    inicio = time.perf_counter()
+    if processos <= 1:
+        saidas = {}
+        for rotulo, args in argumentos.items():
+            try:
+                saidas[rotulo] = analisar_tabela(*args)
+            except Exception as e:
+                saidas[rotulo] = e
+    else:
+        pool = _executor(processos)
+        futuros = {rotulo: pool.submit(analisar_tabela, *args)
+                   for rotulo, args in argumentos.items()}
+        saidas = {rotulo: f.exception() or f.result() for rotulo, f in futuros.items()}
+
+    resultados, tempos = {}, {}
+    for rotulo, saida in saidas.items():
+        if isinstance(saida, Exception):
+            tempos[rotulo] = {'ok': False, 'erro': f'{type(saida).__name__}: {saida}'}
+            continue
+        resultados[rotulo] = saida['resultado']
+        tempos[rotulo] = {
+            'ok': True,
+            'carga_ms': round(saida['carga_s'] * 1000, 2),
+            'analise_ms': round(saida['analise_s'] * 1000, 2),
+            'linhas': len(saida['resultado']),
+        }
+    tempos['_total_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return resultados, tempos
+
+
+# Colunas numéricas que não são a contagem: paginação do ranking e média móvel
+_AUXILIARES = ('Bloco', 'Média móvel')
+
+
+def _coluna_valor(df):
+    # Última coluna numérica (a contagem)
+    numericas = [c for c in df.select_dtypes(include='number').columns if c not in _AUXILIARES]
+    return numericas[-1] if numericas else None
+
+
+def _formato_longo(df):
+    # Mapa de calor (uma coluna de contagem por dia): vira (Hora, Dia da Semana) → contagem
+    if list(df.columns) != ['Hora'] + DIAS_SEMANA:
+        return df
+    return df.melt(id_vars='Hora', var_name='Dia da Semana', value_name='Quantidade')
+
+
+def quadro_comparativo(resultados):
+    """Junta os resultados por rótulo num quadro: chaves nas linhas, uma coluna por
+    rótulo (contagem; 0 onde a chave não aparece) e a coluna Total."""
+    partes = []
+    for rotulo, df in resultados.items():
+        df = _formato_longo(df)
+        valor = _coluna_valor(df)
+        if valor is None or df.empty:
+            continue
+        chaves = [c for c in df.columns if c != valor and c not in _AUXILIARES]
+        partes.append(df[chaves + [valor]].rename(columns={valor: 'valor'})
+                      .assign(dataset=rotulo))
+    if not partes:
+        return pd.DataFrame()
+    chaves = [c for c in partes[0].columns if c not in ('valor', 'dataset')]
+    juntos = pd.concat(partes, ignore_index=True)
+    quadro = (juntos.groupby(chaves + ['dataset'], dropna=False, sort=False)['valor'].sum()
+              .unstack('dataset', fill_value=0))
+    quadro = quadro[[r for r in resultados if r in quadro.columns]]
+    quadro['Total'] = quadro.sum(axis=1)
+    quadro = quadro.sort_values('Total', ascending=False, kind='stable').reset_index()
+    quadro.columns.name = None
+    return quadro
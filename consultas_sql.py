@@ -0,0 +1,278 @@
+# consultas_sql.py
+# Versões das funções de análise executadas direto no SQLite (GROUP BY parametrizado).
+# Cada consulta devolve um DataFrame com o mesmo formato da função pandas equivalente.
+
+import pandas as pd
+
+from analise_seguranca_funcoes import (
+    crimes_perigosos, crimes_perigosos_mensal, furtos_roubos, crimes_comercio,
+)
+from filtros import CAMPOS
+
+# Colunas indexadas na ingestão (filtros usados pelas consultas)
+COLUNAS_INDICE = ['Natureza', 'Bairro', 'Ambiente', 'Hora', 'Mês']
+
+# Periodo, Mês_num e Bairro sem espaços já vêm gravados da ingestão (preparar_base)
+PERIODO_SQL = '"Periodo"'
+MES_NUM_SQL = '"Mês_num"'
+
+MORADIAS = ['VIOLACAO DE DOMICILIO', 'DANO'] + furtos_roubos
+
+
+def _q(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _em(coluna, valores):
+    """Trecho ``coluna IN (?, ?, ...)`` e seus parâmetros."""
+    return f"{coluna} IN ({', '.join('?' * len(valores))})", list(valores)
+
+
+def criar_indices(conn, table_name, colunas):
+    for col in COLUNAS_INDICE:
+        if col in colunas:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {_q(f"ix_{table_name}_{col}")} '
+                f'ON {_q(table_name)} ({_q(col)})'
+            )
+
+
+def _contagem(conn, table_name, grupos, filtros, nome, limite=None, ordem=None):
+    """Executa ``SELECT grupos, COUNT(*) ... WHERE filtros GROUP BY grupos``.
+
+    ``grupos``  → lista de (expressão SQL, nome da coluna no resultado)
+    ``filtros`` → lista de (trecho SQL, parâmetros)
+    Por padrão ordena pela contagem decrescente, desempatando pelas chaves
+    (mesma ordem do _contar() do caminho pandas).
+    """
+    select = ', '.join(f'{expr} AS {_q(alias)}' for expr, alias in grupos)
+    where = ' AND '.join(f'({sql})' for sql, _ in filtros) or '1'
+    params = [p for _, ps in filtros for p in ps]
+    n = len(grupos)
+    chaves = ", ".join(str(i + 1) for i in range(n))
+    sql = (
+        f'SELECT {select}, COUNT(*) AS {_q(nome)} FROM {_q(table_name)} '
+        f'WHERE {where} GROUP BY {chaves} '
+        f'ORDER BY {ordem or f"{n + 1} DESC, {chaves}"}'
+    )
+    if limite:
+        sql += f' LIMIT {int(limite)}'
+    # Sem linhas, o read_sql não tem como inferir o tipo da contagem
+    return pd.read_sql_query(sql, conn, params=params).astype({nome: 'int64'})
+
+
+def _nao_nulo(*colunas):
+    return [(f'{_q(c)} IS NOT NULL', []) for c in colunas]
+
+
+def _principal(c, grupo, contagem):
+    """Para cada valor de ``grupo``, a linha de maior contagem."""
+    if c.empty:
+        return c
+    idx = c.groupby(grupo)[contagem].idxmax()
+    r = c.loc[idx].reset_index(drop=True)
+    return r.sort_values(by=contagem, ascending=False, kind='stable')
+
+
+def _semestre(semestre):
+    return 'BETWEEN 1 AND 6' if semestre == 1 else 'BETWEEN 7 AND 12'
+
+
+# =====================================================
+# 🔹 Consultas (mesma assinatura das funções pandas, trocando df por conn + tabela)
+# =====================================================
+def ocorrencias_filtro_crime(conn, t, crime):
+    return _contagem(conn, t, [('"Natureza"', 'Natureza')],
+                     [('"Natureza" = ?', [crime])], 'Quantidade')
+
+
+def ranking_bairros_crime(conn, t, crime):
+    q = _contagem(
+        conn, t, [('"Bairro"', 'Bairro')],
+        [('"Natureza" = ?', [crime]),
+         ('"Bairro" IS NOT NULL', []),
+         ("\"Bairro\" NOT IN ('', '0', 'NULL', 'None')", [])],
+        'Crimes', limite=80,
+    )
+    if q.empty:
+        return pd.DataFrame(columns=['Bairro', 'Crimes', 'Bloco'])
+    q["Bloco"] = (q.index // 20) + 1
+    return q
+
+
+def crimes_dia_crime_bairro(conn, t, crime, bairro):
+    return _contagem(conn, t, [('"Dia da Semana"', 'Dia da Semana')],
+                     [('"Natureza" = ?', [crime]), ('"Bairro" = ?', [bairro])]
+                     + _nao_nulo('Dia da Semana'), 'Quantidade')
+
+
+def periodo_crime_bairro_crime(conn, t, crime, bairro):
+    return _contagem(conn, t, [(PERIODO_SQL, 'Periodo')],
+                     [('"Natureza" = ?', [crime]), ('"Bairro" = ?', [bairro])],
+                     'Quantidade')
+
+
+def crimes_perigosos_semestre(conn, t, semestre):
+    sem = _semestre(semestre)
+    return _contagem(conn, t, [('"Mês"', 'Mês')],
+                     [_em('"Natureza"', crimes_perigosos), (f'{MES_NUM_SQL} {sem}', [])],
+                     'Crimes')
+
+
+def crimes_moradias_semestre(conn, t, semestre):
+    sem = _semestre(semestre)
+    return _contagem(conn, t, [('"Mês"', 'Mês')],
+                     [_em('"Natureza"', ['VIOLACAO DE DOMICILIO', 'DANO', 'FURTO', 'ROUBO']),
+                      ("UPPER(\"Ambiente\") = 'RESIDENCIA'", []),
+                      (f'{MES_NUM_SQL} {sem}', [])],
+                     'Crimes')
+
+
+def crimes_bairro(conn, t, bairro):
+    return _contagem(conn, t, [('"Natureza"', 'Natureza')],
+                     [_em('"Natureza"', crimes_perigosos), ('"Bairro" = ?', [bairro])],
+                     'Crimes')
+
+
+def _filtro_moradias(bairro):
+    return [_em('"Natureza"', MORADIAS),
+            ("\"Ambiente\" = 'RESIDENCIA'", []),
+            ('"Bairro" = ?', [bairro])]
+
+
+def crimes_moradias_bairro(conn, t, bairro):
+    return _contagem(conn, t, [('"Natureza"', 'Natureza')], _filtro_moradias(bairro), 'Crimes')
+
+
+def periodo_moradias_bairro(conn, t, bairro):
+    return _contagem(conn, t, [(PERIODO_SQL, 'Periodo')], _filtro_moradias(bairro), 'Crimes')
+
+
+def dia_moradias_bairro(conn, t, bairro):
+    return _contagem(conn, t, [('"Dia da Semana"', 'Dia da Semana')],
+                     _filtro_moradias(bairro) + _nao_nulo('Dia da Semana'), 'Crimes')
+
+
+def periodo_furtos_roubos_bairro(conn, t, bairro):
+    c = _contagem(conn, t, [('"Natureza"', 'Natureza'), (PERIODO_SQL, 'Periodo')],
+                  [('"Bairro" = ?', [bairro]), _em('"Natureza"', furtos_roubos),
+                   (f"{PERIODO_SQL} <> 'Indefinido'", [])],
+                  'Ocorrencias', ordem='1, 2')
+    return _principal(c, 'Natureza', 'Ocorrencias')
+
+
+def dia_furtos_roubos_bairro(conn, t, bairro):
+    c = _contagem(conn, t, [('"Natureza"', 'Natureza'), ('"Dia da Semana"', 'Dia da Semana')],
+                  [('"Bairro" = ?', [bairro]), _em('"Natureza"', furtos_roubos)]
+                  + _nao_nulo('Dia da Semana'),
+                  'Ocorrencias', ordem='1, 2')
+    return _principal(c, 'Natureza', 'Ocorrencias')
+
+
+def periodo_crime_bairro(conn, t, bairro):
+    c = _contagem(conn, t, [('"Natureza"', 'Natureza'), (PERIODO_SQL, 'Periodo')],
+                  [('"Bairro" = ?', [bairro])] + _nao_nulo('Natureza'), 'Contagem')
+    return _principal(c, 'Natureza', 'Contagem')
+
+
+def crimes_perigosos_bairro_periodo(conn, t, bairro, periodo):
+    return _contagem(conn, t, [('"Natureza"', 'Natureza')],
+                     [_em('"Natureza"', crimes_perigosos),
+                      (f'{PERIODO_SQL} = ?', [periodo]),
+                      ('"Bairro" = ?', [bairro])],
+                     'Crimes')
+
+
+def crime_comercial_bairro(conn, t, bairro):
+    return _contagem(conn, t, [('"Natureza"', 'Natureza')],
+                     [_em('"Natureza"', crimes_comercio),
+                      ('"Horario_comercial" = 1', []),
+                      ("\"Ambiente\" = 'COMERCIO'", []),
+                      ('"Bairro" = ?', [bairro])],
+                     'Crimes')
+
+
+def top10_bairros_perigosos(conn, t):
+    return _contagem(conn, t, [('"Bairro"', 'Bairro')], _nao_nulo('Bairro'), 'Crimes', limite=10)
+
+
+def bairros_por_crime_periodo(conn, t, crime, periodo):
+    return _contagem(conn, t, [('"Bairro"', 'Bairro')],
+                     [('"Natureza" = ?', [crime]), (f'{PERIODO_SQL} = ?', [periodo])]
+                     + _nao_nulo('Bairro'),
+                     'Ocorrências', limite=20)
+
+
+def evolucao_crimes_perigosos(conn, t):
+    return _contagem(conn, t, [(MES_NUM_SQL, 'Mês_num')],
+                     [_em('"Natureza"', crimes_perigosos_mensal)] + _nao_nulo('Mês_num'),
+                     'Crimes', ordem='1')
+
+
+def ranking_geral_crimes(conn, t):
+    return _contagem(conn, t, [('"Natureza"', 'Crime')], _nao_nulo('Natureza'), 'Ocorrências', limite=10)
+
+
+def crimes_por_ambiente(conn, t):
+    return _contagem(conn, t, [('"Ambiente"', 'Ambiente')], _nao_nulo('Ambiente'), 'Ocorrências')
+
+
+# =====================================================
+# 🔹 Ocorrências individuais (drill-down / exportação)
+# =====================================================
+def filtros_ocorrencias(crime=None, bairro=None, periodo=None, semestre=None, ambiente=None):
+    """Filtros equivalentes aos parâmetros das funções de análise (vazios são ignorados)."""
+    filtros = []
+    if crime:
+        filtros.append(('"Natureza" = ?', [crime]))
+    if bairro:
+        filtros.append(('"Bairro" = ?', [bairro]))
+    if periodo:
+        filtros.append((f'{PERIODO_SQL} = ?', [periodo]))
+    if semestre:
+        filtros.append((f'{MES_NUM_SQL} {_semestre(semestre)}', []))
+    if ambiente:
+        filtros.append(('UPPER("Ambiente") = UPPER(?)', [ambiente]))
+    return filtros
+
+
+def filtro_sql(filtro):
+    """Filtro declarativo das análises (ver filtros.py) no formato de filtros_ocorrencias,
+    ou None se alguma condição for uma função (só dá para avaliar no pandas)."""
+    filtros = []
+    for campo, condicao in filtro.items():
+        coluna = _q(CAMPOS[campo])
+        if callable(condicao):
+            return None
+        if isinstance(condicao, tuple):
+            filtros.append((f'{coluna} BETWEEN ? AND ?', list(condicao)))
+        elif isinstance(condicao, (list, set, frozenset, range)):
+            filtros.append(_em(coluna, sorted(condicao)))
+        else:
+            filtros.append((f'{coluna} = ?', [condicao]))
+    return filtros
+
+
+def consulta_ocorrencias(table_name, filtros, apos=0, limite=None):
+    """SQL e parâmetros das ocorrências filtradas, em ordem de ``rowid`` (devolvido como
+    ``id``) e só depois de ``apos``: paginação por chave, sem OFFSET."""
+    where = ' AND '.join(['rowid > ?'] + [f'({sql})' for sql, _ in filtros])
+    params = [apos] + [p for _, ps in filtros for p in ps]
+    sql = f'SELECT rowid AS id, * FROM {_q(table_name)} WHERE {where} ORDER BY rowid'
+    if limite:
+        sql += f' LIMIT {int(limite)}'
+    return sql, params
+
+
+CONSULTAS_SQL = {
+    nome: globals()[nome] for nome in [
+        'ocorrencias_filtro_crime', 'ranking_bairros_crime', 'crimes_dia_crime_bairro',
+        'periodo_crime_bairro_crime', 'crimes_perigosos_semestre', 'crimes_moradias_semestre',
+        'crimes_bairro', 'crimes_moradias_bairro', 'periodo_moradias_bairro',
+        'dia_moradias_bairro', 'periodo_furtos_roubos_bairro', 'dia_furtos_roubos_bairro',
+        'periodo_crime_bairro', 'crimes_perigosos_bairro_periodo', 'crime_comercial_bairro',
+        'top10_bairros_perigosos', 'bairros_por_crime_periodo', 'evolucao_crimes_perigosos',
+        'ranking_geral_crimes', 'crimes_por_ambiente',
+    ]
+}
+
@@ -0,0 +1,72 @@
+# cubo.py
+# Cubo de contagens pré-agregado na ingestão: uma linha por combinação distinta
+# das dimensões, com o total de ocorrências na coluna PESO.
+# As funções de análise aceitam o cubo no lugar da base bruta (ver _contar).
+# Do cubo saem também as tabelas de dimensão (valores distintos + contagem de
+# cada coluna filtrável), usadas nos formulários e na busca por prefixo.
+
+import pandas as pd
+
+from analise_seguranca_funcoes import PESO
+
+DIMENSOES_CUBO = [
+    'Natureza', 'Bairro', 'Ambiente', 'Periodo', 'Horario_comercial',
+    'Dia da Semana', 'Mês', 'Mês_num',
+]
+
+# Colunas com valores oferecidos nos formulários / busca
+DIMENSOES_FILTRO = ['Natureza', 'Bairro', 'Ambiente', 'Periodo']
+
+# Análises que usam colunas fora do cubo (Hora): rodam sobre a tabela completa
+ANALISES_SEM_CUBO = {'mapa_calor_crime_bairro'}
+
+
+def tabela_cubo(table_name):
+    return f'cubo__{table_name}'
+
+
+def tabela_dimensoes(table_name):
+    return f'dim__{table_name}'
+
+
+def construir_cubo(df):
+    """Agrega a base por todas as dimensões presentes (nulos formam um grupo próprio)."""
+    dims = [c for c in DIMENSOES_CUBO if c in df.columns]
+    return df.groupby(dims, dropna=False, observed=True).size().reset_index(name=PESO)
+
+
+def combinar_cubos(cubos):
+    """Soma cubos parciais (ex.: um por lote de linhas) em um único cubo."""
+    cubo = pd.concat(cubos, ignore_index=True)
+    dims = [c for c in cubo.columns if c != PESO]
+    return cubo.groupby(dims, dropna=False, observed=True)[PESO].sum().reset_index()
+
+
+def gravar_cubo(conn, table_name, cubo):
+    cubo.to_sql(tabela_cubo(table_name), conn, if_exists='replace', index=False)
+
+
+def construir_dimensoes(df):
+    """Valores distintos de cada coluna de DIMENSOES_FILTRO com o total de ocorrências.
+
+    Aceita o cubo (soma PESO) ou a base bruta (conta linhas). Devolve as colunas
+    ``coluna``, ``valor`` e ``n``; nulos e valores vazios ficam de fora.
+    """
+    partes = []
+    for col in DIMENSOES_FILTRO:
+        if col not in df.columns:
+            continue
+        g = df.groupby(col, observed=True)
+        n = g[PESO].sum() if PESO in df.columns else g.size()
+        parte = n.rename('n').rename_axis('valor').reset_index()
+        parte['valor'] = parte['valor'].astype(str)
+        parte = parte[~parte['valor'].isin(['', '0'])]
+        parte.insert(0, 'coluna', col)
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame(columns=['coluna', 'valor', 'n'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def gravar_dimensoes(conn, table_name, dimensoes):
+    dimensoes.to_sql(tabela_dimensoes(table_name), conn, if_exists='replace', index=False)
@@ -0,0 +1,138 @@
+# filtros.py
+# Filtros declarativos das funções de análise e índice de bitmaps por valor.
+#
+# Um filtro é um dict {campo: condição} (campos em CAMPOS); a linha passa quando
+# atende a todas as condições. A condição pode ser:
+#   - um valor             → coluna == valor
+#   - uma lista / conjunto → coluna é um dos valores
+#   - uma tupla (ini, fim) → ini <= coluna <= fim
+#   - uma função           → aplicada a cada valor distinto da coluna
+# Nulos nunca passam.
+#
+# Os DataFrames compartilhados (carregados uma vez por versão da tabela) ganham um
+# IndiceBitmap com indexar(): o código inteiro de cada linha por coluna e, sob
+# demanda, um bitmap (1 bit por linha) por valor. O filtro vira E/OU de bitmaps
+# em vez de comparações de string na base inteira; DataFrames sem índice (ex.: já
+# filtrados) usam as comparações diretas, com o mesmo resultado.
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# Campo do filtro → coluna
+CAMPOS = {
+    'crimes': 'Natureza',
+    'bairro': 'Bairro',
+    'ambiente': 'Ambiente',
+    'periodo': 'Periodo',
+    'dia': 'Dia da Semana',
+    'horas': 'Hora',
+    'meses': 'Mês_num',
+    'comercial': 'Horario_comercial',
+}
+
+# Uniões de valores (ex.: listas de crimes) guardadas por índice
+MAX_UNIOES = 256
+
+# id(DataFrame) → IndiceBitmap (removido quando o DataFrame é coletado)
+_indices = {}
+
+
+def _seletor(condicao):
+    """Condição → função valor distinto → bool."""
+    if callable(condicao):
+        return condicao
+    if isinstance(condicao, tuple):
+        ini, fim = condicao
+        return lambda v: ini <= v <= fim
+    if isinstance(condicao, (list, set, frozenset, range)):
+        valores = set(condicao)
+        return lambda v: v in valores
+    return lambda v: v == condicao
+
+
+def _mascara_serie(serie, condicao):
+    """Máscara da condição por comparação direta (sem índice)."""
+    if callable(condicao):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            distintos = serie.cat.categories
+        else:
+            distintos = serie.dropna().unique()
+        m = serie.isin([v for v in distintos if condicao(v)])
+    elif isinstance(condicao, tuple):
+        m = serie.between(*condicao)
+    elif isinstance(condicao, (list, set, frozenset, range)):
+        m = serie.isin(list(condicao))
+    else:
+        m = serie == condicao
+    return m.to_numpy(dtype=bool, na_value=False)
+
+
+class IndiceBitmap:
+    """Códigos por coluna e bitmaps por valor de um DataFrame que não muda mais."""
+
+    def __init__(self, df):
+        self.n = len(df)
+        self._colunas = {}  # coluna → (código de cada linha, valor de cada código)
+        for coluna in CAMPOS.values():
+            if coluna not in df.columns:
+                continue
+            serie = df[coluna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+            else:
+                codigos, valores = pd.factorize(serie)  # nulo → -1
+            self._colunas[coluna] = (codigos, valores.tolist())
+        self._bitmaps = {}  # (coluna, códigos) → bits empacotados
+
+    def bitmap(self, coluna, condicao):
+        """Bits empacotados (np.packbits) das linhas cuja ``coluna`` atende à condição."""
+        codigos, valores = self._colunas[coluna]
+        seletor = _seletor(condicao)
+        escolhidos = tuple(i for i, v in enumerate(valores) if seletor(v))
+        chave = (coluna, escolhidos)
+        bits = self._bitmaps.get(chave)
+        if bits is None:
+            if len(escolhidos) == 1:
+                linhas = codigos == escolhidos[0]
+            else:
+                # Uma passada só: tabela código → bool (o código -1 cai na última posição)
+                tabela = np.zeros(len(valores) + 1, dtype=bool)
+                tabela[list(escolhidos)] = True
+                linhas = tabela[codigos]
+            bits = np.packbits(linhas)
+            if len(escolhidos) == 1 or len(self._bitmaps) < MAX_UNIOES:
+                self._bitmaps[chave] = bits
+        return bits
+
+    def mascara(self, filtro):
+        bits = None
+        for campo, condicao in filtro.items():
+            b = self.bitmap(CAMPOS[campo], condicao)
+            bits = b if bits is None else bits & b
+        if bits is None:
+            return np.ones(self.n, dtype=bool)
+        return np.unpackbits(bits, count=self.n).view(bool)
+
+
+def indexar(df):
+    """Cria o índice de bitmaps de ``df`` e devolve o próprio ``df``.
+
+    Só para DataFrames que não serão mais alterados (ex.: os do cache por versão).
+    """
+    chave = id(df)
+    _indices[chave] = IndiceBitmap(df)
+    weakref.finalize(df, _indices.pop, chave, None)
+    return df
+
+
+def mascara(df, filtro):
+    """Máscara booleana (array numpy) das linhas de ``df`` que passam no filtro."""
+    indice = _indices.get(id(df))
+    if indice is not None and indice.n == len(df):
+        return indice.mascara(filtro)
+    m = np.ones(len(df), dtype=bool)
+    for campo, condicao in filtro.items():
+        m &= _mascara_serie(df[CAMPOS[campo]], condicao)
+    return m
@@ -0,0 +1,585 @@
+# ingestao.py
+# Ingestão em streaming do Excel para o SQLite.
+#
+# Cada planilha é lida em modo read-only (openpyxl) em lotes de tamanho fixo,
+# preparada (preparar_base) e gravada com executemany em um SQLite temporário,
+# em um processo separado. No fim, o processo principal copia cada planilha
+# para tabelas de carga no banco definitivo (ATTACH + INSERT ... SELECT) e
+# troca todas de uma vez, numa única transação, junto com meta_sheets: com o
+# banco em WAL, os leitores nunca veem uma base carregada pela metade.
+# A memória de pico fica limitada a um lote por processo, qualquer que seja o
+# tamanho da planilha.
+#
+# No modo 'acrescentar', um arquivo já ingerido desde a última substituição
+# (mesmo sha256) é ignorado, e as planilhas cujo conteúdo não mudou nem são
+# lidas. Das demais, só entram as linhas com impressão digital ainda não vista;
+# cubo, dimensões, mapas, índice temporal e snapshot são atualizados a partir
+# dessas linhas, sem reprocessar o histórico.
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import queue
+import tempfile
+import uuid
+import zipfile
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from analise_seguranca_funcoes import COLUNAS_BASE, preparar_base
+from banco import conectar_escrita
+from consultas_sql import criar_indices
+from cubo import (
+    construir_cubo, combinar_cubos, gravar_cubo, tabela_cubo,
+    construir_dimensoes, gravar_dimensoes, tabela_dimensoes,
+)
+from mapas import (
+    construir_mapas, combinar_mapas, gravar_mapas, ler_mapas, mapas_densos, mapas_longos,
+    tabela_mapas,
+)
+from tempo import construir_tempo, gravar_tempo, tabela_tempo
+from snapshot import escrever_snapshot, estender_snapshot, pasta_snapshot, publicar_snapshot
+
+TAMANHO_LOTE = 20_000
+TAMANHO_BLOCO_HASH = 1 << 20
+
+MODOS = ('substituir', 'acrescentar')
+
+# Banco temporário de cada planilha: descartável, sem journal
+PRAGMAS_TEMP = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+]
+
+# Banco definitivo durante a cópia (além do WAL de conectar_escrita)
+PRAGMAS_CARGA = [
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+]
+
+# Datas do Excel viram texto, como no to_sql do pandas
+sqlite3.register_adapter(pd.Timestamp, lambda t: t.isoformat(sep=' '))
+
+
+def nome_tabela(sheet):
+    return (
+        sheet.strip().lower()
+            .replace(" ", "_")
+            .replace("-", "_")
+            .replace("/", "_")
+    )
+
+
+def _cabecalho(linha):
+    """Nomes de coluna como no read_excel: vazios → 'Unnamed: i', repetidos → 'X.1'."""
+    nomes, vistos = [], {}
+    for i, valor in enumerate(linha):
+        nome = f'Unnamed: {i}' if valor is None else str(valor)
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f'{nome}.{vistos[nome]}'
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def _linhas_sql(df):
+    """Tuplas com tipos nativos do Python (NaN/NA → None) para o executemany."""
+    valores = df.astype(object).where(df.notna(), None)
+    return valores.itertuples(index=False, name=None)
+
+
+# =====================================================
+# 🔹 Hashes do arquivo, das planilhas e das linhas
+# =====================================================
+def tabela_hashes(table_name):
+    return f'hashes__{table_name}'
+
+
+def _sha256(arquivo):
+    """sha256 de um arquivo aberto, lido em blocos. Devolve ``(hash, contém t="s")``."""
+    h, cauda, usa_compartilhadas = hashlib.sha256(), b'', False
+    for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+        h.update(bloco)
+        usa_compartilhadas = usa_compartilhadas or b't="s"' in cauda + bloco
+        cauda = bloco[-4:]
+    return h, usa_compartilhadas
+
+
+def hash_arquivo(filepath):
+    with open(filepath, 'rb') as f:
+        return _sha256(f)[0].hexdigest()
+
+
+def hash_planilhas(filepath):
+    """sha256 do XML de cada planilha dentro do .xlsx, sem interpretar as células.
+
+    Planilhas que usam strings compartilhadas incluem no hash a tabela
+    sharedStrings, comum a todo o arquivo: um texto novo em qualquer planilha
+    marca essas planilhas como alteradas (a deduplicação por linha garante o
+    resultado, só se perde o atalho).
+    """
+    ns = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    rel_id = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+    with zipfile.ZipFile(filepath) as z:
+        alvos = {r.get('Id'): r.get('Target')
+                 for r in ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))}
+        compartilhadas = b''
+        if 'xl/sharedStrings.xml' in z.namelist():
+            with z.open('xl/sharedStrings.xml') as f:
+                compartilhadas = _sha256(f)[0].digest()
+        hashes = {}
+        for sheet in ET.fromstring(z.read('xl/workbook.xml')).find('m:sheets', ns):
+            alvo = alvos[sheet.get(rel_id)]
+            parte = alvo.lstrip('/') if alvo.startswith('/') else f'xl/{alvo}'
+            with z.open(parte) as f:
+                h, usa_compartilhadas = _sha256(f)
+            if usa_compartilhadas:
+                h.update(compartilhadas)
+            hashes[sheet.get('name')] = h.hexdigest()
+    return hashes
+
+
+def _normalizar_linhas(df):
+    """Colunas-base com tipos estáveis: o hash não depende de como a linha foi lida
+    (lote do Excel ou tabela do SQLite)."""
+    colunas = {}
+    for c in COLUNAS_BASE:
+        if c not in df.columns:
+            continue
+        if c == 'Hora':
+            colunas[c] = pd.to_numeric(df[c], errors='coerce').fillna(-1).astype('int64')
+        else:
+            colunas[c] = df[c].astype('string').fillna('\0')
+    return pd.DataFrame(colunas)
+
+
+class ImpressaoLinhas:
+    """Impressão digital (int64) de cada linha de uma planilha, lote a lote.
+
+    Linhas idênticas são legítimas (duas ocorrências iguais no mesmo horário), então
+    a impressão combina o hash dos valores com a ordem da repetição na planilha: a
+    k-ésima cópia de uma linha tem sempre a mesma impressão, em qualquer upload
+    que contenha as anteriores.
+    """
+
+    def __init__(self):
+        self._vistas = {}  # hash dos valores → cópias já vistas
+
+    def __call__(self, df):
+        valores = pd.util.hash_pandas_object(_normalizar_linhas(df), index=False).to_numpy()
+        unicos, inverso, contagens = np.unique(valores, return_inverse=True, return_counts=True)
+        anteriores = np.fromiter((self._vistas.get(u, 0) for u in unicos.tolist()),
+                                 dtype=np.int64, count=len(unicos))
+        ordem = pd.Series(valores).groupby(valores).cumcount().to_numpy()
+        for u, n in zip(unicos.tolist(), contagens.tolist()):
+            self._vistas[u] = self._vistas.get(u, 0) + n
+        k = ordem + anteriores[inverso]
+        impressao = pd.util.hash_pandas_object(pd.DataFrame({'h': valores, 'k': k}), index=False)
+        return impressao.to_numpy().view(np.int64)
+
+
+def ler_lotes(filepath, sheet, tamanho=TAMANHO_LOTE):
+    """Gera DataFrames já preparados com até ``tamanho`` linhas da planilha."""
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        linhas = wb[sheet].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = _cabecalho(cabecalho)
+        lote = []
+        for linha in linhas:
+            if all(v is None for v in linha):
+                continue
+            lote.append(linha)
+            if len(lote) >= tamanho:
+                yield preparar_base(pd.DataFrame(lote, columns=colunas))
+                lote = []
+        if lote:
+            yield preparar_base(pd.DataFrame(lote, columns=colunas))
+    finally:
+        wb.close()
+
+
+def ingerir_planilha(filepath, sheet, destino, tamanho=TAMANHO_LOTE, avisos=None,
+                     snapshot=None):
+    """Grava uma planilha (tabela + cubo + dimensões + mapas + índice temporal) no SQLite
+    ``destino``. Roda em processo separado.
+
+    A cada lote, publica ``(sheet, linhas_gravadas)`` em ``avisos`` (uma fila), se houver.
+    Com ``snapshot``, grava também o snapshot colunar da tabela nessa pasta.
+    A impressão digital de cada linha vai para ``hashes__<tabela>`` (linha = rowid).
+    """
+    table_name = nome_tabela(sheet)
+    hashes = tabela_hashes(table_name)
+    conn = sqlite3.connect(destino)
+    for pragma in PRAGMAS_TEMP:
+        conn.execute(pragma)
+
+    linhas, colunas, cubo, mapas = 0, None, None, None
+    impressao = ImpressaoLinhas()
+    with conn:
+        for lote in ler_lotes(filepath, sheet, tamanho):
+            if colunas is None:
+                colunas = list(lote.columns)
+                conn.execute(pd.io.sql.get_schema(lote, table_name))
+                conn.execute(f'CREATE TABLE "{hashes}" '
+                             f'(linha INTEGER PRIMARY KEY, h INTEGER NOT NULL)')
+                insert = (f'INSERT INTO "{table_name}" VALUES '
+                          f'({", ".join("?" * len(colunas))})')
+            conn.executemany(insert, _linhas_sql(lote[colunas]))
+            conn.executemany(f'INSERT INTO "{hashes}" VALUES (?, ?)',
+                             zip(range(linhas + 1, linhas + len(lote) + 1),
+                                 impressao(lote).tolist()))
+            parcial = construir_cubo(lote)
+            cubo = parcial if cubo is None else combinar_cubos([cubo, parcial])
+            parcial = construir_mapas(lote)
+            mapas = parcial if mapas is None else combinar_mapas([mapas, parcial])
+            linhas += len(lote)
+            if avisos is not None:
+                avisos.put((sheet, linhas))
+        if cubo is not None:
+            gravar_cubo(conn, table_name, cubo)
+            gravar_dimensoes(conn, table_name, construir_dimensoes(cubo))
+            gravar_mapas(conn, table_name, mapas)
+            gravar_tempo(conn, table_name, construir_tempo(cubo))
+    if snapshot and colunas is not None:
+        escrever_snapshot(conn, table_name, snapshot)
+    conn.close()
+    return {'sheet': sheet, 'table_name': table_name, 'linhas': linhas, 'colunas': colunas}
+
+
+def _tabelas(table_name):
+    return [table_name, tabela_cubo(table_name), tabela_dimensoes(table_name),
+            tabela_mapas(table_name), tabela_tempo(table_name)]
+
+
+def _copiar(conn, origem, info, prefixo):
+    """Copia tabela, cubo, dimensões, mapas e índice temporal do SQLite temporário para
+    tabelas de carga (``prefixo`` + nome) no banco principal, já com os índices."""
+    table_name = info['table_name']
+    conn.execute("ATTACH DATABASE ? AS origem", (origem,))
+    try:
+        with conn:
+            for nome in _tabelas(table_name):
+                # Renomeia no temporário para reaproveitar o CREATE TABLE original
+                conn.execute(f'ALTER TABLE origem."{nome}" RENAME TO "{prefixo}{nome}"')
+                sql = conn.execute(
+                    "SELECT sql FROM origem.sqlite_master WHERE type = 'table' AND name = ?",
+                    (prefixo + nome,)
+                ).fetchone()[0]
+                conn.execute(sql)  # sem schema explícito → cria em main
+                conn.execute(f'INSERT INTO main."{prefixo}{nome}" '
+                             f'SELECT * FROM origem."{prefixo}{nome}"')
+            hashes = tabela_hashes(table_name)
+            conn.execute(f'CREATE TABLE main."{prefixo}{hashes}" (h INTEGER PRIMARY KEY)')
+            conn.execute(f'INSERT OR IGNORE INTO main."{prefixo}{hashes}" '
+                         f'SELECT h FROM origem."{hashes}"')
+            # Nomes dos índices levam o prefixo: não colidem com os da versão em uso
+            criar_indices(conn, prefixo + table_name, info['colunas'])
+    finally:
+        conn.execute("DETACH DATABASE origem")
+
+
+def _trocar(conn, infos, prefixo, substituir=True):
+    """Troca as tabelas em uso pelas de carga e atualiza meta_sheets/meta_versoes
+    numa única transação. Com ``substituir``, as planilhas fora de ``infos`` deixam
+    de ser listadas. Devolve ``{table_name: nova_versao}``."""
+    versoes = {}
+    with conn:
+        for info in infos:
+            table_name = info['table_name']
+            for nome in _tabelas(table_name) + [tabela_hashes(table_name)]:
+                conn.execute(f'DROP TABLE IF EXISTS main."{nome}"')
+                conn.execute(f'ALTER TABLE main."{prefixo}{nome}" RENAME TO "{nome}"')
+            versoes[table_name] = _nova_versao(conn, table_name)
+        if substituir:
+            conn.execute("DELETE FROM meta_sheets")
+            conn.execute("DELETE FROM meta_planilhas")
+            # Arquivos de cargas anteriores já não estão na base
+            conn.execute("DELETE FROM meta_arquivos")
+        _registrar(conn, infos)
+    return versoes
+
+
+def _nova_versao(conn, table_name):
+    conn.execute(
+        "INSERT INTO meta_versoes (table_name, versao) VALUES (?, 1) "
+        "ON CONFLICT(table_name) DO UPDATE SET versao = versao + 1",
+        (table_name,)
+    )
+    return conn.execute(
+        "SELECT versao FROM meta_versoes WHERE table_name = ?", (table_name,)
+    ).fetchone()[0]
+
+
+def _registrar(conn, infos):
+    # Chamado dentro da transação da carga
+    for info in infos:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta_sheets (sheet_name, table_name) VALUES (?, ?)",
+            (info['sheet'], info['table_name'])
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta_planilhas (sheet_name, hash) VALUES (?, ?)",
+            (info['sheet'], info['hash'])
+        )
+
+
+def _acrescentar(conn, origem, info):
+    """Modo acrescentar: grava na tabela existente só as linhas com impressão digital
+    nova e soma a contribuição delas ao cubo, às dimensões, aos mapas e ao índice temporal,
+    numa única transação.
+    Devolve ``(versao, novas)``, com ``novas`` = DataFrame das linhas gravadas."""
+    table_name = info['table_name']
+    hashes = tabela_hashes(table_name)
+    colunas = [r[1] for r in conn.execute(f'PRAGMA main.table_info("{table_name}")')]
+    faltando = [c for c in info['colunas'] if c not in colunas]
+    if faltando:
+        raise ValueError(f"A planilha '{info['sheet']}' tem colunas que a base não tem "
+                         f"({', '.join(faltando)}); use o modo substituir")
+    if not _existe(conn, hashes):
+        _indexar_existentes(conn, table_name, colunas)
+
+    conn.execute("ATTACH DATABASE ? AS origem", (origem,))
+    try:
+        with conn:
+            ultima = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM main."{table_name}"'
+                                  ).fetchone()[0]
+            conn.execute(
+                f'INSERT INTO main."{table_name}" ({_lista(info["colunas"])}) '
+                f'SELECT {_lista(info["colunas"], "d.")} FROM origem."{table_name}" d '
+                f'JOIN origem."{hashes}" h ON h.linha = d.rowid '
+                f'WHERE h.h NOT IN (SELECT h FROM main."{hashes}") ORDER BY d.rowid'
+            )
+            conn.execute(f'INSERT OR IGNORE INTO main."{hashes}" SELECT h FROM origem."{hashes}"')
+            novas = pd.read_sql_query(
+                f'SELECT * FROM main."{table_name}" WHERE rowid > ? ORDER BY rowid',
+                conn, params=(ultima,)
+            )
+            if novas.empty:
+                # Tabela gravada antes de meta_versoes existir não tem linha lá: 0, como
+                # no get_versao do app
+                versao = conn.execute(
+                    "SELECT COALESCE((SELECT versao FROM meta_versoes WHERE table_name = ?), 0)",
+                    (table_name,)
+                ).fetchone()[0]
+            else:
+                cubo = pd.read_sql_query(f'SELECT * FROM main."{tabela_cubo(table_name)}"', conn)
+                cubo = combinar_cubos([cubo, construir_cubo(novas)])
+                _regravar(conn, tabela_cubo(table_name), cubo)
+                _regravar(conn, tabela_dimensoes(table_name), construir_dimensoes(cubo))
+                if _existe(conn, tabela_mapas(table_name)):
+                    mapas = combinar_mapas([mapas_longos(ler_mapas(conn, table_name)),
+                                            construir_mapas(novas)])
+                    _regravar(conn, tabela_mapas(table_name), mapas_densos(mapas))
+                if _existe(conn, tabela_tempo(table_name)):
+                    _regravar(conn, tabela_tempo(table_name), construir_tempo(cubo))
+                versao = _nova_versao(conn, table_name)
+            _registrar(conn, [info])
+    finally:
+        conn.execute("DETACH DATABASE origem")
+    return versao, novas
+
+
+def _existe(conn, nome):
+    return conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                        (nome,)).fetchone() is not None
+
+
+def _lista(colunas, prefixo=''):
+    return ', '.join(f'{prefixo}"{c}"' for c in colunas)
+
+
+def _regravar(conn, nome, df):
+    """Substitui o conteúdo de uma tabela pequena (cubo, dimensões, mapas, índice temporal)
+    sem sair da transação."""
+    conn.execute(f'DELETE FROM main."{nome}"')
+    conn.executemany(f'INSERT INTO main."{nome}" ({_lista(df.columns)}) VALUES '
+                     f'({", ".join("?" * len(df.columns))})', _linhas_sql(df))
+
+
+def _indexar_existentes(conn, table_name, colunas, tamanho=TAMANHO_LOTE):
+    """Calcula as impressões digitais de uma tabela gravada antes delas existirem."""
+    hashes = tabela_hashes(table_name)
+    base = [c for c in COLUNAS_BASE if c in colunas]
+    impressao = ImpressaoLinhas()
+    with conn:
+        conn.execute(f'CREATE TABLE main."{hashes}" (h INTEGER PRIMARY KEY)')
+        cur = conn.execute(f'SELECT {_lista(base)} FROM main."{table_name}" ORDER BY rowid')
+        while True:
+            rows = cur.fetchmany(tamanho)
+            if not rows:
+                break
+            lote = pd.DataFrame.from_records(rows, columns=base)
+            conn.executemany(f'INSERT OR IGNORE INTO main."{hashes}" VALUES (?)',
+                             ((h,) for h in impressao(lote).tolist()))
+
+
+def _descartar(conn, prefixo):
+    """Apaga as tabelas de carga que sobraram de uma ingestão que falhou."""
+    nomes = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND substr(name, 1, ?) = ?",
+        (len(prefixo), prefixo)
+    )]
+    with conn:
+        for nome in nomes:
+            conn.execute(f'DROP TABLE IF EXISTS main."{nome}"')
+
+
+def ingerir_excel(db_path, filepath, processos=None, tamanho=TAMANHO_LOTE, progresso=None,
+                  snapshots=None, modo='substituir'):
+    """Lê as planilhas do Excel (em paralelo) e grava cada uma como tabela no SQLite.
+
+    ``progresso(sheet, linhas)`` é chamado no processo atual conforme os lotes são gravados.
+    ``snapshots`` é a pasta raiz dos snapshots colunares (ver snapshot.py), se usados.
+    ``modo``: 'substituir' troca a base inteira; 'acrescentar' grava só as linhas
+    novas das planilhas alteradas (ver o início do módulo).
+    Devolve a lista de planilhas gravadas: dicts com sheet, table_name, linhas
+    (lidas) e novas (gravadas).
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo de ingestão desconhecido: {modo!r}")
+    arquivo = hash_arquivo(filepath)
+    hashes = hash_planilhas(filepath)
+    sheets = list(hashes)
+
+    existentes = set()
+    if modo == 'acrescentar':
+        conn = conectar_escrita(db_path)
+        try:
+            _criar_meta(conn)
+            if conn.execute("SELECT 1 FROM meta_arquivos WHERE hash = ?", (arquivo,)).fetchone():
+                return []  # Mesmo arquivo já ingerido
+            registradas = dict(conn.execute("SELECT sheet_name, hash FROM meta_planilhas"))
+            # Só as tabelas listadas: as que uma substituição tirou de uso são recriadas
+            existentes = {r[0] for r in conn.execute("SELECT table_name FROM meta_sheets")}
+        finally:
+            conn.close()
+        sheets = [s for s in sheets if registradas.get(s) != hashes[s]]
+
+    pasta_tmp = tempfile.mkdtemp(prefix='ingestao_', dir=os.path.dirname(os.path.abspath(db_path)))
+    destinos = {s: os.path.join(pasta_tmp, f'{i}.db') for i, s in enumerate(sheets)}
+    processos = processos or min(len(sheets), os.cpu_count() or 1)
+    # Snapshots temporários na mesma raiz, para a publicação ser só um rename.
+    # Planilhas acrescentadas a uma tabela existente estendem o snapshot dela.
+    snaps = {}
+    if snapshots:
+        tmp_snap = os.path.join(snapshots, f'.tmp_{uuid.uuid4().hex}')
+        snaps = {s: os.path.join(tmp_snap, str(i)) for i, s in enumerate(sheets)
+                 if nome_tabela(s) not in existentes}
+
+    try:
+        if processos <= 1:
+            avisos = SimpleNamespace(put=lambda item: progresso(*item)) if progresso else None
+            infos = [ingerir_planilha(filepath, s, destinos[s], tamanho, avisos, snaps.get(s))
+                     for s in sheets]
+        else:
+            infos = _ingerir_em_paralelo(filepath, sheets, destinos, snaps, processos, tamanho,
+                                         progresso)
+
+        infos = [i for i in infos if i['colunas'] is not None]  # planilhas vazias
+        for info in infos:
+            info['hash'] = hashes[info['sheet']]
+            info['novas'] = info['linhas']
+        novas_tabelas = [i for i in infos if i['table_name'] not in existentes]
+        acrescimos = [i for i in infos if i['table_name'] in existentes]
+
+        conn = conectar_escrita(db_path)
+        for pragma in PRAGMAS_CARGA:
+            conn.execute(pragma)
+        prefixo = f'_carga_{uuid.uuid4().hex[:8]}__'
+        try:
+            _criar_meta(conn)
+            for info in novas_tabelas:
+                _copiar(conn, destinos[info['sheet']], info, prefixo)
+            versoes = _trocar(conn, novas_tabelas, prefixo, substituir=(modo == 'substituir'))
+            novas = {}
+            for info in acrescimos:
+                versoes[info['table_name']], novas[info['table_name']] = _acrescentar(
+                    conn, destinos[info['sheet']], info)
+                info['novas'] = len(novas[info['table_name']])
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta_arquivos (hash, ingerido_em) "
+                             "VALUES (?, strftime('%s', 'now'))", (arquivo,))
+        except BaseException:
+            _descartar(conn, prefixo)
+            raise
+        finally:
+            conn.close()
+        if snapshots:
+            for info in novas_tabelas:
+                publicar_snapshot(snapshots, info['table_name'], versoes[info['table_name']],
+                                  snaps[info['sheet']])
+            for i, info in enumerate(acrescimos):
+                t, versao = info['table_name'], versoes[info['table_name']]
+                if novas[t].empty:
+                    continue
+                destino = os.path.join(tmp_snap, f'acrescimo_{i}')
+                if estender_snapshot(pasta_snapshot(snapshots, t, versao - 1), destino, novas[t]):
+                    publicar_snapshot(snapshots, t, versao, destino)
+    finally:
+        shutil.rmtree(pasta_tmp, ignore_errors=True)
+        if snapshots:
+            shutil.rmtree(tmp_snap, ignore_errors=True)
+    return infos
+
+
+def _ingerir_em_paralelo(filepath, sheets, destinos, snaps, processos, tamanho, progresso):
+    # spawn: seguro mesmo quando chamado de um servidor com várias threads
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=processos, mp_context=ctx) as pool:
+        avisos = manager.Queue() if progresso else None
+        futuros = [pool.submit(ingerir_planilha, filepath, s, destinos[s], tamanho, avisos,
+                               snaps.get(s))
+                   for s in sheets]
+        pendentes = set(futuros)
+        while pendentes:
+            _, pendentes = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+            while avisos is not None:
+                try:
+                    progresso(*avisos.get_nowait())
+                except queue.Empty:
+                    break
+        return [f.result() for f in futuros]
+
+
+def _criar_meta(conn):
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta_sheets (
+                sheet_name TEXT PRIMARY KEY,
+                table_name TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta_versoes (
+                table_name TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL
+            )
+        """)
+        # Hashes do conteúdo já ingerido (modo acrescentar)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta_planilhas (
+                sheet_name TEXT PRIMARY KEY,
+                hash TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta_arquivos (
+                hash TEXT PRIMARY KEY,
+                ingerido_em REAL NOT NULL
+            )
+        """)
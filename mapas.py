@@ -0,0 +1,104 @@
+# mapas.py
+# Matrizes hora × dia da semana por (bairro, natureza), calculadas na ingestão.
+# Cada par vira uma linha de mapa__<tabela> com a matriz densa (FORMA_MAPA) de
+# contagens num BLOB de int32. O mapa de calor lê a matriz direto, e os totais
+# por período ou por dia saem da soma de fatias dela, sem reagrupar a base.
+#
+# Na ingestão as contagens andam no formato longo (Bairro, Natureza, celula, n),
+# que se soma entre lotes como o cubo (combinar_mapas).
+
+import numpy as np
+import pandas as pd
+
+from analise_seguranca_funcoes import (
+    FORMA_MAPA, celulas_mapa, dias_mapa, periodos_mapa, quadro_mapa,
+)
+
+CELULAS = FORMA_MAPA[0] * FORMA_MAPA[1]
+TIPO = '<i4'
+
+# Análises que saem da matriz do par (bairro, crime)
+ANALISES_MAPA = {
+    'mapa_calor_crime_bairro': quadro_mapa,
+    'periodo_crime_bairro_crime': lambda m: periodos_mapa(m, 'Quantidade'),
+    'crimes_dia_crime_bairro': lambda m: dias_mapa(m, 'Quantidade'),
+}
+
+
+def tabela_mapas(table_name):
+    return f'mapa__{table_name}'
+
+
+def construir_mapas(df):
+    """Contagens no formato longo: ``Bairro``, ``Natureza``, ``celula`` e ``n``.
+
+    Linhas sem bairro ou sem natureza ficam de fora (nenhuma análise as consulta).
+    """
+    colunas = ['Bairro', 'Natureza', 'celula', 'n']
+    if not {'Bairro', 'Natureza', 'Hora', 'Dia da Semana'} <= set(df.columns):
+        return pd.DataFrame(columns=colunas)
+    df = df[df['Bairro'].notna() & df['Natureza'].notna()]
+    celulas = pd.Series(celulas_mapa(df), index=df.index, name='celula')
+    return (df.groupby([df['Bairro'], df['Natureza'], celulas], observed=True).size()
+            .reset_index(name='n')[colunas])
+
+
+def combinar_mapas(partes):
+    """Soma contagens no formato longo (ex.: uma por lote de linhas)."""
+    longo = pd.concat(partes, ignore_index=True)
+    return longo.groupby(['Bairro', 'Natureza', 'celula'])['n'].sum().reset_index()
+
+
+def mapas_densos(longo):
+    """Formato longo → uma linha por par com a matriz em bytes (coluna ``contagens``)."""
+    pares = pd.MultiIndex.from_frame(longo[['Bairro', 'Natureza']].astype(object))
+    codigos, unicos = pares.factorize()
+    matrizes = np.zeros((len(unicos), CELULAS), dtype=TIPO)
+    np.add.at(matrizes, (codigos, longo['celula'].to_numpy(dtype='int64')),
+              longo['n'].to_numpy(dtype='int64'))
+    densos = unicos.to_frame(index=False, name=['Bairro', 'Natureza'])
+    densos['contagens'] = [linha.tobytes() for linha in matrizes]
+    return densos
+
+
+def gravar_mapas(conn, table_name, longo):
+    nome = tabela_mapas(table_name)
+    conn.execute(f'DROP TABLE IF EXISTS "{nome}"')
+    conn.execute(f'CREATE TABLE "{nome}" (Bairro TEXT, Natureza TEXT, contagens BLOB)')
+    conn.executemany(f'INSERT INTO "{nome}" VALUES (?, ?, ?)',
+                     mapas_densos(longo).itertuples(index=False, name=None))
+
+
+def ler_mapas(conn, table_name):
+    """Matrizes da tabela: DataFrame indexado por (Bairro, Natureza), uma coluna por célula."""
+    densos = pd.read_sql_query(f'SELECT * FROM "{tabela_mapas(table_name)}"', conn)
+    matrizes = np.frombuffer(b''.join(densos['contagens']), dtype=TIPO).reshape(-1, CELULAS)
+    indice = pd.MultiIndex.from_frame(densos[['Bairro', 'Natureza']])
+    return pd.DataFrame(matrizes, index=indice).sort_index()
+
+
+def mapas_longos(mapas):
+    """Matrizes lidas com ler_mapas → formato longo (para somar linhas novas)."""
+    matrizes = mapas.to_numpy()
+    pares, celulas = np.nonzero(matrizes)
+    chaves = mapas.index.to_frame(index=False)
+    return pd.DataFrame({
+        'Bairro': chaves['Bairro'].to_numpy()[pares],
+        'Natureza': chaves['Natureza'].to_numpy()[pares],
+        'celula': celulas,
+        'n': matrizes[pares, celulas].astype('int64'),
+    })
+
+
+def matriz(mapas, bairro, crime):
+    """Matriz (FORMA_MAPA) do par; zeros quando o par não ocorre."""
+    try:
+        linha = mapas.loc[(bairro, crime)]
+    except KeyError:
+        return np.zeros(FORMA_MAPA, dtype='int64')
+    return linha.to_numpy(dtype='int64').reshape(FORMA_MAPA)
+
+
+def analise_mapa(mapas, nome, crime, bairro):
+    """Resultado da análise ``nome`` de ANALISES_MAPA, ou None se não der para tirar da matriz."""
+    return ANALISES_MAPA[nome](matriz(mapas, bairro, crime))
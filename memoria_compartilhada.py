@@ -0,0 +1,271 @@
+# memoria_compartilhada.py
+# DataFrames compartilhados entre os processos do servidor (ex.: workers do
+# gunicorn) em segmentos de multiprocessing.shared_memory.
+#
+# Cada versão de uma tabela vira um segmento. O primeiro processo que precisa
+# dela carrega o DataFrame e publica os arrays das colunas; os demais só anexam
+# o segmento e montam o DataFrame sobre os mesmos bytes, somente leitura e sem
+# cópia. A publicação é feita sob uma trava de arquivo (fcntl) por tabela (não
+# por versão, para os arquivos .lock não se acumularem a cada ingestão): quem
+# chega durante a carga espera e anexa, em vez de carregar de novo.
+#
+# Layout do segmento:
+#   [0:8]  tamanho do cabeçalho (0 enquanto a publicação não termina)
+#   [8:]   cabeçalho JSON (linhas; nome, tipo, dtype e posição de cada coluna;
+#          categorias das colunas de texto) e depois os arrays, alinhados.
+# Colunas de texto são publicadas como categorias (códigos + valores), como no
+# snapshot colunar.
+#
+# Os processos que usam um segmento ficam listados em <pasta>/<segmento>.json.
+# Quando o DataFrame de um processo é descartado (ex.: o cache trocou de versão
+# depois de uma nova ingestão) ele sai da lista; o último a sair remove o
+# segmento. Processos que morreram sem sair são ignorados na contagem.
+
+import fcntl
+import hashlib
+import inspect
+import json
+import os
+import struct
+import time
+import weakref
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+ALINHAMENTO = 64
+_CABECALHO = struct.Struct('<Q')
+
+# Tempo máximo esperando um segmento que outro processo está publicando
+ESPERA_PUBLICACAO_S = 60
+
+# Python 3.13+: anexar sem registrar no resource_tracker (que apagaria o segmento
+# quando o processo terminasse)
+_SEM_RASTREIO = 'track' in inspect.signature(shared_memory.SharedMemory.__init__).parameters
+
+# Arrays construídos com dtype "mascarado" (nulos por máscara)
+_MASCARADOS = {
+    'i': pd.arrays.IntegerArray, 'u': pd.arrays.IntegerArray,
+    'f': pd.arrays.FloatingArray, 'b': pd.arrays.BooleanArray,
+}
+
+
+def _segmento(nome, criar=False, tamanho=0):
+    if _SEM_RASTREIO:
+        return shared_memory.SharedMemory(nome, create=criar, size=tamanho, track=False)
+    shm = shared_memory.SharedMemory(nome, create=criar, size=tamanho)
+    # O ciclo de vida é controlado pela lista de processos (ver _soltar)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _remover(shm):
+    if _SEM_RASTREIO:
+        shm.unlink()
+        return
+    # unlink() tira o registro de novo: registra antes para manter o par
+    resource_tracker.register(shm._name, 'shared_memory')
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        raise
+
+
+def _alinhar(n):
+    return -(-n // ALINHAMENTO) * ALINHAMENTO
+
+
+def _decompor(df):
+    """Colunas → (descrição para o cabeçalho, lista de arrays numpy a gravar)."""
+    descricoes, arrays = [], []
+    for nome in df.columns:
+        serie = df[nome]
+        dtype = serie.dtype
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == object or \
+                isinstance(dtype, pd.StringDtype):
+            cat = serie if isinstance(dtype, pd.CategoricalDtype) else serie.astype('category')
+            categorias = cat.cat.categories.tolist()
+            json.dumps(categorias)  # TypeError: valores que não dá para publicar
+            descricoes.append({'nome': nome, 'tipo': 'texto', 'categorias': categorias})
+            arrays.append([cat.cat.codes.to_numpy()])
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            if dtype.kind not in _MASCARADOS:
+                raise TypeError(f'coluna {nome!r}: tipo {dtype} não suportado')
+            valores = serie.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+            descricoes.append({'nome': nome, 'tipo': 'mascarado'})
+            arrays.append([valores, serie.isna().to_numpy()])
+        else:
+            descricoes.append({'nome': nome, 'tipo': 'numpy'})
+            arrays.append([serie.to_numpy()])
+    return descricoes, arrays
+
+
+def publicar(nome, df):
+    """Cria o segmento ``nome`` com as colunas de ``df`` e devolve o SharedMemory."""
+    descricoes, arrays = _decompor(df)
+    posicao = 0
+    for descricao, partes in zip(descricoes, arrays):
+        descricao['partes'] = []
+        for a in partes:
+            descricao['partes'].append({'dtype': a.dtype.str, 'inicio': posicao})
+            posicao = _alinhar(posicao + a.nbytes)
+    cabecalho = json.dumps({'linhas': len(df), 'colunas': descricoes},
+                           ensure_ascii=False).encode('utf-8')
+    dados = _alinhar(_CABECALHO.size + len(cabecalho))
+
+    shm = _segmento(nome, criar=True, tamanho=max(dados + posicao, 1))
+    try:
+        for descricao, partes in zip(descricoes, arrays):
+            for parte, a in zip(descricao['partes'], partes):
+                inicio = dados + parte['inicio']
+                destino = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, offset=inicio)
+                destino[...] = a
+                del destino
+        shm.buf[_CABECALHO.size:_CABECALHO.size + len(cabecalho)] = cabecalho
+        # Por último: o segmento só vale quando o tamanho do cabeçalho está gravado
+        _CABECALHO.pack_into(shm.buf, 0, len(cabecalho))
+    except BaseException:
+        shm.close()
+        _remover(shm)
+        raise
+    return shm
+
+
+def montar(shm):
+    """DataFrame somente leitura sobre os bytes do segmento (sem copiar), ou None se
+    a publicação ainda não terminou."""
+    tamanho, = _CABECALHO.unpack_from(shm.buf, 0)
+    if not tamanho:
+        return None
+    cabecalho = json.loads(bytes(shm.buf[_CABECALHO.size:_CABECALHO.size + tamanho]))
+    dados = _alinhar(_CABECALHO.size + tamanho)
+    linhas = cabecalho['linhas']
+
+    colunas = {}
+    for descricao in cabecalho['colunas']:
+        partes = []
+        for parte in descricao['partes']:
+            a = np.ndarray((linhas,), dtype=np.dtype(parte['dtype']), buffer=shm.buf,
+                           offset=dados + parte['inicio'])
+            a.flags.writeable = False
+            partes.append(a)
+        if descricao['tipo'] == 'texto':
+            colunas[descricao['nome']] = pd.Categorical.from_codes(
+                partes[0], categories=pd.Index(descricao['categorias']))
+        elif descricao['tipo'] == 'mascarado':
+            colunas[descricao['nome']] = _MASCARADOS[partes[0].dtype.kind](*partes)
+        else:
+            colunas[descricao['nome']] = partes[0]
+    return pd.DataFrame(colunas, copy=False)
+
+
+class MemoriaCompartilhada:
+    """Versões de tabelas publicadas em memória compartilhada, com contagem de uso
+    por processo."""
+
+    def __init__(self, pasta, espera_s=ESPERA_PUBLICACAO_S):
+        self.pasta = os.path.abspath(pasta)
+        self.espera_s = espera_s
+        os.makedirs(self.pasta, exist_ok=True)
+        self._nao_fechados = []  # segmentos com arrays ainda vivos no processo
+
+    def nome(self, table_name, versao):
+        # Nomes curtos (limite de alguns SOs); a pasta separa instalações no mesmo host
+        chave = f'{self.pasta}|{table_name}|{versao}'.encode('utf-8')
+        return 'df_' + hashlib.sha1(chave).hexdigest()[:20]
+
+    @contextmanager
+    def _trava(self, table_name):
+        chave = hashlib.sha1(f'{self.pasta}|{table_name}'.encode('utf-8')).hexdigest()[:20]
+        with open(os.path.join(self.pasta, f'tabela_{chave}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _usuarios(self, nome, mudar=None):
+        # Chamado com a trava: lista de pids vivos que usam o segmento, já atualizada
+        caminho = os.path.join(self.pasta, f'{nome}.json')
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                pids = set(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pids = set()
+        pids = {p for p in pids if _vivo(p)}
+        if mudar:
+            mudar(pids)
+        if pids:
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump(sorted(pids), f)
+        elif os.path.exists(caminho):
+            os.remove(caminho)
+        return pids
+
+    def obter(self, table_name, versao, carregar):
+        """DataFrame da versão: anexa o segmento publicado ou carrega com ``carregar()``
+        e publica. Se a publicação não for possível, devolve o DataFrame carregado."""
+        self._fechar_pendentes()
+        nome = self.nome(table_name, versao)
+        limite = time.monotonic() + self.espera_s
+        with self._trava(table_name):
+            try:
+                shm = _segmento(nome)
+            except FileNotFoundError:
+                shm = None
+            df = None
+            while shm is not None:
+                df = montar(shm)
+                if df is not None:
+                    break
+                if not self._usuarios(nome) or time.monotonic() > limite:
+                    # Publicação interrompida (processo morreu no meio): descarta
+                    shm.close()
+                    _remover(shm)
+                    shm = None
+                else:
+                    time.sleep(0.05)
+            if shm is None:
+                local = carregar()
+                try:
+                    shm = publicar(nome, local)
+                except (TypeError, ValueError):
+                    return local  # Tipos que não dá para publicar: fica só neste processo
+                df = montar(shm)
+            self._usuarios(nome, lambda pids: pids.add(os.getpid()))
+        weakref.finalize(df, self._soltar, table_name, nome, shm)
+        return df
+
+    def _soltar(self, table_name, nome, shm):
+        """O DataFrame do processo foi descartado: sai da lista; o último remove o segmento."""
+        with self._trava(table_name):
+            restantes = self._usuarios(nome, lambda pids: pids.discard(os.getpid()))
+            if not restantes:
+                try:
+                    _remover(shm)
+                except FileNotFoundError:
+                    pass
+        self._nao_fechados.append(shm)
+        self._fechar_pendentes()
+
+    def _fechar_pendentes(self):
+        # close() falha enquanto houver arrays apontando para o segmento
+        pendentes, self._nao_fechados = self._nao_fechados, []
+        for shm in pendentes:
+            try:
+                shm.close()
+            except BufferError:
+                self._nao_fechados.append(shm)
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
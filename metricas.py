@@ -0,0 +1,148 @@
+# metricas.py
+# Instrumentação das requisições: tempo de cada etapa (carga, análise, gzip,
+# template), exposto no cabeçalho Server-Timing e acumulado em histogramas por
+# função e por etapa (formato texto do Prometheus).
+# Opcionalmente, um profiler por amostragem grava as pilhas das requisições que
+# passarem de um limite de tempo.
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Limites dos buckets dos histogramas (segundos)
+LIMITES_S = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Etapas da requisição atual: nome → segundos (None fora de uma requisição)
+_etapas = ContextVar('etapas', default=None)
+
+
+def iniciar_requisicao():
+    _etapas.set({})
+
+
+def etapas_da_requisicao():
+    return _etapas.get() or {}
+
+
+@contextmanager
+def etapa(nome):
+    """Soma o tempo do bloco à etapa ``nome`` da requisição atual (se houver uma)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        etapas = _etapas.get()
+        if etapas is not None:
+            etapas[nome] = etapas.get(nome, 0.0) + time.perf_counter() - inicio
+
+
+def server_timing(etapas, total):
+    """Valor do cabeçalho Server-Timing (durações em ms)."""
+    partes = [f'{nome};dur={s * 1000:.1f}' for nome, s in etapas.items()]
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(partes)
+
+
+class Histogramas:
+    """Histogramas de latência indexados por (função, etapa)."""
+
+    def __init__(self, limites=LIMITES_S):
+        self.limites = limites
+        self._series = {}  # (funcao, etapa) → [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, funcao, etapa, segundos):
+        i = bisect.bisect_left(self.limites, segundos)
+        with self._lock:
+            serie = self._series.get((funcao, etapa))
+            if serie is None:
+                serie = self._series[(funcao, etapa)] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[i] += 1
+            serie[-2] += segundos
+            serie[-1] += 1
+
+    def texto(self, nome='requisicao_etapa_segundos'):
+        """Formato de exposição em texto do Prometheus (buckets cumulativos)."""
+        linhas = [f'# HELP {nome} Duração de cada etapa das requisições, por função.',
+                  f'# TYPE {nome} histogram']
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for (funcao, etapa), serie in series:
+            rotulos = f'funcao="{funcao}",etapa="{etapa}"'
+            acumulado = 0
+            for limite, n in zip(self.limites + ['+Inf'], serie[:-2]):
+                acumulado += n
+                linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+            linhas.append(f'{nome}_sum{{{rotulos}}} {serie[-2]:.6f}')
+            linhas.append(f'{nome}_count{{{rotulos}}} {serie[-1]}')
+        return '\n'.join(linhas) + '\n'
+
+
+class AmostradorPerfil:
+    """Profiler por amostragem: uma thread lê, a cada ``intervalo_s``, a pilha das
+    threads registradas (requisições em andamento) e conta as pilhas vistas.
+
+    A thread só existe enquanto há alguma requisição registrada: a primeira a
+    registrar a inicia e a última a encerrar a para (um Event por thread).
+
+    O resultado usa o formato "collapsed stacks" (uma pilha por linha, funções
+    separadas por ';' e a contagem no fim), lido por ferramentas de flame graph.
+    """
+
+    def __init__(self, intervalo_s=0.005):
+        self.intervalo_s = intervalo_s
+        self._amostras = {}  # thread id → Counter de pilhas
+        self._lock = threading.Lock()
+        self._parar = None  # Event da thread de amostragem em execução
+
+    def registrar(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._amostras[ident] = Counter()
+            if self._parar is None:
+                self._parar = threading.Event()
+                threading.Thread(target=self._amostrar, args=(self._parar,), name='perfil',
+                                 daemon=True).start()
+
+    def encerrar(self):
+        """Para de amostrar a thread atual e devolve as pilhas coletadas."""
+        with self._lock:
+            pilhas = self._amostras.pop(threading.get_ident(), Counter())
+            if not self._amostras and self._parar is not None:
+                self._parar.set()
+                self._parar = None
+            return pilhas
+
+    def _amostrar(self, parar):
+        while not parar.wait(self.intervalo_s):
+            with self._lock:
+                idents = list(self._amostras)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                pilha = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pilha.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}'
+                                 f':{frame.f_lineno})')
+                    frame = frame.f_back
+                with self._lock:
+                    contador = self._amostras.get(ident)
+                    if contador is not None:
+                        contador[';'.join(reversed(pilha))] += 1
+
+    @staticmethod
+    def gravar(pilhas, caminho):
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            for pilha, n in pilhas.most_common():
+                f.write(f'{pilha} {n}\n')
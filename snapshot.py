@@ -0,0 +1,189 @@
+# snapshot.py
+# Snapshot colunar de cada tabela em disco, aberto com memory mapping.
+#
+# Layout: <raiz>/<tabela>/v<versao>/
+#   schema.json   → linhas e, para cada coluna, o tipo de armazenamento
+#   <i>.npy       → valores de largura fixa (inteiros/reais) ou códigos (texto)
+#   <i>.mask.npy  → nulos das colunas inteiras
+#   <i>.json      → dicionário das colunas de texto (código → valor)
+#
+# A carga monta o DataFrame sobre os próprios arrays mapeados, sem copiar os
+# dados: o custo é abrir os arquivos, e o cache de páginas do SO é
+# compartilhado entre os processos do servidor.
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_LOTE = 50_000
+
+_INTEIROS = [np.int8, np.int16, np.int32, np.int64]
+
+
+def pasta_snapshot(raiz, table_name, versao):
+    return os.path.join(raiz, table_name, f'v{versao}')
+
+
+def _menor_inteiro(minimo, maximo):
+    for dtype in _INTEIROS:
+        info = np.iinfo(dtype)
+        if info.min <= minimo and maximo <= info.max:
+            return dtype
+    return np.int64
+
+
+def _tipo_codigos(n_valores):
+    # Mesmos limites do pandas para os códigos de um Categorical (evita cópia na carga)
+    return _menor_inteiro(-1, n_valores)
+
+
+def escrever_snapshot(conn, table_name, destino, lote=TAMANHO_LOTE):
+    """Grava o snapshot colunar de ``table_name`` em ``destino`` lendo o SQLite em lotes."""
+    os.makedirs(destino, exist_ok=True)
+    t = f'"{table_name}"'
+    linhas = conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+    info_colunas = conn.execute(f'PRAGMA table_info({t})').fetchall()
+
+    colunas, arrays, mascaras, dicionarios = [], [], {}, {}
+    for i, (_, nome, tipo, *_resto) in enumerate(info_colunas):
+        c = f'"{nome}"'
+        tipo = (tipo or '').upper()
+        if tipo == 'INTEGER':
+            minimo, maximo = conn.execute(f'SELECT MIN({c}), MAX({c}) FROM {t}').fetchone()
+            dtype = _menor_inteiro(minimo or 0, maximo or 0)
+            tipo_col = 'inteiro'
+            mascaras[i] = np.lib.format.open_memmap(
+                os.path.join(destino, f'{i}.mask.npy'), mode='w+', dtype=bool, shape=(linhas,))
+        elif tipo == 'REAL':
+            dtype, tipo_col = np.float64, 'real'
+        else:
+            distintos = conn.execute(f'SELECT COUNT(DISTINCT {c}) FROM {t}').fetchone()[0]
+            dtype, tipo_col = _tipo_codigos(distintos), 'texto'
+            dicionarios[i] = {}
+        colunas.append({'nome': nome, 'tipo': tipo_col})
+        arrays.append(np.lib.format.open_memmap(
+            os.path.join(destino, f'{i}.npy'), mode='w+', dtype=dtype, shape=(linhas,)))
+
+    cur = conn.execute(f'SELECT * FROM {t}')
+    inicio = 0
+    while True:
+        rows = cur.fetchmany(lote)
+        if not rows:
+            break
+        bloco = pd.DataFrame.from_records(rows, columns=[c['nome'] for c in colunas])
+        _gravar_bloco(colunas, arrays, mascaras, dicionarios, bloco, inicio)
+        inicio += len(rows)
+
+    _finalizar(destino, table_name, linhas, colunas, arrays, mascaras, dicionarios)
+
+
+def _gravar_bloco(colunas, arrays, mascaras, dicionarios, bloco, inicio):
+    """Codifica as linhas de ``bloco`` nas posições ``inicio:`` dos arrays do snapshot."""
+    fim = inicio + len(bloco)
+    for i, col in enumerate(colunas):
+        valores = bloco[col['nome']]
+        if col['tipo'] == 'texto':
+            codigos, unicos = pd.factorize(valores, use_na_sentinel=True)
+            dicionario = dicionarios[i]
+            globais = np.array([dicionario.setdefault(v, len(dicionario)) for v in unicos]
+                               + [-1], dtype=np.int64)
+            arrays[i][inicio:fim] = globais[codigos]  # código -1 (nulo) → último item
+        elif col['tipo'] == 'inteiro':
+            nulos = valores.isna().to_numpy()
+            mascaras[i][inicio:fim] = nulos
+            arrays[i][inicio:fim] = valores.fillna(0).to_numpy(dtype=np.int64)
+        else:
+            arrays[i][inicio:fim] = pd.to_numeric(valores, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _finalizar(destino, table_name, linhas, colunas, arrays, mascaras, dicionarios):
+    for i, dicionario in dicionarios.items():
+        with open(os.path.join(destino, f'{i}.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(dicionario), f, ensure_ascii=False)
+    for a in arrays + list(mascaras.values()):
+        a.flush()
+    with open(os.path.join(destino, 'schema.json'), 'w', encoding='utf-8') as f:
+        json.dump({'tabela': table_name, 'linhas': linhas, 'colunas': colunas}, f, ensure_ascii=False)
+
+
+def estender_snapshot(anterior, destino, novas):
+    """Grava em ``destino`` o snapshot de ``anterior`` acrescido das linhas de ``novas``.
+
+    Os arrays antigos são copiados como estão (sem reler o SQLite); só as linhas
+    novas são codificadas. Os dicionários de texto crescem no fim, então os
+    códigos antigos continuam válidos (o tipo dos códigos é alargado se preciso).
+    Devolve False se o snapshot anterior não existir ou tiver outras colunas.
+    """
+    try:
+        with open(os.path.join(anterior, 'schema.json'), encoding='utf-8') as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return False
+    colunas = schema['colunas']
+    if [c['nome'] for c in colunas] != list(novas.columns):
+        return False
+
+    os.makedirs(destino, exist_ok=True)
+    antigas = schema['linhas']
+    linhas = antigas + len(novas)
+    arrays, mascaras, dicionarios = [], {}, {}
+    for i, col in enumerate(colunas):
+        velho = np.load(os.path.join(anterior, f'{i}.npy'), mmap_mode='r')
+        dtype = velho.dtype
+        if col['tipo'] == 'texto':
+            with open(os.path.join(anterior, f'{i}.json'), encoding='utf-8') as f:
+                dicionarios[i] = {v: k for k, v in enumerate(json.load(f))}
+            distintos = set(dicionarios[i]) | set(novas[col['nome']].dropna().unique())
+            dtype = np.promote_types(dtype, _tipo_codigos(len(distintos)))
+        elif col['tipo'] == 'inteiro':
+            valores = novas[col['nome']].dropna()
+            if len(valores):
+                dtype = np.promote_types(dtype, _menor_inteiro(int(valores.min()),
+                                                               int(valores.max())))
+            mascara = np.lib.format.open_memmap(
+                os.path.join(destino, f'{i}.mask.npy'), mode='w+', dtype=bool, shape=(linhas,))
+            mascara[:antigas] = np.load(os.path.join(anterior, f'{i}.mask.npy'), mmap_mode='r')
+            mascaras[i] = mascara
+        novo = np.lib.format.open_memmap(
+            os.path.join(destino, f'{i}.npy'), mode='w+', dtype=dtype, shape=(linhas,))
+        novo[:antigas] = velho
+        arrays.append(novo)
+
+    _gravar_bloco(colunas, arrays, mascaras, dicionarios, novas, antigas)
+    _finalizar(destino, schema['tabela'], linhas, colunas, arrays, mascaras, dicionarios)
+    return True
+
+
+def publicar_snapshot(raiz, table_name, versao, origem):
+    """Move o snapshot gravado em ``origem`` para a versão final e apaga as antigas."""
+    destino = pasta_snapshot(raiz, table_name, versao)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(origem, destino)
+    # Processos que ainda mapeiam a versão antiga continuam lendo o inode aberto
+    for nome in os.listdir(os.path.dirname(destino)):
+        if nome != f'v{versao}':
+            shutil.rmtree(os.path.join(os.path.dirname(destino), nome), ignore_errors=True)
+
+
+def carregar_snapshot(pasta):
+    """Monta o DataFrame sobre os arrays mapeados em memória (sem copiar os dados)."""
+    with open(os.path.join(pasta, 'schema.json'), encoding='utf-8') as f:
+        schema = json.load(f)
+
+    dados = {}
+    for i, col in enumerate(schema['colunas']):
+        valores = np.load(os.path.join(pasta, f'{i}.npy'), mmap_mode='r')
+        if col['tipo'] == 'texto':
+            with open(os.path.join(pasta, f'{i}.json'), encoding='utf-8') as f:
+                categorias = pd.Index(json.load(f))
+            dados[col['nome']] = pd.Categorical.from_codes(valores, categories=categorias)
+        elif col['tipo'] == 'inteiro':
+            mascara = np.load(os.path.join(pasta, f'{i}.mask.npy'), mmap_mode='r')
+            dados[col['nome']] = pd.arrays.IntegerArray(valores, mascara)
+        else:
+            dados[col['nome']] = valores
+    return pd.DataFrame(dados, copy=False)
@@ -0,0 +1,139 @@
+# tarefas.py
+# Fila de ingestão em segundo plano: o upload só enfileira o arquivo e devolve o id
+# da tarefa; uma thread local executa as ingestões, uma de cada vez.
+# O estado das tarefas é gravado no SQLite para que qualquer worker do servidor
+# consiga responder ao endpoint de status.
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+# Intervalo mínimo entre gravações de progresso no banco (segundos)
+INTERVALO_PROGRESSO = 0.5
+
+
+class Tarefa:
+    def __init__(self, arquivo, opcoes=None):
+        self.id = uuid.uuid4().hex
+        self.arquivo = arquivo
+        self.opcoes = opcoes or {}  # repassadas a executar() (ex.: modo)
+        self.estado = 'na_fila'  # na_fila → processando → concluida | erro
+        self.criada_em = time.time()
+        self.iniciada_em = None
+        self.concluida_em = None
+        self.planilhas = {}  # planilha → linhas processadas
+        self.erro = None
+
+    def como_dict(self):
+        fim = self.concluida_em or time.time()
+        duracao = fim - self.iniciada_em if self.iniciada_em else 0.0
+        linhas = sum(self.planilhas.values())
+        return {
+            'id': self.id,
+            'arquivo': self.arquivo,
+            'opcoes': self.opcoes,
+            'estado': self.estado,
+            'criada_em': self.criada_em,
+            'iniciada_em': self.iniciada_em,
+            'concluida_em': self.concluida_em,
+            'planilhas': dict(self.planilhas),
+            'linhas': linhas,
+            'duracao_s': round(duracao, 3),
+            'linhas_por_s': round(linhas / duracao, 1) if duracao else 0.0,
+            'erro': self.erro,
+        }
+
+
+class FilaIngestao:
+    """Executa ``executar(arquivo, progresso, **opcoes)`` para cada arquivo enfileirado."""
+
+    def __init__(self, banco, executar):
+        self.banco = banco  # banco.Banco
+        self._executar = executar
+        self._fila = queue.Queue()
+        self._tarefas = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enfileirar(self, arquivo, **opcoes):
+        tarefa = Tarefa(arquivo, opcoes)
+        with self._lock:
+            self._tarefas[tarefa.id] = tarefa
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._trabalhar, name='ingestao', daemon=True
+                )
+                self._thread.start()
+        self._salvar(tarefa)
+        self._fila.put(tarefa)
+        return tarefa
+
+    def obter(self, tarefa_id):
+        """Estado da tarefa (deste processo ou gravado por outro worker)."""
+        tarefa = self._tarefas.get(tarefa_id)
+        if tarefa is not None:
+            return tarefa.como_dict()
+        try:
+            row = self.banco.leitura().execute(
+                "SELECT dados FROM meta_tarefas WHERE id = ?", (tarefa_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        return json.loads(row[0]) if row else None
+
+    def listar(self, limite=20):
+        try:
+            rows = self.banco.leitura().execute(
+                "SELECT dados FROM meta_tarefas ORDER BY criada_em DESC LIMIT ?", (limite,)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        return [json.loads(r[0]) for r in rows]
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self._fila.get()
+            tarefa.estado = 'processando'
+            tarefa.iniciada_em = time.time()
+            self._salvar(tarefa)
+            ultimo = [0.0]
+
+            def progresso(planilha, linhas):
+                tarefa.planilhas[planilha] = linhas
+                agora = time.time()
+                if agora - ultimo[0] >= INTERVALO_PROGRESSO:
+                    ultimo[0] = agora
+                    self._salvar(tarefa)
+
+            try:
+                self._executar(tarefa.arquivo, progresso, **tarefa.opcoes)
+                tarefa.estado = 'concluida'
+            except Exception as e:
+                traceback.print_exc()
+                tarefa.estado = 'erro'
+                tarefa.erro = str(e)
+            tarefa.concluida_em = time.time()
+            self._salvar(tarefa)
+            self._fila.task_done()
+
+    def _salvar(self, tarefa):
+        conn = self.banco.escrita()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS meta_tarefas (
+                        id TEXT PRIMARY KEY,
+                        criada_em REAL NOT NULL,
+                        dados TEXT NOT NULL
+                    )
+                """)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta_tarefas (id, criada_em, dados) VALUES (?, ?, ?)",
+                    (tarefa.id, tarefa.criada_em, json.dumps(tarefa.como_dict()))
+                )
+        finally:
+            conn.close()
@@ -0,0 +1,95 @@
+# tempo.py
+# Índice temporal: contagens acumuladas mês a mês por (Natureza, Ambiente),
+# calculadas na ingestão a partir do cubo.
+#
+# Cada par vira uma linha de tempo__<tabela> com o vetor acumulado (posição m =
+# ocorrências dos meses 1..m) num BLOB de int64. Numa consulta, os pares que
+# passam no filtro (crimes, ambiente) têm os vetores somados uma vez; daí o total
+# de qualquer intervalo de meses, semestre ou janela móvel sai de uma subtração
+# por ponto, sem reagrupar a base.
+#
+# As planilhas trazem só o mês (Mês), sem a data da ocorrência: o eixo é mensal.
+
+import numpy as np
+import pandas as pd
+
+from analise_seguranca_funcoes import (
+    MORADIAS_SEMESTRE, PESO, _meses, contagem_meses, crimes_perigosos,
+    crimes_perigosos_mensal, evolucao_meses, serie_intervalo,
+)
+from filtros import mascara
+
+POSICOES = 13
+TIPO = '<i8'
+
+
+def tabela_tempo(table_name):
+    return f'tempo__{table_name}'
+
+
+def _semestre(filtro):
+    return lambda tempo, semestre: contagem_meses(acumulado(tempo, filtro),
+                                                  *_meses(semestre), 'Crimes')
+
+
+# Análises que saem do índice temporal
+ANALISES_TEMPO = {
+    'crimes_perigosos_semestre': _semestre({'crimes': crimes_perigosos}),
+    'crimes_moradias_semestre': _semestre(MORADIAS_SEMESTRE),
+    'evolucao_crimes_perigosos': lambda tempo: evolucao_meses(
+        acumulado(tempo, {'crimes': crimes_perigosos_mensal}), 'Crimes'),
+    'evolucao_intervalo': lambda tempo, crime, inicio, fim, janela=3: serie_intervalo(
+        acumulado(tempo, {'crimes': crime}), inicio, fim, janela),
+}
+
+
+def construir_tempo(df):
+    """Uma linha por (Natureza, Ambiente) com o vetor acumulado em bytes (``acumulado``).
+
+    Aceita o cubo (soma PESO) ou a base bruta (conta linhas). Linhas sem natureza ou
+    com mês fora de 1–12 ficam de fora; Ambiente nulo forma um par próprio.
+    """
+    colunas = ['Natureza', 'Ambiente', 'acumulado']
+    if not {'Natureza', 'Ambiente', 'Mês_num'} <= set(df.columns):
+        return pd.DataFrame(columns=colunas)
+    meses = pd.to_numeric(df['Mês_num'], errors='coerce').to_numpy(dtype='float64',
+                                                                  na_value=np.nan)
+    validos = df['Natureza'].notna().to_numpy() & (meses >= 1) & (meses <= 12)
+    df, meses = df[validos], meses[validos].astype('int64')
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+    pares = pd.MultiIndex.from_frame(df[['Natureza', 'Ambiente']].astype(object))
+    codigos, unicos = pares.factorize()
+    n = np.zeros((len(unicos), POSICOES), dtype=TIPO)
+    pesos = df[PESO].to_numpy(dtype='int64') if PESO in df.columns else 1
+    np.add.at(n, (codigos, meses), pesos)
+    densos = unicos.to_frame(index=False, name=['Natureza', 'Ambiente'])
+    densos['acumulado'] = [linha.tobytes() for linha in np.cumsum(n, axis=1)]
+    return densos
+
+
+def gravar_tempo(conn, table_name, densos):
+    nome = tabela_tempo(table_name)
+    conn.execute(f'DROP TABLE IF EXISTS "{nome}"')
+    conn.execute(f'CREATE TABLE "{nome}" (Natureza TEXT, Ambiente TEXT, acumulado BLOB)')
+    conn.executemany(f'INSERT INTO "{nome}" VALUES (?, ?, ?)',
+                     densos.itertuples(index=False, name=None))
+
+
+def ler_tempo(conn, table_name):
+    """Índice da tabela: colunas ``Natureza``, ``Ambiente`` e 0..12 (vetor acumulado)."""
+    densos = pd.read_sql_query(f'SELECT * FROM "{tabela_tempo(table_name)}"', conn)
+    vetores = np.frombuffer(b''.join(densos['acumulado']), dtype=TIPO).reshape(-1, POSICOES)
+    tempo = densos[['Natureza', 'Ambiente']].copy()
+    return tempo.join(pd.DataFrame(vetores, index=tempo.index))
+
+
+def acumulado(tempo, filtro):
+    """Soma dos vetores acumulados dos pares que passam no ``filtro`` (crimes, ambiente)."""
+    vetores = tempo[list(range(POSICOES))].to_numpy()
+    return vetores[mascara(tempo, filtro)].sum(axis=0)
+
+
+def analise_tempo(tempo, nome, **params):
+    """Resultado da análise ``nome`` de ANALISES_TEMPO calculado pelo índice."""
+    return ANALISES_TEMPO[nome](tempo, **params)
@@ -0,0 +1,46 @@
+# conftest.py
+# Base sintética compartilhada pelos testes: o gerador do benchmark.py (com
+# semente) grava um .xlsx, que é ingerido num SQLite temporário. ``app_mod`` dá
+# o app numa pasta própria (ele usa caminhos relativos: dados.db, uploads, ...).
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmark import gerar_planilha  # noqa: E402
+
+LINHAS = 3000
+
+
+@pytest.fixture(scope='session')
+def planilha(tmp_path_factory):
+    """Caminho do .xlsx sintético (uma planilha, ``LINHAS`` ocorrências)."""
+    return gerar_planilha(str(tmp_path_factory.mktemp('planilha') / 'ocorrencias.xlsx'), LINHAS)
+
+
+@pytest.fixture(scope='session')
+def banco(planilha, tmp_path_factory):
+    """``(caminho do SQLite, tabela)`` com a planilha ingerida."""
+    from ingestao import ingerir_excel
+
+    db_path = str(tmp_path_factory.mktemp('banco') / 'dados.db')
+    infos = ingerir_excel(db_path, planilha, processos=1)
+    return db_path, infos[0]['table_name']
+
+
+@pytest.fixture(scope='module')
+def app_mod(tmp_path_factory):
+    """Módulo ``app`` recém-importado numa pasta vazia (banco sem tabelas)."""
+    pasta_inicial = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    sys.modules.pop('app', None)
+    try:
+        import app
+        yield app
+    finally:
+        sys.modules.pop('app', None)
+        os.chdir(pasta_inicial)
@@ -0,0 +1,88 @@
+# Endpoints JSON do app sobre a planilha sintética ingerida.
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def cliente(app_mod, planilha):
+    app_mod.init_db_from_excel(planilha)
+    return app_mod.app.test_client()
+
+
+@pytest.mark.parametrize('limite', ['0', '-1', 'x'])
+def test_ocorrencias_limite_invalido_nao_devolve_a_tabela(app_mod, cliente, limite):
+    r = cliente.get(f'/api/ocorrencias?limite={limite}').json
+    esperado = 1 if limite != 'x' else app_mod.app.config['OCORRENCIAS_POR_PAGINA']
+    assert len(r['dados']) == esperado
+    assert r['proximo'] is not None
+
+
+def test_ocorrencias_limite_acima_do_maximo(app_mod, cliente):
+    maximo = app_mod.app.config['OCORRENCIAS_MAX_PAGINA']
+    r = cliente.get(f'/api/ocorrencias?limite={maximo * 10}').json
+    assert len(r['dados']) == maximo
+
+
+@pytest.mark.parametrize('limite, esperado', [('-5', 1), ('0', 1), ('3', 3), ('500', 50)])
+def test_sugestoes_limite(cliente, limite, esperado):
+    r = cliente.get(f'/api/sugestoes/bairro?limite={limite}').json
+    assert len(r) == esperado
+
+
+def test_comparar_mapa_de_calor_por_hora_e_dia(app_mod, cliente):
+    t = app_mod.get_tables()[0][1]
+    params = {'crime': 'FURTO SIMPLES', 'bairro': 'CENTRO'}
+    r = cliente.get('/api/comparar/mapa_calor_crime_bairro', query_string=params).json
+    assert r['colunas'] == ['Hora', 'Dia da Semana', t, 'Total']
+    assert len(r['dados']) == 24 * 7
+
+    mapa = app_mod.executar_analise('mapa_calor_crime_bairro', t, params)
+    celulas = {(h, d): n for h, d, n, _ in r['dados']}
+    for hora, *contagens in mapa.itertuples(index=False):
+        for dia, n in zip(mapa.columns[1:], contagens):
+            assert celulas[(hora, dia)] == n
+
+
+@pytest.mark.parametrize('key, params', [
+    ('crimes_moradias_bairro', {'bairro': 'CENTRO'}),
+    ('crimes_perigosos_semestre', {'semestre': '2'}),
+    ('evolucao_intervalo', {'crime': 'FURTO SIMPLES', 'inicio': '3', 'fim': '5'}),
+])
+def test_exportar_traz_so_as_ocorrencias_do_grafico(cliente, key, params):
+    r = cliente.get(f'/api/grafico/{key}', query_string=params).json
+    tabela = dict(zip(r['tabela']['colunas'], r['tabela']['valores']))
+
+    csv = cliente.get(r['exportar']).get_data(as_text=True).splitlines()
+    assert len(csv) - 1 == sum(tabela['Crimes']) > 0
+
+
+def test_exportar_ausente_quando_filtro_nao_vai_para_sql(cliente):
+    r = cliente.get('/api/grafico/crimes_moradias_semestre?semestre=1').json
+    assert r['exportar'] is None
+    assert cliente.get('/api/ocorrencias?funcao=crimes_moradias_semestre').status_code == 400
+
+
+def test_todas_as_analises_tem_filtro(app_mod):
+    from analise_seguranca_funcoes import FILTROS_ANALISES
+
+    assert {m['func'].__name__ for m in app_mod.FUNCTIONS_META.values()} <= set(FILTROS_ANALISES)
+
+
+@pytest.mark.parametrize('key, params', [
+    ('top10_bairros_perigosos', {}),
+    ('ranking_geral_crimes', {}),
+    ('ranking_bairros_crime', {'crime': 'FURTO SIMPLES'}),
+])
+def test_grafico_informa_se_ranking_aproximado_esta_completo(app_mod, cliente, monkeypatch,
+                                                              key, params):
+    app_mod.resultado_cache.limpar()
+    assert 'completo' not in cliente.get(f'/api/grafico/{key}', query_string=params).json
+
+    monkeypatch.setitem(app_mod.app.config, 'RANKING_APROXIMADO', True)
+    app_mod.resultado_cache.limpar()
+    r = cliente.get(f'/api/grafico/{key}', query_string=params).json
+    t = app_mod.get_tables()[0][1]
+    with app_mod.app.app_context():
+        esperado = app_mod.executar_analise(key, t, params).attrs['completo']
+    assert r['completo'] is bool(esperado)
+    app_mod.resultado_cache.limpar()
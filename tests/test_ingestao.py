@@ -0,0 +1,19 @@
+# Modo acrescentar da ingestão sobre a planilha sintética.
+
+import sqlite3
+
+from ingestao import ingerir_excel
+
+
+def test_acrescentar_sem_linhas_novas_em_tabela_sem_versao(planilha, tmp_path):
+    db_path = str(tmp_path / 'dados.db')
+    ingerir_excel(db_path, planilha, processos=1)
+    # Base de antes do meta_versoes e sem registro do arquivo/planilha: tudo é reprocessado
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for meta in ('meta_versoes', 'meta_arquivos', 'meta_planilhas'):
+            conn.execute(f'DELETE FROM {meta}')
+    conn.close()
+
+    infos = ingerir_excel(db_path, planilha, processos=1, modo='acrescentar')
+    assert [i['novas'] for i in infos] == [0]
@@ -0,0 +1,104 @@
+# Kernel de análise: as funções não podem alterar a base compartilhada (cache
+# por versão, memória compartilhada) e têm um orçamento de pico de memória
+# (tracemalloc). Os atalhos da ingestão (índice temporal, matrizes hora × dia)
+# devolvem o mesmo resultado, com os mesmos tipos, que o motor pandas.
+
+import inspect
+import sqlite3
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+import analise_seguranca_funcoes
+from benchmark import gravar_direto
+from comparacao import ler_tabela
+from mapas import ANALISES_MAPA, analise_mapa, ler_mapas
+from tempo import ANALISES_TEMPO, analise_tempo, ler_tempo
+
+# Base grande o bastante para o custo por linha dominar o fixo
+LINHAS_ORCAMENTO = 100_000
+
+# Pico de memória permitido para cada função: fixo + bytes por linha da base
+ORCAMENTO_FIXO = 2 * 2**20
+ORCAMENTO_PADRAO = 8
+ORCAMENTOS = {
+    'periodo_crime_bairro': 16,       # groupby por duas chaves sobre o bairro inteiro
+    'evolucao_crimes_perigosos': 16,  # filtro por 7 crimes sobre a base inteira
+}
+
+PARAMETROS = {'crime': 'FURTO SIMPLES', 'bairro': 'CENTRO', 'periodo': 'Noite',
+              'semestre': 1, 'inicio': 1, 'fim': 12, 'janela': 3}
+
+
+@pytest.fixture(scope='module')
+def base_grande(app_mod):
+    """O app com a base sintética de ``LINHAS_ORCAMENTO`` linhas gravada."""
+    gravar_direto(app_mod, LINHAS_ORCAMENTO)
+    return app_mod
+
+
+def _executar(app_mod, motor):
+    """``(key, função, base, params)`` de cada função de FUNCTIONS_META no motor."""
+    app_mod.df_cache.limpar()
+    app_mod.app.config['MOTOR_ANALISE'] = motor
+    table_name = app_mod.get_tables()[0][1]
+    for key, meta in app_mod.FUNCTIONS_META.items():
+        params = {p: PARAMETROS[p] for p in meta['params'] if p in PARAMETROS}
+        yield key, meta['func'], app_mod.carregar_base(table_name, meta['func'].__name__), params
+
+
+@pytest.mark.parametrize('motor', ['pandas', 'cubo'])
+def test_funcoes_nao_alteram_a_base(base_grande, motor):
+    alteradas = []
+    for key, func, base, params in _executar(base_grande, motor):
+        referencia = base.copy(deep=True)
+        func(base, **params)
+        if not (base.columns.equals(referencia.columns) and base.equals(referencia)):
+            alteradas.append(key)
+    assert alteradas == []
+
+
+@pytest.mark.parametrize('motor', ['pandas', 'cubo'])
+def test_pico_de_memoria_no_orcamento(base_grande, motor):
+    acima = []
+    for key, func, base, params in _executar(base_grande, motor):
+        # Primeira execução fora da medição: os bitmaps do filtro já existem no app em uso
+        func(base, **params)
+        tracemalloc.start()
+        try:
+            func(base, **params)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        limite = ORCAMENTO_FIXO + ORCAMENTOS.get(key, ORCAMENTO_PADRAO) * len(base)
+        if pico > limite:
+            acima.append(f'{key}: {pico / 2**20:.1f} MB (orçamento {limite / 2**20:.1f} MB)')
+    assert acima == []
+
+
+@pytest.fixture(scope='module')
+def ingerida(banco):
+    db_path, table_name = banco
+    conn = sqlite3.connect(db_path)
+    yield ler_tabela(conn, table_name), ler_tempo(conn, table_name), ler_mapas(conn, table_name)
+    conn.close()
+
+
+@pytest.mark.parametrize('nome', sorted(ANALISES_TEMPO))
+@pytest.mark.parametrize('semestre', [1, 2])
+def test_indice_temporal_igual_ao_pandas(ingerida, nome, semestre):
+    df, tempo, _ = ingerida
+    func = getattr(analise_seguranca_funcoes, nome)
+    todos = {**PARAMETROS, 'semestre': semestre}
+    params = {p: todos[p] for p in inspect.signature(func).parameters if p != 'df'}
+    pd.testing.assert_frame_equal(analise_tempo(tempo, nome, **params), func(df, **params))
+
+
+@pytest.mark.parametrize('nome', sorted(ANALISES_MAPA))
+@pytest.mark.parametrize('bairro', ['CENTRO', 'BAIRRO 001', 'INEXISTENTE'])
+def test_matrizes_iguais_ao_pandas(ingerida, nome, bairro):
+    df, _, mapas = ingerida
+    func = getattr(analise_seguranca_funcoes, nome)
+    params = {'crime': PARAMETROS['crime'], 'bairro': bairro}
+    pd.testing.assert_frame_equal(analise_mapa(mapas, nome, **params), func(df, **params))
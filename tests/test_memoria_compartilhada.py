@@ -0,0 +1,21 @@
+# Segmentos de memória compartilhada: publicação, anexação e limpeza da pasta.
+
+import gc
+import os
+
+import pandas as pd
+
+from memoria_compartilhada import MemoriaCompartilhada
+
+
+def test_versoes_descartadas_nao_deixam_arquivos(tmp_path):
+    memoria = MemoriaCompartilhada(str(tmp_path))
+    for versao in range(1, 6):
+        df = memoria.obter('2024', versao, lambda: pd.DataFrame({'Bairro': ['CENTRO'] * 3,
+                                                                 'Hora': [1, 2, 3]}))
+        assert df['Hora'].tolist() == [1, 2, 3]
+        del df
+        gc.collect()
+
+    # Só a trava da tabela fica; os segmentos e as listas de uso saíram
+    assert [os.path.splitext(f)[1] for f in os.listdir(tmp_path)] == ['.lock']
@@ -0,0 +1,43 @@
+# Profiler por amostragem: a thread só existe enquanto há requisições registradas.
+
+import threading
+import time
+
+from metricas import AmostradorPerfil
+
+
+def _amostradoras():
+    return [t for t in threading.enumerate() if t.name == 'perfil']
+
+
+def _ocupar(segundos):
+    fim = time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        pass
+
+
+def test_thread_para_quando_a_ultima_requisicao_encerra():
+    amostrador = AmostradorPerfil(intervalo_s=0.001)
+    assert _amostradoras() == []
+
+    amostrador.registrar()
+    assert len(_amostradoras()) == 1
+    _ocupar(0.05)
+    pilhas = amostrador.encerrar()
+    assert sum(pilhas.values()) > 0
+    assert any('_ocupar' in pilha for pilha in pilhas)
+
+    for thread in _amostradoras():
+        thread.join(timeout=1)
+    assert _amostradoras() == []
+
+
+def test_reinicia_depois_de_parar():
+    amostrador = AmostradorPerfil(intervalo_s=0.001)
+    for _ in range(3):
+        amostrador.registrar()
+        _ocupar(0.02)
+        assert sum(amostrador.encerrar().values()) > 0
+    for thread in _amostradoras():
+        thread.join(timeout=1)
+    assert _amostradoras() == []
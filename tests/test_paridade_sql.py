@@ -0,0 +1,82 @@
+# Paridade entre as consultas SQL (MOTOR_ANALISE='sql') e as funções pandas:
+# mesmo formato e mesmos valores, com a base ingerida como no app.
+
+import inspect
+import itertools
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import analise_seguranca_funcoes
+from comparacao import ler_tabela
+from consultas_sql import CONSULTAS_SQL
+
+# Valores de cada parâmetro: comuns, raros, com espaços na planilha e inexistentes
+VALORES = {
+    'crime': ['FURTO SIMPLES', 'ROUBO', 'LATROCINIO', 'INEXISTENTE'],
+    'bairro': ['CENTRO', 'BAIRRO 001', 'BAIRRO 120', 'INEXISTENTE'],
+    'periodo': ['Manhã', 'Tarde', 'Noite'],
+    'semestre': [1, 2],
+}
+
+
+# Colunas que só numeram a posição da linha (a paginação do ranking)
+_POSICIONAIS = ('Bloco',)
+
+
+def _normalizar(r):
+    """Resultado com tipos comparáveis e as linhas empatadas em ordem fixa.
+
+    A ordem só é livre entre linhas seguidas com a mesma contagem (última coluna
+    numérica): cada grupo empatado é ordenado pelas demais colunas. Colunas
+    posicionais (ex.: Bloco) ficam onde estavam.
+    """
+    r = r.reset_index(drop=True).copy()
+    for c in r.columns:
+        if pd.api.types.is_numeric_dtype(r[c]):
+            r[c] = r[c].astype(float)
+        else:
+            r[c] = r[c].astype(object).where(r[c].notna(), None)
+    numericas = [c for c in r.select_dtypes(include='number').columns if c not in _POSICIONAIS]
+    if r.empty or not numericas:
+        return r
+    contagem = r[numericas[-1]]
+    livres = [c for c in r.columns if c not in _POSICIONAIS]
+    ordenado = (r[livres].assign(_grupo=contagem.ne(contagem.shift()).cumsum())
+                .sort_values(['_grupo'] + livres, kind='stable', na_position='last')
+                .drop(columns='_grupo').reset_index(drop=True))
+    for c in r.columns:
+        if c in _POSICIONAIS:
+            ordenado[c] = r[c]
+    return ordenado[list(r.columns)]
+
+
+def _casos():
+    for nome in sorted(CONSULTAS_SQL):
+        func = getattr(analise_seguranca_funcoes, nome)
+        params = [p for p in inspect.signature(func).parameters if p != 'df']
+        for valores in itertools.product(*(VALORES[p] for p in params)):
+            combinacao = dict(zip(params, valores))
+            yield pytest.param(nome, combinacao,
+                               id='-'.join([nome] + [str(v) for v in valores]))
+
+
+@pytest.fixture(scope='module')
+def conexao(banco):
+    db_path, table_name = banco
+    conn = sqlite3.connect(db_path)
+    yield conn, table_name, ler_tabela(conn, table_name)
+    conn.close()
+
+
+@pytest.mark.parametrize('nome, params', list(_casos()))
+def test_consulta_igual_ao_pandas(conexao, nome, params):
+    conn, table_name, df = conexao
+    func = getattr(analise_seguranca_funcoes, nome)
+    esperado = func(df, **params)
+    obtido = CONSULTAS_SQL[nome](conn, table_name, **params)
+
+    assert list(obtido.columns) == list(esperado.columns)
+    # Linhas empatadas na contagem podem sair em qualquer ordem entre si
+    pd.testing.assert_frame_equal(_normalizar(obtido), _normalizar(esperado))
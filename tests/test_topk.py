@@ -0,0 +1,55 @@
+# Ranking aproximado (topk.py): limites do Space-Saving e o que a verificação
+# exata garante.
+
+import sqlite3
+
+import pytest
+
+from topk import ranking_aproximado
+
+
+@pytest.fixture(scope='module')
+def contagens(banco):
+    db_path, table_name = banco
+    conn = sqlite3.connect(db_path)
+    exatas = dict(conn.execute(
+        f'SELECT "Bairro", COUNT(*) FROM "{table_name}" WHERE "Bairro" IS NOT NULL GROUP BY 1'))
+    yield conn, table_name, exatas
+    conn.close()
+
+
+def _top(exatas, k):
+    return sorted(exatas.values(), reverse=True)[:k]
+
+
+@pytest.mark.parametrize('capacidade', [10, 30, 1000])
+@pytest.mark.parametrize('verificar', [False, True])
+def test_contagem_real_dentro_do_erro(contagens, capacidade, verificar):
+    conn, table_name, exatas = contagens
+    r = ranking_aproximado(conn, table_name, 'Bairro', 10, capacidade=capacidade,
+                           tamanho=500, verificar=verificar)
+    for bairro, estimativa, erro in r.itertuples(index=False):
+        assert estimativa - erro <= exatas[bairro] <= estimativa
+    if verificar:
+        assert all(exatas[b] == n for b, n in zip(r['Bairro'], r['Contagem']))
+
+
+@pytest.mark.parametrize('capacidade', [10, 30, 1000])
+def test_completo_so_quando_provado(contagens, capacidade):
+    conn, table_name, exatas = contagens
+    r = ranking_aproximado(conn, table_name, 'Bairro', 10, capacidade=capacidade,
+                           tamanho=500, verificar=True)
+    if r.attrs['completo']:
+        assert r['Contagem'].tolist() == _top(exatas, 10)
+        assert (r['Erro'] == 0).all()
+    else:
+        # Sem prova, o erro do resumo continua na resposta
+        assert (r['Erro'] > 0).any()
+
+
+def test_capacidade_suficiente_e_exata(contagens):
+    conn, table_name, exatas = contagens
+    r = ranking_aproximado(conn, table_name, 'Bairro', 10, capacidade=len(exatas))
+    assert r.attrs['completo']
+    assert r['Contagem'].tolist() == _top(exatas, 10)
+    assert (r['Erro'] == 0).all()
@@ -0,0 +1,183 @@
+# topk.py
+# Rankings aproximados em streaming (top-K) para tabelas grandes demais para a memória.
+#
+# A tabela é percorrida em blocos de rowid; o SQLite conta os valores de cada
+# bloco e as contagens alimentam um resumo Space-Saving com no máximo
+# ``capacidade`` contadores: a memória não depende do número de linhas. Cada contador guarda a contagem estimada e o erro máximo: a
+# estimativa nunca fica abaixo do valor real e passa dele no máximo ``erro``
+# (≤ total / capacidade). Com poucos valores distintos (≤ capacidade) o resultado
+# é exato.
+#
+# A verificação exata (opcional) recalcula com COUNT, usando o índice da coluna,
+# só os candidatos que ainda podem estar no top-K. Ela torna exatas as contagens
+# devolvidas, mas um valor que saiu do resumo ainda pode ter até o menor contador:
+# o top-K só é dado como completo quando a K-ésima contagem passa dele.
+
+import heapq
+
+import pandas as pd
+
+from consultas_sql import _em, _q
+
+CAPACIDADE = 1000
+TAMANHO_LOTE = 50_000
+
+# Valores por consulta na verificação (limite de parâmetros do SQLite)
+LOTE_VERIFICACAO = 500
+
+
+class ResumoTopK:
+    """Resumo Space-Saving: no máximo ``capacidade`` valores monitorados."""
+
+    def __init__(self, capacidade=CAPACIDADE):
+        self.capacidade = capacidade
+        self.contadores = {}  # valor → [estimativa, erro]
+        self._heap = []       # (estimativa, valor); entradas vencidas são descartadas
+        self.total = 0
+        self.descartou = False  # algum valor já saiu do resumo
+
+    def atualizar(self, valor, peso=1):
+        self.total += peso
+        contador = self.contadores.get(valor)
+        if contador is not None:
+            contador[0] += peso
+            return
+        if len(self.contadores) < self.capacidade:
+            self.contadores[valor] = [peso, 0]
+            heapq.heappush(self._heap, (peso, valor))
+            return
+        # Cheio: o novo valor herda a contagem do menor, que sai
+        minimo, removido = self._menor()
+        del self.contadores[removido]
+        self.descartou = True
+        self.contadores[valor] = [minimo + peso, minimo]
+        heapq.heappush(self._heap, (minimo + peso, valor))
+        if len(self._heap) > 4 * self.capacidade:
+            self._heap = [(c[0], v) for v, c in self.contadores.items()]
+            heapq.heapify(self._heap)
+
+    def _menor(self):
+        # As contagens só crescem: uma entrada com valor menor que o atual está vencida
+        while True:
+            estimativa, valor = heapq.heappop(self._heap)
+            contador = self.contadores.get(valor)
+            if contador is None:
+                continue
+            if contador[0] != estimativa:
+                heapq.heappush(self._heap, (contador[0], valor))
+                continue
+            return estimativa, valor
+
+    def teto_fora(self):
+        """Maior contagem possível de um valor que não está no resumo."""
+        if not self.descartou:
+            return 0
+        return min(c[0] for c in self.contadores.values())
+
+    def maiores(self, k=None):
+        """``(valor, estimativa, erro)`` em ordem decrescente (empate → menor valor)."""
+        itens = sorted(((v, c[0], c[1]) for v, c in self.contadores.items()),
+                       key=lambda item: (-item[1], item[0]))
+        return itens if k is None else itens[:k]
+
+
+def _where(coluna, filtros):
+    filtros = [(f'{_q(coluna)} IS NOT NULL', [])] + list(filtros)
+    return (' AND '.join(f'({sql})' for sql, _ in filtros),
+            [p for _, ps in filtros for p in ps])
+
+
+def resumir(conn, table_name, coluna, filtros=(), capacidade=CAPACIDADE, tamanho=TAMANHO_LOTE):
+    """Percorre a tabela em blocos de ``tamanho`` rowids e devolve o ResumoTopK."""
+    where, params = _where(coluna, filtros)
+    # Cada bloco chega já contado (os mais frequentes primeiro); a memória fica
+    # limitada aos valores distintos de um bloco
+    sql = (f'SELECT {_q(coluna)}, COUNT(*) AS n FROM {_q(table_name)} '
+           f'WHERE rowid > ? AND rowid <= ? AND {where} GROUP BY 1 ORDER BY n DESC')
+    ultimo = conn.execute(f'SELECT MAX(rowid) FROM {_q(table_name)}').fetchone()[0] or 0
+    resumo = ResumoTopK(capacidade)
+    for inicio in range(0, ultimo, tamanho):
+        for valor, n in conn.execute(sql, [inicio, inicio + tamanho] + params):
+            resumo.atualizar(valor, n)
+    return resumo
+
+
+def contagem_exata(conn, table_name, coluna, valores, filtros=()):
+    """``{valor: contagem}`` exata para os ``valores`` pedidos."""
+    where, params = _where(coluna, filtros)
+    valores, contagens = list(valores), {}
+    for i in range(0, len(valores), LOTE_VERIFICACAO):
+        em, ps = _em(_q(coluna), valores[i:i + LOTE_VERIFICACAO])
+        contagens.update(conn.execute(
+            f'SELECT {_q(coluna)}, COUNT(*) FROM {_q(table_name)} '
+            f'WHERE {where} AND {em} GROUP BY 1', params + ps
+        ).fetchall())
+    return contagens
+
+
+def ranking_aproximado(conn, table_name, coluna, k, filtros=(), nome='Contagem', alias=None,
+                       capacidade=CAPACIDADE, tamanho=TAMANHO_LOTE, verificar=False):
+    """Top-``k`` de ``coluna`` em streaming, com o erro máximo de cada contagem.
+
+    Colunas: ``alias`` (ou ``coluna``), ``nome`` (estimativa) e ``Erro`` (a contagem
+    real fica entre ``nome - Erro`` e ``nome``). Com ``verificar``, os candidatos
+    que ainda podem estar no top-k são recontados e ``nome`` passa a ser a contagem
+    exata.
+
+    ``attrs['completo']`` diz se o top-k está provado completo (nenhum valor fora
+    do resultado passa dos que estão nele): sempre, se nenhum valor saiu do resumo
+    (os distintos couberam na ``capacidade``); com ``verificar``, quando a k-ésima
+    contagem passa do menor contador do resumo. Só então ``Erro`` é 0; senão fica
+    o erro do Space-Saving de cada valor.
+    """
+    # Com menos de k contadores o resumo nem consegue guardar o top-k
+    resumo = resumir(conn, table_name, coluna, filtros, max(capacidade, k), tamanho)
+    maiores = resumo.maiores(k)
+    teto_fora = resumo.teto_fora()
+    completo = teto_fora == 0
+    if verificar and maiores:
+        # Dentro do resumo, só quem alcança o menor limite inferior do top-k pode
+        # entrar nele (fora, ninguém passa do menor contador)
+        piso = min(estimativa - erro for _, estimativa, erro in maiores)
+        candidatos = [v for v, estimativa, _ in resumo.maiores() if estimativa >= piso]
+        exatas = contagem_exata(conn, table_name, coluna, candidatos, filtros)
+        verificadas = sorted(exatas.items(), key=lambda item: (-item[1], item[0]))[:k]
+        completo = completo or (len(verificadas) == k and verificadas[-1][1] > teto_fora)
+        maiores = [(v, n, 0 if completo else resumo.contadores[v][1]) for v, n in verificadas]
+    r = pd.DataFrame(maiores, columns=[alias or coluna, nome, 'Erro'])
+    r.attrs['completo'] = completo
+    return r
+
+
+# =====================================================
+# 🔹 Rankings com modo aproximado (mesma assinatura de consultas_sql)
+# =====================================================
+def top10_bairros_perigosos(conn, t, **opcoes):
+    return ranking_aproximado(conn, t, 'Bairro', 10, nome='Crimes', **opcoes)
+
+
+def ranking_geral_crimes(conn, t, **opcoes):
+    return ranking_aproximado(conn, t, 'Natureza', 10, nome='Ocorrências', alias='Crime',
+                              **opcoes)
+
+
+def ranking_bairros_crime(conn, t, crime, **opcoes):
+    q = ranking_aproximado(
+        conn, t, 'Bairro', 80, nome='Crimes',
+        filtros=[('"Natureza" = ?', [crime]),
+                 ("\"Bairro\" NOT IN ('', '0', 'NULL', 'None')", [])],
+        **opcoes,
+    )
+    if q.empty:
+        vazio = pd.DataFrame(columns=['Bairro', 'Crimes', 'Erro', 'Bloco'])
+        vazio.attrs = q.attrs
+        return vazio
+    q['Bloco'] = (q.index // 20) + 1
+    return q
+
+
+RANKINGS_APROXIMADOS = {
+    'top10_bairros_perigosos': top10_bairros_perigosos,
+    'ranking_geral_crimes': ranking_geral_crimes,
+    'ranking_bairros_crime': ranking_bairros_crime,
+}